@@ -2,66 +2,148 @@
 app.py
 
 Flask backend for handling Google OAuth, database updates, and calendar integration
+
+The app is built by create_app. Importing this module doesn't connect to
+Firestore or import the Google API client libraries: the storage backend is
+created by the first request that needs it and the Google libraries are
+imported on first use, so a new worker can serve its first request sooner.
+Set WARMUP=1 to do that work in a background thread right after startup.
 """
 
+import itertools
+import json
+import logging
 import os
 import secrets
+import threading
+from time import perf_counter
 from datetime import datetime
 import jwt
 from dotenv import load_dotenv
 
-from flask import Flask, redirect, url_for, session, request, jsonify
+from flask import (
+    Blueprint, Flask, Response, current_app, redirect, url_for, session, request, jsonify,
+    stream_with_context
+)
 from flask_cors import CORS
-from google.auth.transport.requests import Request
-from google.oauth2 import id_token
-from google.oauth2.credentials import Credentials
-from google.cloud.firestore import DELETE_FIELD
-from google.cloud.firestore_v1.base_query import FieldFilter
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+from werkzeug.local import LocalProxy
 
 from event import Event
-from firebase_db import get_db
-from helpers import get_user_email, get_user_credentials, get_id
+from log_config import configure_logging
+from metrics import init_metrics, record_read_cache, record_storage_operation, track_google_api
+from helpers import get_user_email, get_user_credentials, get_id, get_page_params, has_ended
+from recurrence import (
+    calendar_link_target, find_occurrence, is_recurring, occurrences, rebase, rsvp_emails,
+    rsvp_target, split_occurrence_id, with_exdate, with_override
+)
+from singleflight import SingleFlight
+from snapshot import SnapshotReader
+from stats import change_deltas, event_deltas, format_stats, rsvp_deltas, window_days
+from tracing import TracingStore, init_tracing, tracing_enabled
+from storage import CountingStore, get_store
+from storage.base import matches_listing
 
 load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+configure_logging()
+logger = logging.getLogger(__name__)
 PORT = os.getenv("PORT", "8080")
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8080")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
-# getting relevant keys
-app = Flask(__name__)
-app.secret_key = os.getenv("SECRET_KEY", "supersecretkey")
-CORS(app, supports_credentials=True, origins=[FRONTEND_URL, f"{FRONTEND_URL}/map"])
-
-app.config["GOOGLE_CLIENT_ID"] = os.getenv("GOOGLE_CLIENT_ID", "your-client-id")
+SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecurejwtkey")
 
-app.config["GOOGLE_CLIENT_SECRET"] = os.getenv(
-    "GOOGLE_CLIENT_SECRET", "your-client-secret"
-)
-app.config["GOOGLE_REDIRECT_URI"] = os.getenv(
-    "GOOGLE_REDIRECT_URI", f"{BACKEND_URL}/authorize"
-)
+# if FRONTEND_URL is localhost http connection
+if FRONTEND_URL[:4] != "https":
+    os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
+os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 
-app.config.update(
-    SESSION_COOKIE_SAMESITE="None",
-    SESSION_COOKIE_SECURE=True,
-)
+api = Blueprint("api", __name__)
+_init_lock = threading.Lock()
+
+def get_event_store(flask_app=None):
+    """Returns the app's storage backend, creating it the first time it's needed"""
+    flask_app = flask_app or current_app
+    store = flask_app.extensions.get("event_store")
+    if store is None:
+        with _init_lock:
+            store = flask_app.extensions.get("event_store")
+            if store is None:
+                # storage backend selected by STORAGE_BACKEND, Firestore by default
+                store = get_store(flask_app.config["STORAGE_BACKEND"])
+                if tracing_enabled():
+                    store = TracingStore(store)
+                store = CountingStore(store, on_op=record_storage_operation)
+                flask_app.extensions["event_store"] = store
+    return store
+
+# the current app's store and read cache, resolved when a request uses them
+db = LocalProxy(get_event_store)
+shared_reads = LocalProxy(lambda: current_app.extensions["shared_reads"])
+
+def warm_up(flask_app):
+    """Creates the storage client and imports the Google libraries ahead of the first request"""
+    started = perf_counter()
+    try:
+        store = get_event_store(flask_app)
+        # opens the connection to the backend, costs one document read
+        store.event_exists("warmup")
+        # pylint: disable=import-outside-toplevel,unused-import
+        import google_auth_oauthlib.flow
+        import googleapiclient.discovery
+        import google.oauth2.id_token
+    except Exception:
+        logger.exception("Warm-up failed")
+        return
+    logger.info("Warm-up finished", extra={"ms": round((perf_counter() - started) * 1000)})
+
+def create_app(config=None):
+    """Creates the Flask app, with config overriding the settings read from env variables"""
+    flask_app = Flask(__name__)
+    flask_app.secret_key = os.getenv("SECRET_KEY", "supersecretkey")
+    flask_app.config.update(
+        GOOGLE_CLIENT_ID=os.getenv("GOOGLE_CLIENT_ID", "your-client-id"),
+        GOOGLE_CLIENT_SECRET=os.getenv("GOOGLE_CLIENT_SECRET", "your-client-secret"),
+        GOOGLE_REDIRECT_URI=os.getenv("GOOGLE_REDIRECT_URI", f"{BACKEND_URL}/authorize"),
+        SESSION_COOKIE_SAMESITE="None",
+        SESSION_COOKIE_SECURE=True,
+        STORAGE_BACKEND=os.getenv("STORAGE_BACKEND", "firestore"),
+        READ_CACHE_TTL=float(os.getenv("READ_CACHE_TTL", "1.0")),
+        WARMUP=os.getenv("WARMUP", "").lower() in ("1", "true"),
+        SNAPSHOT_PATH=os.getenv("SNAPSHOT_PATH"),
+        SNAPSHOT_MAX_AGE=float(os.getenv("SNAPSHOT_MAX_AGE", "30")),
+    )
+    flask_app.config.update(config or {})
 
-SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecurejwtkey")
+    CORS(flask_app, supports_credentials=True, origins=[FRONTEND_URL, f"{FRONTEND_URL}/map"])
+    init_metrics(flask_app)
+    if tracing_enabled():
+        init_tracing(flask_app)
+    flask_app.register_blueprint(api)
 
-db = get_db()
+    # concurrent identical list reads share one Firestore fetch
+    flask_app.extensions["shared_reads"] = SingleFlight(
+        ttl=flask_app.config["READ_CACHE_TTL"], on_result=record_read_cache
+    )
+    # list routes are served from the producer's snapshot while it's fresh
+    if flask_app.config["SNAPSHOT_PATH"]:
+        flask_app.extensions["snapshot"] = SnapshotReader(
+            flask_app.config["SNAPSHOT_PATH"], flask_app.config["SNAPSHOT_MAX_AGE"]
+        )
+    if flask_app.config["WARMUP"]:
+        threading.Thread(target=warm_up, args=(flask_app,), name="warm-up", daemon=True).start()
+    return flask_app
 
 def get_google_flow():
     """Gets google login flow using env variables"""
+    from google_auth_oauthlib.flow import Flow  # pylint: disable=import-outside-toplevel
     return Flow.from_client_config(
         {
             "web": {
-                "client_id": app.config["GOOGLE_CLIENT_ID"],
-                "client_secret": app.config["GOOGLE_CLIENT_SECRET"],
+                "client_id": current_app.config["GOOGLE_CLIENT_ID"],
+                "client_secret": current_app.config["GOOGLE_CLIENT_SECRET"],
                 "auth_uri": "https://accounts.google.com/o/oauth2/auth",
                 "token_uri": "https://oauth2.googleapis.com/token",
-                "redirect_uris": [app.config["GOOGLE_REDIRECT_URI"]],
+                "redirect_uris": [current_app.config["GOOGLE_REDIRECT_URI"]],
             }
         },
         scopes=[
@@ -72,71 +154,49 @@ def get_google_flow():
         ],
     )
 
+def calendar_service(credentials_dict):
+    """Builds a Google Calendar client for the user's OAuth credentials"""
+    # pylint: disable=import-outside-toplevel
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build
 
-# if FRONTEND_URL is localhost http connection
-if FRONTEND_URL[:4] != "https":
-    os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
-os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
+    calendar_credentials = Credentials(
+        token=credentials_dict.get('token'),
+        refresh_token=credentials_dict.get('refresh_token'),
+        token_uri="https://oauth2.googleapis.com/token",
+        client_id=current_app.config["GOOGLE_CLIENT_ID"],
+        client_secret=current_app.config["GOOGLE_CLIENT_SECRET"],
+    )
+    return build('calendar', 'v3', credentials=calendar_credentials)
 
-def is_expired(event):
+def is_expired(event_id, event_obj):
     """Checks if an event is expired and updates Firestore if necessary."""
-    event_obj = event.to_dict()
-    current_time = int(datetime.now().timestamp())
-    end_time_obj = event_obj.get("endTime")
-    if not end_time_obj:
-        return False
-    end_time = int(end_time_obj.timestamp())
-    if end_time < current_time:
-        event_ref = db.collection("events").document(event.id)
-        event_ref.update({"status": "expired"})  # update Firestore
-        print(f"Event {event.id} marked as expired.")
+    if has_ended(event_obj):
+        # concurrent requests can find the same event ended, only one expires it
+        if db.expire_event(event_id):  # update Firestore
+            db.update_stats(event_deltas(event_obj, -1))
+            logger.info("Event marked as expired", extra={"event_id": event_id})
         return True  # return True to indicate event is expired
     return False  # event is still active
 
 def create_calendar_event(event, credentials_dict):
     """Creates Google Calendar event from RSVP"""
-    calendar_credentials = Credentials(
-        token=credentials_dict.get('token'),
-        refresh_token=credentials_dict.get('refresh_token'),
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=app.config["GOOGLE_CLIENT_ID"],
-        client_secret=app.config["GOOGLE_CLIENT_SECRET"],
-    )
-
-    service = build('calendar', 'v3', credentials=calendar_credentials)
+    service = calendar_service(credentials_dict)
 
-    event_body = {
-        'summary': event.title,
-        'description': event.description,
-        'start': {
-            'dateTime': event.start_time.isoformat(),
-            'timeZone': 'UTC',
-        },
-        'end': {
-            'dateTime': event.end_time.isoformat(),
-            'timeZone': 'UTC',
-        },
-        'location': event.address,
-        'reminders': {
-            'useDefault': False,
-            'overrides': [
-                {'method': 'email', 'minutes': 24 * 60},
-                {'method': 'popup', 'minutes': 60},
-            ],
-        },
-    }
+    event_body = event.calendar_body()
 
     try:
-        calendar_event = service.events().insert(
-            calendarId='primary',
-            body=event_body
-        ).execute()
+        with track_google_api("calendar.events.insert"):
+            calendar_event = service.events().insert(
+                calendarId='primary',
+                body=event_body
+            ).execute()
         return calendar_event['id']
-    except Exception as e:
-        print(f"Error creating calendar event: {e}")
+    except Exception:
+        logger.exception("Error creating calendar event")
         return None
 
-@app.route("/login")
+@api.route("/login")
 def login():
     """login endpoint"""
     next_url = request.args.get("next", "/")
@@ -144,7 +204,7 @@ def login():
     session["nonce"] = secrets.token_urlsafe(16)
 
     flow = get_google_flow()
-    flow.redirect_uri = app.config["GOOGLE_REDIRECT_URI"]
+    flow.redirect_uri = current_app.config["GOOGLE_REDIRECT_URI"]
 
     authorization_url, state = flow.authorization_url(
         access_type="offline",
@@ -154,9 +214,13 @@ def login():
     session["state"] = state
     return redirect(authorization_url)
 
-@app.route("/authorize")
+@api.route("/authorize")
 def authorize():
     """Google OAuth endpoint"""
+    # pylint: disable=import-outside-toplevel
+    from google.auth.transport.requests import Request
+    from google.oauth2 import id_token
+
     state = session.pop("state", None)
     if not state or state != request.args.get("state"):
         return "Invalid state parameter", 400
@@ -166,18 +230,20 @@ def authorize():
         return "Session expired or nonce missing", 400
 
     flow = get_google_flow()
-    flow.redirect_uri = app.config["GOOGLE_REDIRECT_URI"]
-    flow.fetch_token(authorization_response=request.url)
+    flow.redirect_uri = current_app.config["GOOGLE_REDIRECT_URI"]
+    with track_google_api("oauth.fetch_token"):
+        flow.fetch_token(authorization_response=request.url)
     # print(flow.credentials)
     auth_creds = flow.credentials
 
     try:
-        id_info = id_token.verify_oauth2_token(
-            auth_creds.id_token,
-            Request(),
-            app.config["GOOGLE_CLIENT_ID"],
-            clock_skew_in_seconds=10,
-        )
+        with track_google_api("oauth.verify_id_token"):
+            id_info = id_token.verify_oauth2_token(
+                auth_creds.id_token,
+                Request(),
+                current_app.config["GOOGLE_CLIENT_ID"],
+                clock_skew_in_seconds=10,
+            )
     except ValueError as e:
         return f"Failed to verify ID token: {str(e)}", 400
 
@@ -204,7 +270,7 @@ def authorize():
     next_url = session.pop("next", "/")
     return redirect(f"{next_url}?token={jwt_token}")
 
-@app.route("/logout")
+@api.route("/logout")
 def logout():
     """Endpoint for clearing users authorization cookie"""
     session.clear()
@@ -212,181 +278,354 @@ def logout():
     response.set_cookie("session", "", expires=0)
     return response
 
-@app.route("/state")
+def load_event(event_id):
+    """Returns (data, series) for an event id: the stored event and None, or for an
+    occurrence of a recurring series its expanded data and the stored series"""
+    occurrence = split_occurrence_id(event_id)
+    if occurrence is None:
+        return db.get_event(event_id), None
+    series_id, key = occurrence
+    series = db.get_event(series_id)
+    return find_occurrence(series_id, series, key), series
+
+def get_event_data(event_id):
+    """Returns the stored data of an event, or of one occurrence of a recurring series"""
+    return load_event(event_id)[0]
+
+def event_exists(event_id):
+    """Checks if an event or an occurrence of a recurring series exists"""
+    if split_occurrence_id(event_id) is None:
+        return db.event_exists(event_id)
+    return get_event_data(event_id) is not None
+
+def list_page(cursor, category=None, bounds=None, at=None):
+    """Lists active events after a cursor, optionally in a bounding box or overlapping
+    a time, and returns (listing, resume). When the previous page ended inside a
+    recurring series the listing starts with that series again and resume is the
+    (series_id, key) of the occurrence to resume after."""
+    resume = split_occurrence_id(cursor) if cursor else None
+    if resume is None:
+        return db.list_events(category=category, cursor=cursor, bounds=bounds, at=at), None
+    series_id = resume[0]
+    data = db.get_event(series_id)
+    head = []
+    if is_recurring(data) and matches_listing(data, "active", category, bounds, at):
+        head = [(series_id, data)]
+    rest = db.list_events(category=category, cursor=series_id, bounds=bounds, at=at)
+    return itertools.chain(head, rest), resume
+
+def iter_active_events(events, predicate=None, limit=None, window=(None, None), resume=None):
+    """Yields active events from a store listing one at a time, skipping expired ones.
+    The listing is consumed lazily so only as many documents as needed are read.
+    Recurring series are expanded into their occurrences within window."""
+    count = 0
+    for event_id, event_obj in events:
+        if limit is not None and count >= limit:
+            break
+        if is_expired(event_id, event_obj):  # check if event recently expired
+            continue
+        for item_id, item in occurrences(event_id, event_obj, window, resume):
+            if limit is not None and count >= limit:
+                break
+            if predicate and not predicate(item):
+                continue
+            item["eventId"] = item_id
+            yield item
+            count += 1
+
+EVENTS_JSON_START = '{"status": 200, "state": {"events": ['
+
+def events_json_end(last_id, count, limit):
+    """Closes a streamed event list, adding the cursor of a full page"""
+    next_cursor = last_id if limit is not None and count == limit else None
+    return f"]}}, \"nextCursor\": {json.dumps(next_cursor)}}}"
+
+def stream_events_json(events, limit):
+    """Writes the event list JSON incrementally as events arrive"""
+    yield EVENTS_JSON_START
+    last_id = None
+    count = 0
+    for event_obj in events:
+        yield ("," if count else "") + current_app.json.dumps(event_obj)
+        last_id = event_obj["eventId"]
+        count += 1
+    yield events_json_end(last_id, count, limit)
+
+def snapshot_json_chunks(events, limit):
+    """Writes the event list JSON from the (event_id, event JSON) of a snapshot"""
+    yield EVENTS_JSON_START.encode()
+    last_id = None
+    count = 0
+    for last_id, event_json in events:
+        yield (b"," if count else b"") + event_json
+        count += 1
+    yield events_json_end(last_id, count, limit).encode()
+
+def snapshot_events_json(flask_app, page, category=None, at=None, window=None):
+    """Builds an event list body from the shared snapshot, as bytes or, for a streamed
+    page, an iterator of bytes chunks. Returns None when there's no fresh snapshot and
+    the store has to be read."""
+    reader = flask_app.extensions.get("snapshot")
+    snapshot = reader.current() if reader is not None else None
+    if snapshot is None:
+        return None
+    events = snapshot.select(flask_app.json.dumps, page["cursor"], category=category, at=at,
+                             limit=page["limit"], window=window or page["window"],
+                             bounds=page["bounds"])
+    chunks = snapshot_json_chunks(events, page["limit"])
+    return chunks if page["stream"] else b"".join(chunks)
+
+def events_response(events, limit, stream):
+    """Returns a list of events either as one JSON body or a streamed JSON array.
+    Buffered responses for the same path and page are coalesced across requests."""
+    if stream:
+        return Response(
+            stream_with_context(stream_events_json(events, limit)),
+            mimetype="application/json",
+        )
+    key = (request.path, request.args.get("cursor") or None, limit,
+           request.args.get("from"), request.args.get("to"), request.args.get("bounds"))
+    state = {"events": shared_reads.do(key, lambda: list(events))}
+    next_cursor = None
+    if limit is not None and len(state["events"]) == limit:
+        next_cursor = state["events"][-1]["eventId"]
+    return jsonify({"status": 200, "state": state, "nextCursor": next_cursor})
+
+@api.route("/state")
 def get_state():
     """Endpoint to retrieve map state from Firestore."""
+    page = get_page_params()
+    if not isinstance(page, dict):
+        return page
     try:
-        state = {"events": []}
-        events = (
-            db.collection("events")
-            .where(filter=FieldFilter("status", "==", "active"))
-            .stream())
-        for event in events:
-            if is_expired(event):  # check if event recently expired
-                continue
-            event_obj = event.to_dict()
-            event_obj["eventId"] = event.id
-            state["events"].append(event_obj)
-        return jsonify({"status": 200, "state": state})
+        body = snapshot_events_json(current_app, page)
+        if body is not None:
+            return Response(body, mimetype="application/json")
+        listing, resume = list_page(page["cursor"], bounds=page["bounds"])
+        events = iter_active_events(listing, limit=page["limit"], window=page["window"],
+                                    resume=resume)
+        return events_response(events, page["limit"], page["stream"])
     except Exception as e:
+        logger.exception("Error listing events")
         return jsonify({"status": 500, "error": str(e)}), 500
 
-@app.route("/create_event", methods=["POST"])
+@api.route("/create_event", methods=["POST"])
 def create_event():
     """Endpoint for creating an event"""
     event = Event.request_to_event(db)
-    assert isinstance(event, Event)
+    if not isinstance(event, Event):
+        return event
 
-    event_ref = event.create()
-    doc = event_ref.get()
+    event_id = event.create()
+    db.update_stats(event_deltas(event.to_dict()))
+    shared_reads.clear()
 
     return (
         jsonify(
             {
                 "message": "Event created successfully",
-                "eventId": event_ref.id,
-                "firestoreData": doc.to_dict(),
+                "eventId": event_id,
+                "firestoreData": event.to_dict(),
             }
         ),
         201,
     )
 
-@app.route("/update_event", methods=["POST"])
+@api.route("/update_event", methods=["POST"])
 def update_event():
     """Endpoint for updating an existing event"""
     event_id = get_id()
-    old_event = Event.get(event_id, db)
+    old_data, series = load_event(event_id)
     updated_event = Event.request_to_event(db)
-    assert isinstance(updated_event, Event)
+    if not isinstance(updated_event, Event):
+        return updated_event
 
-    if not old_event:
+    if not old_data:
         return jsonify({"error": "Event not found"}), 404
 
-    if old_event.owner_email != updated_event.owner_email:
+    if old_data["ownerEmail"] != updated_event.owner_email:
         return jsonify({"error": "Unauthorized to update this event"}), 403
 
-    updated_event.update(event_id)
+    if series is not None:
+        # an occurrence only stores the fields that differ from its series
+        series_id, key = split_occurrence_id(event_id)
+        recurrence = with_override(series["recurrence"], key, old_data, updated_event.to_dict())
+        db.update_event(series_id, {"recurrence": recurrence})
+    else:
+        if is_recurring(old_data):
+            try:
+                updated_event.recurrence = rebase(
+                    old_data["recurrence"], updated_event.recurrence,
+                    updated_event.start_time, updated_event.end_time,
+                )
+            except (ValueError, OverflowError) as e:
+                return jsonify({"error": f"Invalid recurrence: {str(e)}"}), 400
+        # update replaces the whole recurrence map, a merge would keep dropped overrides.
+        # The counters change by the difference to the data it replaced, which can be
+        # newer than old_data or gone when requests race.
+        fields = updated_event.to_dict()
+        previous = db.update_event(event_id, fields)
+        if previous is None:
+            return jsonify({"error": "Event not found"}), 404
+        db.update_stats(change_deltas(previous, {**previous, **fields}))
+    shared_reads.clear()
     return jsonify({"message": "Event updated successfully"}), 200
 
-@app.route("/delete_event/<event_id>", methods=["DELETE"])
+@api.route("/delete_event/<event_id>", methods=["DELETE"])
 def delete_event(event_id):
     """Endpoint for deleting an existing event"""
     user_email = get_user_email()
     if not user_email:
         return jsonify({"error": "Unauthorized"}), 401
 
-    event = Event.get(event_id, db)
-    if not event:
+    data, series = load_event(event_id)
+    if not data:
         return jsonify({"error": "Event not found"}), 404
 
-    if event.owner_email != user_email:
+    if data["ownerEmail"] != user_email:
         return jsonify({"error": "Unauthorized to delete this event"}), 403
 
-    event.delete()
+    if series is not None:
+        # deleting one occurrence excludes it from its series
+        series_id, key = split_occurrence_id(event_id)
+        db.update_event(series_id, {"recurrence": with_exdate(series["recurrence"], key)})
+    else:
+        rsvps = db.delete_event(event_id)
+        if rsvps is None:
+            # a concurrent request deleted it and subtracted it from the counters
+            return jsonify({"error": "Event not found"}), 404
+        deltas = event_deltas(data, -1)
+        if rsvps:
+            deltas.update(rsvp_deltas(-rsvps))
+        db.update_stats(deltas)
+    shared_reads.clear()
     return jsonify({"message": "Event deleted successfully"}), 200
 
-@app.route("/rsvp/<event_id>", methods=["POST"])
+@api.route("/rsvp/<event_id>", methods=["POST"])
 def rsvp_event(event_id):
     """Endpoint for rsvping a user to an existing event"""
     user_email = get_user_email()
     if not user_email:
         return jsonify({"error": "Unauthorized"}), 401
 
-    event = Event.get(event_id, db)
-    if not event:
+    # only existence matters here, so skip loading the whole event
+    if not event_exists(event_id):
         return jsonify({"error": "Event not found"}), 404
 
-    event.event_id = event_id
-    event.rsvp_add(user_email)
+    if db.create_rsvp(*rsvp_target(event_id, user_email), Event.rsvp_data(user_email)):
+        db.update_stats(rsvp_deltas())
     return jsonify({"message": "RSVP successful"}), 200
 
-@app.route("/unrsvp/<event_id>", methods=["DELETE"])
+@api.route("/unrsvp/<event_id>", methods=["DELETE"])
 def unrsvp_event(event_id):
     """Endpoint for removing user from rsvp list without removing from calendar"""
     user_email = get_user_email()
     if not user_email:
         return jsonify({"error": "Unauthorized"}), 401
 
-    event = Event.get(event_id, db)
-    if not event:
+    if not event_exists(event_id):
         return jsonify({"error": "Event not found"}), 404
 
-    event.event_id = event_id
-    event.rsvp_remove(user_email)
+    if db.remove_rsvp(*rsvp_target(event_id, user_email)):
+        db.update_stats(rsvp_deltas(-1))
 
     return jsonify({"message": "RSVP removed successfully"}), 200
 
-@app.route("/rsvps/<event_id>", methods=["GET"])
+@api.route("/rsvps/<event_id>", methods=["GET"])
 def get_event_rsvps(event_id):
     """Endpoint for retrieving rsvp list of an existing event"""
-    event = Event.get(event_id, db)
-    if not event:
+    if not event_exists(event_id):
         return jsonify({"error": "Event not found"}), 404
 
-    event.event_id = event_id
-    rsvps = event.get_rsvps()
+    rsvps = rsvp_emails(event_id, db.list_rsvps(*rsvp_target(event_id)))
     return jsonify(rsvps), 200
 
-@app.route("/filter_events/<option>", methods=["GET"])
+@api.route("/event/<event_id>", methods=["GET"])
+def get_event_details(event_id):
+    """Endpoint for retrieving an event, read from the archive once it was archived"""
+    data = get_event_data(event_id)
+    archived = data is None
+    if archived:
+        data = db.get_archived_event(event_id)
+        if data is None:
+            return jsonify({"error": "Event not found"}), 404
+    # other users' calendar event ids aren't part of the public event details
+    data.pop("calendar_events", None)
+    data["eventId"] = event_id
+    return jsonify({"event": data, "archived": archived}), 200
+
+@api.route("/stats", methods=["GET"])
+def get_stats():
+    """Endpoint for event counts by category and start time and the RSVP total,
+    optionally limited to time buckets between the from and to query params"""
+    try:
+        window = tuple(
+            datetime.fromisoformat(request.args[bound]) if request.args.get(bound) else None
+            for bound in ("from", "to")
+        )
+    except ValueError as e:
+        return jsonify({"error": f"Invalid date format: {str(e)}"}), 400
+    return jsonify({"status": 200, "stats": format_stats(db.get_stats(*window_days(window)), window)}), 200
+
+@api.route("/filter_events/<option>", methods=["GET"])
 def filter_events(option):
     """Endpoint for filtering displayed events by category"""
+    page = get_page_params()
+    if not isinstance(page, dict):
+        return page
     try:
-        print("FILTER OPTION:", option)
-        state = {"events":[]}
-        events = (
-            db.collection("events")
-            .where(filter=FieldFilter("status", "==", "active"))
-            .stream())
-        for event in events:
-            if is_expired(event):  # skip expired events
-                continue
-            event_obj = event.to_dict()
-            if event_obj.get("category") == option:
-                event_obj["eventId"] = event.id
-                state["events"].append(event_obj)
-        return jsonify({"status": 200, "state": state})
+        logger.debug("Filtering events by category", extra={"category": option})
+        body = snapshot_events_json(current_app, page, category=option)
+        if body is not None:
+            return Response(body, mimetype="application/json")
+        listing, resume = list_page(page["cursor"], category=option, bounds=page["bounds"])
+        events = iter_active_events(listing, limit=page["limit"], window=page["window"],
+                                    resume=resume)
+        return events_response(events, page["limit"], page["stream"])
     except Exception as e:
-        print(e)
+        logger.exception("Error listing events")
         return jsonify({"status": 500, "error": str(e)}), 500
 
-@app.route("/filter_times/<time>", methods=["GET"])
+@api.route("/filter_times/<time>", methods=["GET"])
 def filter_times(time):
     """Endpoint for filtering displayed events by times"""
+    page = get_page_params()
+    if not isinstance(page, dict):
+        return page
     try:
-        print("FILTER OPTION:", time)
+        logger.debug("Filtering events by time", extra={"time": time})
         dt_object = datetime.strptime(time, "%Y-%m-%dT%H:%M")
         current_time = int(dt_object.timestamp())
-        state = {"events":[]}
-        events = (
-            db.collection("events")
-            .where(filter=FieldFilter("status", "==", "active"))
-            .stream())
-        for event in events:
-            if is_expired(event):  # skip expired events
-                continue
-            event_obj = event.to_dict()
-            start_time_obj = event_obj.get("startTime")
-            end_time_obj = event_obj.get("endTime")
-            start_time = int(start_time_obj.timestamp())
-            end_time = int(end_time_obj.timestamp())
-            if start_time < current_time < end_time:
-                event_obj["eventId"] = event.id
-                state["events"].append(event_obj)
-        return jsonify({"status": 200, "state": state})
+
+        def is_happening(event_obj):
+            start_time = int(event_obj.get("startTime").timestamp())
+            end_time = int(event_obj.get("endTime").timestamp())
+            return start_time < current_time < end_time
+
+        body = snapshot_events_json(current_app, page, at=dt_object,
+                                    window=(dt_object, dt_object))
+        if body is not None:
+            return Response(body, mimetype="application/json")
+        # only occurrences of recurring series overlapping this time are expanded
+        listing, resume = list_page(page["cursor"], bounds=page["bounds"], at=dt_object)
+        events = iter_active_events(listing, predicate=is_happening, limit=page["limit"],
+                                    window=(dt_object, dt_object), resume=resume)
+        return events_response(events, page["limit"], page["stream"])
     except Exception as e:
-        print(e)
+        logger.exception("Error listing events")
         return jsonify({"status": 500, "error": str(e)}), 500
 
-@app.route("/add_to_calendar/<event_id>", methods=["POST"])
+@api.route("/add_to_calendar/<event_id>", methods=["POST"])
 def add_to_calendar(event_id):
     """Endpoint for adding event to Google Calendar"""
     user_email = get_user_email()
     if not user_email:
         return jsonify({"error": "Unauthorized"}), 401
 
-    event = Event.get(event_id, db)
-    if not event:
+    data = get_event_data(event_id)
+    if not data:
         return jsonify({"error": "Event not found"}), 404
+    event = Event.from_dict(event_id, data, db)
 
     user_creds = get_user_credentials()
     if not user_creds:
@@ -396,73 +635,51 @@ def add_to_calendar(event_id):
     if not calendar_event_id:
         return jsonify({"error": "Failed to create calendar event"}), 500
 
-    safe_email = user_email.replace('@', '_at_').replace('.', '_dot_')
-
-    event_ref = db.collection("events").document(event_id)
-    event_ref.update({
-        f"calendar_events.{safe_email}": calendar_event_id
-    })
+    db.set_calendar_link(*calendar_link_target(event_id, user_email), calendar_event_id)
 
     return jsonify({
         "message": "Event added to calendar successfully",
         "calendarEventId": calendar_event_id
     }), 200
 
-@app.route("/remove_from_calendar/<event_id>", methods=["DELETE"])
+@api.route("/remove_from_calendar/<event_id>", methods=["DELETE"])
 def remove_event_from_calendar(event_id):
     """Endpoint for removing an event from user's Google Calendar"""
     user_email = get_user_email()
     if not user_email:
         return jsonify({"error": "Unauthorized"}), 401
 
-    event = Event.get(event_id, db)
-    if not event:
-        return jsonify({"error": "Event not found"}), 404
+    # the calendar link is read once and the event is only checked when it's missing
+    link = calendar_link_target(event_id, user_email)
+    calendar_event_id = db.get_calendar_link(*link)
+    if not calendar_event_id:
+        if not event_exists(event_id):
+            return jsonify({"error": "Event not found"}), 404
+        return jsonify({"error": "No calendar event found for this user"}), 404
 
     user_creds = get_user_credentials()
     if not user_creds:
         return jsonify({"error": "Calendar authorization required"}), 401
 
     try:
-        calendar_credentials = Credentials(
-            token=user_creds.get('token'),
-            refresh_token=user_creds.get('refresh_token'),
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=app.config["GOOGLE_CLIENT_ID"],
-            client_secret=app.config["GOOGLE_CLIENT_SECRET"],
-        )
+        service = calendar_service(user_creds)
 
-        service = build('calendar', 'v3', credentials=calendar_credentials)
+        with track_google_api("calendar.events.delete"):
+            service.events().delete(
+                calendarId='primary',
+                eventId=calendar_event_id
+            ).execute()
 
-        safe_email = user_email.replace('@', '_at_').replace('.', '_dot_')
-
-        event_ref = db.collection("events").document(event_id)
-        event_doc = event_ref.get()
-
-        if not event_doc.exists:
-            return jsonify({"error": "Event not found in database"}), 404
-
-        calendar_events = event_doc.to_dict().get('calendar_events', {})
-        calendar_event_id = calendar_events.get(safe_email)
-
-        if not calendar_event_id:
-            return jsonify({"error": "No calendar event found for this user"}), 404
-
-        service.events().delete(
-            calendarId='primary',
-            eventId=calendar_event_id
-        ).execute()
-
-        event_ref.update({
-            f"calendar_events.{safe_email}": DELETE_FIELD
-        })
+        db.remove_calendar_link(*link)
 
         return jsonify({"message": "Event removed from calendar successfully"}), 200
 
     except Exception as e:
-        print(f"Error removing calendar event: {e}")
+        logger.exception("Error removing calendar event", extra={"event_id": event_id})
         return jsonify({"error": f"Failed to remove calendar event: {str(e)}"}), 500
 
 
+app = create_app()
+
 if __name__ == "__main__":
     app.run(debug=True, host="localhost", port=8080)
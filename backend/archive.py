@@ -0,0 +1,120 @@
+"""
+archive.py
+
+Moves expired events that ended more than a retention period ago out of the
+events collection. Each one is replaced by a small summary in the archive
+(without the image and with an RSVP count instead of the RSVPs), and its
+RSVPs and calendar links are deleted. Archived events are still served by
+the /event/<event_id> endpoint. The hour and day statistics buckets of the
+days before the retention period are dropped as well.
+
+Run from the backend directory, e.g. daily from a scheduled job:
+    python archive.py --retention-days 30
+    python archive.py --retention-days 30 --export archive.ndjson.gz
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+from log_config import configure_logging
+from stats import rsvp_deltas
+from storage import CountingStore, get_store
+
+logger = logging.getLogger(__name__)
+
+RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "30"))
+# events archived per batch of store writes
+BATCH_SIZE = 200
+
+SUMMARY_FIELDS = (
+    "title", "description", "startTime", "endTime", "address", "location", "category",
+    "ownerEmail", "createdAt",
+)
+
+
+def summarize(data, archived_at):
+    """Keeps the fields needed to show an archived event"""
+    summary = {field: data.get(field) for field in SUMMARY_FIELDS}
+    summary["archivedAt"] = archived_at
+    return summary
+
+
+def ended_before(data, cutoff):
+    """Checks if an event, or the last occurrence of a recurring series, ended before
+    the cutoff time"""
+    end_time = data.get("endTime")
+    if data.get("recurrence") is not None:
+        end_time = data["recurrence"].get("lastEnd")
+    return end_time is not None and end_time.timestamp() < cutoff.timestamp()
+
+
+def export_ndjson(path, archived):
+    """Appends archived summaries to a gzip compressed NDJSON file"""
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for event_id, summary in archived.items():
+            f.write(json.dumps({"eventId": event_id, **summary}, default=str) + "\n")
+
+
+def archive_expired(store, retention_days=RETENTION_DAYS, batch_size=BATCH_SIZE,
+                    export_path=None, dry_run=False, now=None):
+    """Archives expired events that ended more than retention_days ago in batches
+    and returns how many events were scanned and archived and how many days of
+    statistics buckets were dropped"""
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=retention_days)
+    result = {"scanned": 0, "archived": 0, "droppedDays": 0}
+    cursor = None
+    while True:
+        batch = {}
+        exhausted = True
+        # the listing is restarted after every batch, resuming after the last scanned event
+        for event_id, data in store.list_events(status="expired", cursor=cursor):
+            cursor = event_id
+            result["scanned"] += 1
+            if ended_before(data, cutoff):
+                batch[event_id] = summarize(data, now)
+                if len(batch) >= batch_size:
+                    exhausted = False
+                    break
+        if batch and not dry_run:
+            archived = store.archive_events(batch)
+            # archived events were already expired, only their RSVPs leave the stats
+            rsvp_count = sum(summary["rsvpCount"] for summary in archived.values())
+            if rsvp_count:
+                store.update_stats(rsvp_deltas(-rsvp_count))
+            if export_path:
+                export_ndjson(export_path, archived)
+            logger.info("Archived events", extra={"count": len(archived), "cursor": cursor})
+        result["archived"] += len(batch)
+        if exhausted:
+            if not dry_run:
+                result["droppedDays"] = store.drop_stats_before(f"{cutoff:%Y-%m-%d}")
+            return result
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS,
+                        help="archive events that ended more than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--export", help="also append archived summaries to this .ndjson.gz file")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only count the events that would be archived")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    store = CountingStore(get_store())
+    result = archive_expired(store, args.retention_days, args.batch_size,
+                             args.export, args.dry_run)
+    logger.info("Archive finished", extra={**result, **store.counts, "dry_run": args.dry_run})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,470 @@
+"""
+asgi.py
+
+ASGI entry point that serves the api from an event loop:
+    uvicorn asgi:application --host 0.0.0.0 --port 8080
+
+The event list, RSVP and calendar routes run as coroutines on the Firestore
+AsyncClient and httpx, so waiting on Firestore streams or Google APIs doesn't
+hold a worker thread. Every other route (login, OAuth, event writes, metrics)
+is passed through to the Flask app, which runs in the event loop's default
+thread pool, so fallback requests run side by side.
+"""
+
+import asyncio
+import logging
+import re
+import time
+from contextlib import aclosing, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+import app as flask_module
+from event import Event
+from google_async import AsyncCalendar
+from helpers import decode_jwt_token, has_ended, parse_page_params
+from metrics import (
+    REQUEST_LATENCY, REQUESTS_IN_FLIGHT, record_read_cache, record_storage_operation
+)
+from recurrence import (
+    calendar_link_target, find_occurrence, is_recurring, occurrences, rsvp_emails, rsvp_target,
+    split_occurrence_id
+)
+from singleflight import AsyncSingleFlight
+from stats import event_deltas, rsvp_deltas
+from storage import CountingStore
+from storage.async_store import get_async_store
+from storage.base import matches_listing
+from storage.counting_store import AsyncCountingStore
+from tracing import AsyncTracingStore, TracingStore, trace_request, tracing_enabled
+
+logger = logging.getLogger(__name__)
+
+flask_app = flask_module.app
+
+
+class ThreadPoolWsgiInstance(WsgiToAsgiInstance):
+    """Runs one request of the WSGI app in the default thread pool. asgiref runs it
+    thread sensitive, on the one thread shared by every request."""
+
+    async def run_wsgi_app(self, body):  # pylint: disable=invalid-overridden-method
+        # the plain function under asgiref's thread sensitive sync_to_async
+        run = vars(WsgiToAsgiInstance)["run_wsgi_app"].func
+        await sync_to_async(run, thread_sensitive=False)(self, body)
+
+
+class ThreadPoolWsgiToAsgi(WsgiToAsgi):  # pylint: disable=too-few-public-methods
+    """WsgiToAsgi serving requests concurrently, see ThreadPoolWsgiInstance"""
+
+    async def __call__(self, scope, receive, send):
+        await ThreadPoolWsgiInstance(self.wsgi_application)(scope, receive, send)
+
+
+wsgi_fallback = ThreadPoolWsgiToAsgi(flask_app)
+# event writes are served by the Flask app and clear its cache, which clears this one too
+shared_reads = AsyncSingleFlight(
+    ttl=flask_app.config["READ_CACHE_TTL"], on_result=record_read_cache,
+    follow=lambda: flask_app.extensions["shared_reads"].generation,
+)
+CORS_ORIGINS = {flask_module.FRONTEND_URL, f"{flask_module.FRONTEND_URL}/map"}
+
+# clients are created on first use so they bind to the running event loop
+_clients = {}
+ROUTES = []
+# url pattern of the async route being served, the label its storage operations count under
+request_route = ContextVar("request_route", default="none")
+
+
+def record_async_operation(operation, count=1):
+    """Counts storage operations against the async route being served"""
+    record_storage_operation(operation, count, route=request_route.get())
+
+
+def async_db():
+    """Returns the async storage backend, sharing data with the Flask app's store.
+    Its calls are counted and traced here, so the Flask app's wrappers are skipped."""
+    if "db" not in _clients:
+        store = flask_module.get_event_store(flask_app)
+        while isinstance(store, (CountingStore, TracingStore)):
+            store = store.store
+        store = get_async_store(store, flask_app.config["STORAGE_BACKEND"])
+        if tracing_enabled():
+            store = AsyncTracingStore(store)
+        _clients["db"] = AsyncCountingStore(store, on_op=record_async_operation)
+    return _clients["db"]
+
+
+def calendar():
+    """Returns the async Google Calendar client"""
+    if "calendar" not in _clients:
+        _clients["calendar"] = AsyncCalendar(
+            flask_app.config["GOOGLE_CLIENT_ID"], flask_app.config["GOOGLE_CLIENT_SECRET"]
+        )
+    return _clients["calendar"]
+
+
+class AsyncRequest:
+    """The parts of an ASGI http scope the async routes need"""
+
+    def __init__(self, scope):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        query = parse_qs(scope["query_string"].decode("latin-1"))
+        self.args = {key: values[0] for key, values in query.items()}
+        self.headers = {
+            key.decode("latin-1").lower(): value.decode("latin-1")
+            for key, value in scope["headers"]
+        }
+
+    def auth(self):
+        """Decodes the bearer token the same way helpers.authenticate_request does"""
+        auth_header = self.headers.get("authorization")
+        if not auth_header or not auth_header.startswith("Bearer "):
+            return None
+        return decode_jwt_token(auth_header.split(" ")[1])
+
+    def user_email(self):
+        """Gets user email from request"""
+        decoded = self.auth()
+        return decoded["user"]["email"] if decoded else ""
+
+
+def route(pattern, method):
+    """Registers a coroutine handler for a Flask style url pattern"""
+    regex = re.compile("^" + re.sub(r"<(\w+)>", r"(?P<\1>[^/]+)", pattern) + "$")
+
+    def decorator(handler):
+        ROUTES.append((method, regex, pattern, handler))
+        return handler
+    return decorator
+
+
+async def get_event_data(event_id):
+    """Returns the stored data of an event, or of one occurrence of a recurring series"""
+    occurrence = split_occurrence_id(event_id)
+    if occurrence is None:
+        return await async_db().get_event(event_id)
+    series_id, key = occurrence
+    return find_occurrence(series_id, await async_db().get_event(series_id), key)
+
+
+async def event_exists(event_id):
+    """Checks if an event or an occurrence of a recurring series exists"""
+    if split_occurrence_id(event_id) is None:
+        return await async_db().event_exists(event_id)
+    return await get_event_data(event_id) is not None
+
+
+async def list_page(cursor, category=None, bounds=None, at=None):
+    """Lists active events after a cursor and returns (listing, resume), see app.list_page"""
+    resume = split_occurrence_id(cursor) if cursor else None
+    if resume is None:
+        return async_db().list_events(category=category, cursor=cursor, bounds=bounds,
+                                      at=at), None
+    series_id = resume[0]
+    data = await async_db().get_event(series_id)
+
+    async def listing():
+        if is_recurring(data) and matches_listing(data, "active", category, bounds, at):
+            yield series_id, data
+        async with aclosing(async_db().list_events(category=category, cursor=series_id,
+                                                   bounds=bounds, at=at)) as rest:
+            async for item in rest:
+                yield item
+    return listing(), resume
+
+
+# pylint: disable=duplicate-code
+async def iter_active_events(listing, predicate=None, limit=None, window=(None, None),
+                             resume=None):
+    """Yields active events from an async store listing, skipping expired ones and
+    expanding recurring series within window. Mirrors app.iter_active_events."""
+    count = 0
+    async with aclosing(listing):
+        async for event_id, event_obj in listing:
+            if limit is not None and count >= limit:
+                break
+            if has_ended(event_obj):  # check if event recently expired
+                if await async_db().expire_event(event_id):
+                    await async_db().update_stats(event_deltas(event_obj, -1))
+                    logger.info("Event marked as expired", extra={"event_id": event_id})
+                continue
+            for item_id, item in occurrences(event_id, event_obj, window, resume):
+                if limit is not None and count >= limit:
+                    break
+                if predicate and not predicate(item):
+                    continue
+                item["eventId"] = item_id
+                yield item
+                count += 1
+
+
+async def stream_events_json(events, limit):
+    """Writes the event list JSON incrementally as events arrive"""
+    yield flask_module.EVENTS_JSON_START
+    last_id = None
+    count = 0
+    async for event_obj in events:
+        yield ("," if count else "") + flask_app.json.dumps(event_obj)
+        last_id = event_obj["eventId"]
+        count += 1
+    yield flask_module.events_json_end(last_id, count, limit)
+
+
+async def iterate(chunks):
+    """Async iterator over the chunks of a streamed snapshot body"""
+    for chunk in chunks:
+        yield chunk
+
+
+async def events_response(request, events, limit, stream):
+    """Returns a list of events either as one JSON body or a streamed JSON array"""
+    if stream:
+        return 200, stream_events_json(events, limit)
+
+    async def fetch():
+        return [event_obj async for event_obj in events]
+
+    key = (request.path, request.args.get("cursor") or None, limit,
+           request.args.get("from"), request.args.get("to"), request.args.get("bounds"))
+    result = await shared_reads.do(key, fetch)
+    next_cursor = None
+    if limit is not None and len(result) == limit:
+        next_cursor = result[-1]["eventId"]
+    return 200, {"status": 200, "state": {"events": result}, "nextCursor": next_cursor}
+
+
+async def list_events_response(request, predicate=None, window=None, category=None,
+                               at=None):
+    """Shared body of the event list routes"""
+    page, error = parse_page_params(request.args)
+    if error:
+        return 400, {"error": error}
+    try:
+        # the snapshot is already in memory, building the body doesn't wait on anything
+        body = flask_module.snapshot_events_json(flask_app, page, category=category, at=at,
+                                                 window=window)
+        if isinstance(body, bytes):
+            return 200, body
+        if body is not None:
+            return 200, iterate(body)
+        listing, resume = await list_page(page["cursor"], category, page["bounds"], at)
+        events = iter_active_events(listing, predicate=predicate, limit=page["limit"],
+                                    window=window or page["window"], resume=resume)
+        return await events_response(request, events, page["limit"], page["stream"])
+    except Exception as e:
+        logger.exception("Error listing events")
+        return 500, {"status": 500, "error": str(e)}
+
+
+@route("/state", "GET")
+async def get_state(request):
+    """Endpoint to retrieve map state from Firestore."""
+    return await list_events_response(request)
+
+
+@route("/filter_events/<option>", "GET")
+async def filter_events(request, option):
+    """Endpoint for filtering displayed events by category"""
+    return await list_events_response(request, category=option)
+
+
+@route("/filter_times/<time>", "GET")
+async def filter_times(request, time):  # pylint: disable=redefined-outer-name
+    """Endpoint for filtering displayed events by times"""
+    try:
+        dt_object = datetime.strptime(time, "%Y-%m-%dT%H:%M")
+        current_time = int(dt_object.timestamp())
+    except ValueError as e:
+        return 500, {"status": 500, "error": str(e)}
+
+    def is_happening(event_obj):
+        start_time = int(event_obj.get("startTime").timestamp())
+        end_time = int(event_obj.get("endTime").timestamp())
+        return start_time < current_time < end_time
+
+    return await list_events_response(
+        request, predicate=is_happening, window=(dt_object, dt_object), at=dt_object
+    )
+
+
+@route("/rsvp/<event_id>", "POST")
+async def rsvp_event(request, event_id):
+    """Endpoint for rsvping a user to an existing event"""
+    user_email = request.user_email()
+    if not user_email:
+        return 401, {"error": "Unauthorized"}
+
+    if not await event_exists(event_id):
+        return 404, {"error": "Event not found"}
+
+    if await async_db().create_rsvp(*rsvp_target(event_id, user_email),
+                                    Event.rsvp_data(user_email)):
+        await async_db().update_stats(rsvp_deltas())
+    return 200, {"message": "RSVP successful"}
+
+
+@route("/unrsvp/<event_id>", "DELETE")
+async def unrsvp_event(request, event_id):
+    """Endpoint for removing user from rsvp list without removing from calendar"""
+    user_email = request.user_email()
+    if not user_email:
+        return 401, {"error": "Unauthorized"}
+
+    # deleting a missing RSVP is a no-op, so it doesn't have to wait for the check
+    exists, removed = await asyncio.gather(
+        event_exists(event_id), async_db().remove_rsvp(*rsvp_target(event_id, user_email))
+    )
+    if removed:
+        await async_db().update_stats(rsvp_deltas(-1))
+    if not exists:
+        return 404, {"error": "Event not found"}
+    return 200, {"message": "RSVP removed successfully"}
+
+
+@route("/rsvps/<event_id>", "GET")
+async def get_event_rsvps(request, event_id):  # pylint: disable=unused-argument
+    """Endpoint for retrieving rsvp list of an existing event"""
+    exists, rsvps = await asyncio.gather(
+        event_exists(event_id), async_db().list_rsvps(*rsvp_target(event_id))
+    )
+    if not exists:
+        return 404, {"error": "Event not found"}
+    return 200, rsvp_emails(event_id, rsvps)
+
+
+@route("/add_to_calendar/<event_id>", "POST")
+async def add_to_calendar(request, event_id):
+    """Endpoint for adding event to Google Calendar"""
+    user_email = request.user_email()
+    if not user_email:
+        return 401, {"error": "Unauthorized"}
+
+    data = await get_event_data(event_id)
+    if data is None:
+        return 404, {"error": "Event not found"}
+
+    user_creds = request.auth().get("credentials")
+    if not user_creds:
+        return 401, {"error": "Calendar authorization required"}
+
+    try:
+        event = Event.from_dict(event_id, data, None)
+        calendar_event_id = await calendar().insert_event(user_creds, event.calendar_body())
+    except Exception:
+        logger.exception("Error creating calendar event")
+        return 500, {"error": "Failed to create calendar event"}
+
+    await async_db().set_calendar_link(
+        *calendar_link_target(event_id, user_email), calendar_event_id
+    )
+    return 200, {
+        "message": "Event added to calendar successfully",
+        "calendarEventId": calendar_event_id,
+    }
+
+
+@route("/remove_from_calendar/<event_id>", "DELETE")
+async def remove_event_from_calendar(request, event_id):
+    """Endpoint for removing an event from user's Google Calendar"""
+    user_email = request.user_email()
+    if not user_email:
+        return 401, {"error": "Unauthorized"}
+
+    link = calendar_link_target(event_id, user_email)
+    calendar_event_id = await async_db().get_calendar_link(*link)
+    if not calendar_event_id:
+        if not await event_exists(event_id):
+            return 404, {"error": "Event not found"}
+        return 404, {"error": "No calendar event found for this user"}
+
+    user_creds = request.auth().get("credentials")
+    if not user_creds:
+        return 401, {"error": "Calendar authorization required"}
+
+    try:
+        await calendar().delete_event(user_creds, calendar_event_id)
+        await async_db().remove_calendar_link(*link)
+    except Exception as e:
+        logger.exception("Error removing calendar event", extra={"event_id": event_id})
+        return 500, {"error": f"Failed to remove calendar event: {str(e)}"}
+    return 200, {"message": "Event removed from calendar successfully"}
+
+
+def cors_headers(request):
+    """Mirrors the Flask-CORS configuration of the Flask app"""
+    origin = request.headers.get("origin")
+    if origin not in CORS_ORIGINS:
+        return []
+    return [
+        (b"access-control-allow-origin", origin.encode("latin-1")),
+        (b"access-control-allow-credentials", b"true"),
+        (b"vary", b"Origin"),
+    ]
+
+
+async def send_response(send, request, status, payload):
+    """Sends a JSON body, or streams it if the payload is an async iterator of strings
+    or bytes. A bytes payload is sent as it is."""
+    headers = [(b"content-type", b"application/json"), *cors_headers(request)]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    if isinstance(payload, bytes):
+        await send({"type": "http.response.body", "body": payload})
+        return
+    if hasattr(payload, "__aiter__"):
+        try:
+            async for chunk in payload:
+                body = chunk if isinstance(chunk, bytes) else chunk.encode()
+                await send({"type": "http.response.body", "body": body, "more_body": True})
+        except Exception:
+            # the status line is already sent, so the truncated body signals the error
+            logger.exception("Error streaming events")
+        await send({"type": "http.response.body", "body": b""})
+        return
+    await send({"type": "http.response.body", "body": flask_app.json.dumps(payload).encode()})
+
+
+async def lifespan(receive, send):
+    """Handles server startup and shutdown"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if "calendar" in _clients:
+                await _clients["calendar"].aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI application"""
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] == "http":
+        for method, regex, pattern, handler in ROUTES:
+            match = regex.match(scope["path"])
+            if match and scope["method"] == method:
+                request = AsyncRequest(scope)
+                started = time.perf_counter()
+                REQUESTS_IN_FLIGHT.labels(pattern).inc()
+                token = request_route.set(pattern)
+                trace = (trace_request(method, pattern, scope["path"]) if tracing_enabled()
+                         else nullcontext())
+                try:
+                    with trace:
+                        status, payload = await handler(request, **match.groupdict())
+                        REQUEST_LATENCY.labels(method, pattern, status).observe(
+                            time.perf_counter() - started
+                        )
+                        await send_response(send, request, status, payload)
+                finally:
+                    request_route.reset(token)
+                    REQUESTS_IN_FLIGHT.labels(pattern).dec()
+                return
+    await wsgi_fallback(scope, receive, send)
@@ -0,0 +1,350 @@
+"""
+benchmarks/api.py
+
+Load and latency benchmark for the Flask API on a local storage backend.
+
+Each (event count, endpoint) scenario runs in a fresh process that seeds a
+store with synthetic events and RSVPs, drives the app with concurrent
+requests and reports latency percentiles, throughput, storage operations
+per request and the RSS while serving.
+
+Run from the backend directory:
+    python -m benchmarks.api --events 1000 10000 --output results.json
+    python -m benchmarks.api --events 1000 10000 --baseline results.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import jwt
+
+CATEGORIES = ["Social", "Sports", "Academic", "Music", "Food", "Clubs", "Arts", "Other"]
+# roughly the UCSC campus
+CENTER = (36.9916, -122.0583)
+USER_EMAIL = "bench@example.com"
+
+ENDPOINTS = ["state", "state_page", "filter_events", "filter_times", "rsvp", "create_event"]
+# results are only comparable when these settings of the two runs match
+COMPARED_META = ("backend", "read_cache_ttl", "rsvps", "seed", "concurrency", "requests")
+# how often the RSS is sampled while serving
+RSS_INTERVAL = 0.01
+
+
+def seed(store, num_events, rsvps_per_event, rng):
+    """Fills a store with synthetic events and RSVPs and returns the event ids"""
+    now = datetime.now(timezone.utc)
+    event_ids = []
+    for i in range(num_events):
+        start = now + timedelta(minutes=rng.randint(-6 * 60, 48 * 60))
+        event_id = store.create_event({
+            "title": f"Event {i}",
+            "description": "Synthetic benchmark event " * 4,
+            "startTime": start,
+            "endTime": start + timedelta(hours=rng.randint(1, 4)),
+            "address": f"{i} Science Hill",
+            "location": {
+                "latitude": CENTER[0] + rng.uniform(-0.02, 0.02),
+                "longitude": CENTER[1] + rng.uniform(-0.02, 0.02),
+            },
+            "category": rng.choice(CATEGORIES),
+            "capacity": str(rng.randint(10, 500)),
+            "age_limit": None,
+            "image": None,
+            "ownerEmail": f"owner{i % 50}@example.com",
+            "createdAt": now,
+            "status": "active",
+        })
+        for j in range(rsvps_per_event):
+            email = f"user{j}@example.com"
+            store.add_rsvp(event_id, email, {"email": email, "timestamp": now, "status": "confirmed"})
+        event_ids.append(event_id)
+    return event_ids
+
+
+def auth_header():
+    """Builds a bearer token the way /authorize issues them"""
+    # imported late so SECRET_KEY reflects the environment of the child process
+    from helpers import SECRET_KEY  # pylint: disable=import-outside-toplevel
+    token = jwt.encode(
+        {"user": {"name": "Bench", "email": USER_EMAIL, "picture": None}, "credentials": {}},
+        SECRET_KEY,
+        algorithm="HS256",
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def build_request(endpoint, event_ids, rng):
+    """Returns (method, path, json body) for one request to an endpoint"""
+    if endpoint == "state":
+        return "GET", "/state", None
+    if endpoint == "state_page":
+        return "GET", "/state?limit=100", None
+    if endpoint == "filter_events":
+        return "GET", f"/filter_events/{rng.choice(CATEGORIES)}", None
+    if endpoint == "filter_times":
+        return "GET", f"/filter_times/{datetime.now().strftime('%Y-%m-%dT%H:%M')}", None
+    if endpoint == "rsvp":
+        return "POST", f"/rsvp/{rng.choice(event_ids)}", None
+    if endpoint == "create_event":
+        start = datetime.now(timezone.utc) + timedelta(days=1)
+        return "POST", "/create_event", {
+            "title": "Benchmark event",
+            "description": "Created by the benchmark",
+            "startTime": start.isoformat(),
+            "endTime": (start + timedelta(hours=2)).isoformat(),
+            "location": {"latitude": CENTER[0], "longitude": CENTER[1]},
+            "category": rng.choice(CATEGORIES),
+        }
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def rss_mb():
+    """Current resident set size of this process in MB, or the peak where the
+    current one can't be read"""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return peak_rss_mb()
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_scenario(config):
+    """Seeds a store and benchmarks one endpoint, run inside a child process"""
+    os.environ["STORAGE_BACKEND"] = config["backend"]
+    if config["backend"] == "sqlite":
+        os.environ.setdefault("SQLITE_PATH", ":memory:")
+    # pylint: disable=import-outside-toplevel
+    import app as app_module
+    from storage import CountingStore, get_store
+
+    rng = random.Random(config["seed"])
+    store = get_store(config["backend"])
+    event_ids = seed(store, config["events"], config["rsvps"], rng)
+    counting = CountingStore(store)
+    app_module.app.extensions["event_store"] = counting
+    app_module.app.extensions["shared_reads"].ttl = config["read_cache_ttl"]
+    headers = auth_header()
+    local = threading.local()
+
+    def send(request):
+        if not hasattr(local, "client"):
+            local.client = app_module.app.test_client()
+        method, path, body = request
+        started = time.perf_counter()
+        response = local.client.open(path, method=method, json=body, headers=headers)
+        response.get_data()
+        return time.perf_counter() - started, response.status_code
+
+    requests = [
+        build_request(config["endpoint"], event_ids, rng)
+        for _ in range(config["warmup"] + config["requests"])
+    ]
+    for request in requests[:config["warmup"]]:
+        send(request)
+    counting.reset()
+    # sampled while serving, the peak of the process would include seeding
+    samples = [rss_mb()]
+    served = threading.Event()
+
+    def sample_rss():
+        while not served.wait(RSS_INTERVAL):
+            samples.append(rss_mb())
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=config["concurrency"]) as pool:
+        outcomes = list(pool.map(send, requests[config["warmup"]:]))
+    elapsed = time.perf_counter() - started
+    served.set()
+    sampler.join()
+    samples.append(rss_mb())
+
+    latencies = sorted(latency * 1000 for latency, _ in outcomes)
+    num_requests = len(outcomes)
+    return {
+        "events": config["events"],
+        "endpoint": config["endpoint"],
+        "requests": num_requests,
+        "concurrency": config["concurrency"],
+        "errors": sum(1 for _, status in outcomes if status >= 400),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "throughput_rps": num_requests / elapsed if elapsed else None,
+        "reads_per_request": counting.counts["reads"] / num_requests,
+        "writes_per_request": counting.counts["writes"] / num_requests,
+        "deletes_per_request": counting.counts["deletes"] / num_requests,
+        "rss_after_seed_mb": samples[0],
+        "serving_rss_mb": max(samples),
+    }
+
+
+def _child(config, queue):
+    try:
+        queue.put(run_scenario(config))
+    except Exception as e:
+        queue.put({"events": config["events"], "endpoint": config["endpoint"], "error": repr(e)})
+
+
+def run_isolated(config):
+    """Runs a scenario in a fresh process so RSS is per endpoint"""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(config, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def compare(results, meta, baseline, threshold):
+    """Returns descriptions of results that regressed against a baseline run.
+    Raises ValueError if the baseline was run with different settings."""
+    mismatched = [
+        f"{key} {baseline.get('meta', {}).get(key)!r} -> {meta.get(key)!r}"
+        for key in COMPARED_META if baseline.get("meta", {}).get(key) != meta.get(key)
+    ]
+    if mismatched:
+        raise ValueError(f"Baseline isn't comparable: {', '.join(mismatched)}")
+    previous = {(r["events"], r["endpoint"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = previous.get((result["events"], result["endpoint"]))
+        if not base or "error" in result or "error" in base:
+            continue
+        name = f"{result['endpoint']} @ {result['events']} events"
+        if result["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {base['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms")
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {base['throughput_rps']:.1f} -> "
+                f"{result['throughput_rps']:.1f} req/s"
+            )
+        if result["serving_rss_mb"] > base["serving_rss_mb"] * (1 + threshold):
+            regressions.append(
+                f"{name}: RSS {base['serving_rss_mb']:.1f} -> {result['serving_rss_mb']:.1f} MB"
+            )
+        for kind in ("reads", "writes", "deletes"):
+            key = f"{kind}_per_request"
+            # operation counts are deterministic, any increase is a regression
+            if result[key] > base[key] + 1e-9:
+                regressions.append(f"{name}: {kind}/request {base[key]:.2f} -> {result[key]:.2f}")
+    return regressions
+
+
+def print_table(results):
+    """Prints results as a plain text table"""
+    header = (f"{'endpoint':<14}{'events':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'req/s':>9}{'reads':>8}{'writes':>8}{'rss MB':>8}{'errors':>8}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if "error" in r:
+            print(f"{r['endpoint']:<14}{r['events']:>8}  failed: {r['error']}")
+            continue
+        print(f"{r['endpoint']:<14}{r['events']:>8}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+              f"{r['p99_ms']:>9.2f}{r['throughput_rps']:>9.1f}{r['reads_per_request']:>8.1f}"
+              f"{r['writes_per_request']:>8.1f}{r['serving_rss_mb']:>8.1f}{r['errors']:>8}")
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--events", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--backend", choices=["memory", "sqlite", "firestore"], default="memory",
+                        help="firestore only makes sense against the emulator "
+                             "(FIRESTORE_EMULATOR_HOST)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rsvps", type=int, default=3, help="RSVPs seeded per event")
+    parser.add_argument("--read-cache-ttl", type=float, default=0,
+                        help="READ_CACHE_TTL of the app, 0 (the default) disables the "
+                             "micro-cache so storage operations are measured per request")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative latency/throughput/RSS regression")
+    args = parser.parse_args(argv)
+
+    results = []
+    for num_events in args.events:
+        for endpoint in args.endpoints:
+            results.append(run_isolated({
+                "backend": args.backend,
+                "events": num_events,
+                "endpoint": endpoint,
+                "requests": args.requests,
+                "warmup": args.warmup,
+                "concurrency": args.concurrency,
+                "rsvps": args.rsvps,
+                "read_cache_ttl": args.read_cache_ttl,
+                "seed": args.seed,
+            }))
+            print(f"finished {endpoint} @ {num_events} events", flush=True)
+    print_table(results)
+
+    meta = {
+        "backend": args.backend,
+        "read_cache_ttl": args.read_cache_ttl,
+        "rsvps": args.rsvps,
+        "seed": args.seed,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print(f"\nSaved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        try:
+            regressions = compare(results, meta, baseline, args.threshold)
+        except ValueError as e:
+            print(f"\n{e}")
+            return 2
+
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
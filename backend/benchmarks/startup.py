@@ -0,0 +1,110 @@
+"""
+benchmarks/startup.py
+
+Cold start benchmark for the Flask API.
+
+Each run starts a fresh interpreter, imports app and sends the first and a
+second /state request, reporting how long the import and each request took,
+the whole process lifetime and how many modules were loaded. The median of
+all runs is printed.
+
+Run from the backend directory:
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --backend firestore  # needs FIREBASE_KEY or the emulator
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RESULT_PREFIX = "startup-result "
+TIMINGS = ["process_ms", "import_ms", "first_request_ms", "second_request_ms", "modules"]
+
+
+def measure():
+    """Times the import and first requests, run inside the child interpreter"""
+    started = time.perf_counter()
+    import app as app_module  # pylint: disable=import-outside-toplevel
+    imported = time.perf_counter()
+    modules = len(sys.modules)
+
+    client = app_module.app.test_client()
+    first = client.get("/state")
+    first_done = time.perf_counter()
+    second = client.get("/state")
+    second_done = time.perf_counter()
+    return {
+        "import_ms": (imported - started) * 1000,
+        "first_request_ms": (first_done - imported) * 1000,
+        "second_request_ms": (second_done - first_done) * 1000,
+        "modules": modules,
+        "status": [first.status_code, second.status_code],
+    }
+
+
+def run_once(backend, warmup):
+    """Starts a fresh interpreter that runs measure() and returns its timings"""
+    env = dict(os.environ, STORAGE_BACKEND=backend, WARMUP="1" if warmup else "")
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    elapsed = (time.perf_counter() - started) * 1000
+    # the app logs to stdout as well, the result is the line with the prefix
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return {**json.loads(line[len(RESULT_PREFIX):]), "process_ms": elapsed}
+    raise RuntimeError(f"No result from child process:\n{completed.stderr}")
+
+
+def summarize(runs):
+    """Median, min and max of each timing across runs"""
+    return {
+        key: {
+            "median": statistics.median(run[key] for run in runs),
+            "min": min(run[key] for run in runs),
+            "max": max(run[key] for run in runs),
+        }
+        for key in TIMINGS
+    }
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--backend", choices=["memory", "sqlite", "firestore"], default="memory")
+    parser.add_argument("--warmup", action="store_true", help="start the app with WARMUP=1")
+    parser.add_argument("--output", help="file to save the summary to as JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(RESULT_PREFIX + json.dumps(measure()), flush=True)
+        return 0
+
+    runs = [run_once(args.backend, args.warmup) for _ in range(args.runs)]
+    summary = summarize(runs)
+    print(f"{'':<20}{'median':>10}{'min':>10}{'max':>10}")
+    for key in TIMINGS:
+        row = summary[key]
+        print(f"{key:<20}{row['median']:>10.1f}{row['min']:>10.1f}{row['max']:>10.1f}")
+    errors = [run["status"] for run in runs if max(run["status"]) >= 400]
+    if errors:
+        print(f"\n{len(errors)} runs had failing requests: {errors}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"backend": args.backend, "warmup": args.warmup,
+                       "summary": summary, "runs": runs}, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
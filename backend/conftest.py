@@ -1,9 +1,22 @@
 """Global config for pytests to use. Defines mock db and a sample event class"""
+import os
 from unittest.mock import MagicMock
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import jwt
 import pytest
+
+# tests never touch Firestore unless a fixture swaps in a mocked client
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+# pylint: disable=wrong-import-position
 from event import Event
+from storage import CountingStore, MemoryStore, SQLiteStore
+from storage.firestore_store import FirestoreStore
+from storage.async_store import AsyncStoreAdapter
 from app import app
+from helpers import SECRET_KEY
+from metrics import record_storage_operation
+import asgi
 
 @pytest.fixture
 def mock_db():
@@ -22,7 +35,7 @@ def sample_event(request):
         location={"latitude": "37.7749", "longitude": "-122.4194"},
         category="Social",
         owner_email="test@example.com",
-        db=mock_firebase_db,
+        db=FirestoreStore(mock_firebase_db),
         address="123 Test St",
         capacity="100",
         age_limit="18+",
@@ -34,3 +47,73 @@ def app_context():
     """Provides an application context required for database operations."""
     with app.app_context():
         yield
+
+@pytest.fixture
+def client():
+    """Provides a Flask test client."""
+    return app.test_client()
+
+USER_EMAIL = "user@example.com"
+
+def auth_header(email=USER_EMAIL):
+    """Builds a bearer token for a user the way /authorize issues them."""
+    token = jwt.encode(
+        {"user": {"name": "User", "email": email, "picture": None}, "credentials": {}},
+        SECRET_KEY,
+        algorithm="HS256",
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+def make_event_doc(event_id, category="Social"):
+    """Creates a fake Firestore snapshot for an event that is currently happening."""
+    now = datetime.now(timezone.utc)
+    data = {
+        "title": f"Event {event_id}",
+        "category": category,
+        "startTime": now - timedelta(hours=1),
+        "endTime": now + timedelta(hours=1),
+        "status": "active",
+    }
+    doc = MagicMock(id=event_id)
+    doc.to_dict.side_effect = lambda: dict(data)
+    return doc
+
+@pytest.fixture
+def events_db(monkeypatch):
+    """Replaces the app database with a mock whose queries return three events."""
+    query = MagicMock()
+    query.where.return_value = query
+    query.order_by.return_value = query
+    query.start_after.return_value = query
+    query.limit.return_value = query
+    query.stream.side_effect = lambda: iter(
+        [make_event_doc("a"), make_event_doc("b"), make_event_doc("c")]
+    )
+    db = MagicMock()
+    db.collection.return_value = query
+    monkeypatch.setitem(
+        app.extensions, "event_store",
+        CountingStore(FirestoreStore(db), on_op=record_storage_operation),
+    )
+    app.extensions["shared_reads"].clear()
+    return query
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request):
+    """Provides each local storage backend in turn."""
+    if request.param == "memory":
+        return MemoryStore()
+    return SQLiteStore(":memory:")
+
+@pytest.fixture
+def memory_store(monkeypatch):
+    """Points the async routes at an in-memory store holding one active event."""
+    memory = MemoryStore()
+    now = datetime.now(timezone.utc)
+    memory.set_event("event1", {
+        "title": "Party", "category": "Social", "status": "active",
+        "startTime": now - timedelta(hours=1), "endTime": now + timedelta(hours=1),
+    })
+    monkeypatch.setitem(asgi._clients, "db", AsyncStoreAdapter(memory))  # pylint: disable=protected-access
+    asgi.shared_reads.clear()
+    return memory
@@ -6,6 +6,7 @@ from datetime import datetime, timezone
 from typing import Optional
 from flask import request, jsonify
 from helpers import get_user_email, validate_event_data
+from recurrence import build_recurrence
 
 class Event:
     """Class for Event object"""
@@ -25,6 +26,7 @@ class Event:
         age_limit: Optional[str] = None,
         image: Optional[str] = None,
         event_id: Optional[str] = None,
+        recurrence: Optional[dict] = None,
     ) -> None:
         # Added type validation inside event class
         event_data = {
@@ -54,10 +56,11 @@ class Event:
         self.db = db
         self.created_at = datetime.now(timezone.utc)
         self.status = "active"
+        self.recurrence = recurrence
 
     def to_dict(self):
         """Returns event information in dictionary"""
-        return {
+        data = {
             "title": self.title,
             "description": self.description,
             "startTime": self.start_time,
@@ -72,12 +75,45 @@ class Event:
             "createdAt": self.created_at,
             "status": self.status,
         }
+        if self.recurrence is not None:
+            data["recurrence"] = self.recurrence
+        return data
+
+    def calendar_body(self):
+        """Returns the Google Calendar event resource for this event. A recurring
+        series is exported with its rule so Google Calendar expands it."""
+        body = {
+            'summary': self.title,
+            'description': self.description,
+            'start': {
+                'dateTime': self.start_time.isoformat(),
+                'timeZone': 'UTC',
+            },
+            'end': {
+                'dateTime': self.end_time.isoformat(),
+                'timeZone': 'UTC',
+            },
+            'location': self.address,
+            'reminders': {
+                'useDefault': False,
+                'overrides': [
+                    {'method': 'email', 'minutes': 24 * 60},
+                    {'method': 'popup', 'minutes': 60},
+                ],
+            },
+        }
+        if self.recurrence is not None:
+            body['recurrence'] = [f"RRULE:{self.recurrence['rrule']}"]
+            if self.recurrence.get("exdates"):
+                body['recurrence'].append(
+                    f"EXDATE;TZID=UTC:{','.join(self.recurrence['exdates'])}"
+                )
+        return body
+
     def create(self):
-        """Creates event in database"""
-        event_ref = self.db.collection("events").document()
-        self.event_id = event_ref.id
-        event_ref.set(self.to_dict())
-        return event_ref
+        """Creates event in database and returns its id"""
+        self.event_id = self.db.create_event(self.to_dict())
+        return self.event_id
 
     @classmethod
     def request_to_event(cls, db):
@@ -89,6 +125,12 @@ class Event:
         user_email = get_user_email()
         assert user_email
 
+        recurrence = None
+        if event_data.get("recurrence"):
+            recurrence, error = Event.recurrence_from_request(event_data)
+            if error:
+                return jsonify({"error": error}), 400
+
         event = Event(
             title=event_data["title"],
             description=event_data["description"],
@@ -104,76 +146,49 @@ class Event:
             age_limit=event_data.get("age_limit"),
             image=event_data.get("image"),
             owner_email=user_email,
-            db = db
+            db = db,
+            recurrence=recurrence,
         )
         return event
 
-    @classmethod
-    def get(cls, event_id, db):
-        """Creates event object from existing event in database"""
-        doc_ref = db.collection("events").document(event_id)
-        doc = doc_ref.get()
-        if doc.exists:
-            data = doc.to_dict()
-            event = Event(
-                title=data["title"],
-                description=data["description"],
-                start_time=data["startTime"],
-                end_time=data["endTime"],
-                address=data.get("address"),
-                location=data["location"],
-                category=data["category"],
-                capacity=data.get("capacity"),
-                age_limit=data.get("age_limit"),
-                image=data.get("image"),
-                event_id=event_id,
-                owner_email=data["ownerEmail"],
-                db = db
-            )
-            return event
-        return None
-
-    def update(self, event_id):
-        """Updates existing event in database"""
-        self.db.collection("events").document(event_id).set(self.to_dict(), merge=True)
-
-    def delete(self):
-        """Deletes existing event in database"""
+    @staticmethod
+    def recurrence_from_request(event_data):
+        """Builds the recurrence of a series from a request's "recurrence" field, either
+        an RRULE string or {"rrule": ..., "exdates": [start times]}, returns (recurrence, error)"""
+        recurrence = event_data["recurrence"]
+        if isinstance(recurrence, str):
+            recurrence = {"rrule": recurrence}
         try:
-            event_ref = self.db.collection("events").document(self.event_id)
-            event_ref.delete()
-            return jsonify({"message": "Event deleted successfully"}), 200
-        except Exception as e:
-            return jsonify({"error": str(e)}), 500
+            return build_recurrence(
+                recurrence["rrule"],
+                datetime.fromisoformat(event_data["startTime"]),
+                datetime.fromisoformat(event_data["endTime"]),
+                [datetime.fromisoformat(exdate) for exdate in recurrence.get("exdates", [])],
+            ), None
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            return None, f"Invalid recurrence: {str(e)}"
 
-    def rsvp_add(self, user_email: str):
-        """Adds a user to rsvp list in existing event"""
-        rsvp_ref = (
-            self.db.collection("events")
-            .document(self.event_id)
-            .collection("rsvps")
-            .document(user_email)
-        )
-        rsvp_ref.set(
-            {"email": user_email, "timestamp": datetime.now(), "status": "confirmed"}
-        )
-
-    def rsvp_remove(self, user_email: str):
-        """Removes a user from the rsvp list in existing event"""
-        rsvp_ref = (
-            self.db.collection("events")
-            .document(self.event_id)
-            .collection("rsvps")
-            .document(user_email)
+    @classmethod
+    def from_dict(cls, event_id, data, db):
+        """Creates event object from stored event data"""
+        return Event(
+            title=data["title"],
+            description=data["description"],
+            start_time=data["startTime"],
+            end_time=data["endTime"],
+            address=data.get("address"),
+            location=data["location"],
+            category=data["category"],
+            capacity=data.get("capacity"),
+            age_limit=data.get("age_limit"),
+            image=data.get("image"),
+            event_id=event_id,
+            owner_email=data["ownerEmail"],
+            db = db,
+            recurrence=data.get("recurrence"),
         )
-        rsvp_ref.delete()
 
-    def get_rsvps(self):
-        """Gets list of users in rsvp list of an existing event"""
-        return [
-            doc.id
-            for doc in self.db.collection("events")
-            .document(self.event_id)
-            .collection("rsvps")
-            .stream()
-        ]
+    @staticmethod
+    def rsvp_data(user_email: str):
+        """Returns the stored RSVP record for a user"""
+        return {"email": user_email, "timestamp": datetime.now(), "status": "confirmed"}
@@ -1,24 +1,41 @@
 """Module for getting a firebase database"""
 import os
 import json
+import logging
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.cloud.firestore import AsyncClient
+
+logger = logging.getLogger(__name__)
+
+def get_app():
+    """Initializes the firebase app from config set in env variables, once"""
+    try:
+        return firebase_admin.get_app()
+    except ValueError:
+        pass
 
-def get_db():
-    """Retrieves firebase database from config set in env variables"""
     service_account_path = os.path.join(
         os.path.dirname(os.path.abspath(__file__)), "slug-events-firebase-key.json"
     )
 
     if os.path.exists(service_account_path):
         cred = credentials.Certificate(service_account_path)
-        print("Using service account key file.")
+        logger.info("Using service account key file.")
     else:
         firebase_key = os.getenv("FIREBASE_KEY")
         assert firebase_key
         cred = credentials.Certificate(json.loads(firebase_key))
-        print("Using Google Cloud default credentials.")
+        logger.info("Using Google Cloud default credentials.")
 
-    firebase_admin.initialize_app(cred)
-    db = firestore.client()
+    return firebase_admin.initialize_app(cred)
+
+def get_db():
+    """Retrieves firebase database from config set in env variables"""
+    db = firestore.client(get_app())
     return db
+
+def get_async_db():
+    """Retrieves an asyncio Firestore client using the same credentials as get_db"""
+    app = get_app()
+    return AsyncClient(project=app.project_id, credentials=app.credential.get_credential())
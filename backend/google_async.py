@@ -0,0 +1,74 @@
+"""
+Async Google Calendar client used by the ASGI routes
+"""
+
+import httpx
+
+from metrics import track_google_api
+
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+CALENDAR_EVENTS_URL = "https://www.googleapis.com/calendar/v3/calendars/primary/events"
+
+
+class AsyncCalendar:
+    """Calls the Calendar REST API with a user's OAuth credentials over httpx,
+    refreshing the access token once if it was rejected"""
+
+    def __init__(self, client_id, client_secret, timeout=10.0):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.timeout = timeout
+        self._http = None
+
+    @property
+    def http(self):
+        """Shared connection pool, created on first use inside the event loop"""
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=self.timeout)
+        return self._http
+
+    async def _refresh(self, refresh_token):
+        with track_google_api("oauth.refresh_token"):
+            response = await self.http.post(TOKEN_URI, data={
+                "grant_type": "refresh_token",
+                "refresh_token": refresh_token,
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+            })
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+    async def _request(self, call, method, url, credentials, **kwargs):
+        token = credentials.get("token")
+        with track_google_api(call):
+            response = await self.http.request(
+                method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs
+            )
+        if response.status_code == 401 and credentials.get("refresh_token"):
+            token = await self._refresh(credentials["refresh_token"])
+            with track_google_api(call):
+                response = await self.http.request(
+                    method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs
+                )
+        response.raise_for_status()
+        return response
+
+    async def insert_event(self, credentials, body):
+        """Creates an event in the user's primary calendar and returns its id"""
+        response = await self._request(
+            "calendar.events.insert", "POST", CALENDAR_EVENTS_URL, credentials, json=body
+        )
+        return response.json()["id"]
+
+    async def delete_event(self, credentials, calendar_event_id):
+        """Deletes an event from the user's primary calendar"""
+        await self._request(
+            "calendar.events.delete", "DELETE",
+            f"{CALENDAR_EVENTS_URL}/{calendar_event_id}", credentials,
+        )
+
+    async def aclose(self):
+        """Closes the connection pool"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
@@ -0,0 +1,55 @@
+"""
+gunicorn.conf.py
+
+Read by gunicorn when it's started from the backend directory. With
+SNAPSHOT_PATH set, the master process starts the single snapshot producer
+(see snapshot.py) the workers read the active events from, and stops it on exit.
+With PROMETHEUS_MULTIPROC_DIR set, it keeps the metrics files of the workers
+(see metrics.py) to the ones that are running.
+"""
+
+import glob
+import os
+import subprocess
+import sys
+
+from prometheus_client import multiprocess
+
+_producers = []
+
+
+def on_starting(server):  # pylint: disable=unused-argument
+    """Removes the metrics files of a previous run, their gauges would add up"""
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(path)
+
+
+def when_ready(server):
+    """Starts the snapshot producer once the master is ready"""
+    if os.getenv("SNAPSHOT_PATH"):
+        # the producer outlives this hook, on_exit stops it
+        _producers.append(subprocess.Popen(  # pylint: disable=consider-using-with
+            [sys.executable, "snapshot.py"]
+        ))
+        server.log.info("Started snapshot producer (pid: %s)", _producers[-1].pid)
+
+
+def on_exit(server):
+    """Stops the snapshot producer with the master, killing it if it doesn't stop"""
+    for producer in _producers:
+        producer.terminate()
+        try:
+            producer.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.log.warning("Killing snapshot producer (pid: %s)", producer.pid)
+            producer.kill()
+            producer.wait()
+
+
+def child_exit(server, worker):  # pylint: disable=unused-argument
+    """Drops the live gauge values, like requests in flight, of a worker that exited"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
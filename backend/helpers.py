@@ -3,7 +3,7 @@ Helper functions for flask api
 """
 
 import os
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import jwt
 from flask import request, jsonify
 
@@ -78,3 +78,73 @@ def validate_event_data(event_data):
         return jsonify({"error": "Invalid location format"}), 400
 
     return None
+
+MAX_PAGE_SIZE = 500
+# how far ahead recurring events are expanded when no window is given
+RECURRENCE_WINDOW_DAYS = int(os.getenv("RECURRENCE_WINDOW_DAYS", "14"))
+# longest window a request can expand recurring events for, wider ones are cut short
+MAX_RECURRENCE_WINDOW_DAYS = int(os.getenv("MAX_RECURRENCE_WINDOW_DAYS", "92"))
+
+def parse_window(args):
+    """Parses the from/to time window occurrences of recurring events are listed for,
+    returns (window, error)"""
+    try:
+        start = datetime.fromisoformat(args["from"]) if args.get("from") else None
+        end = datetime.fromisoformat(args["to"]) if args.get("to") else None
+        start = start or datetime.now(timezone.utc)
+        latest = start + timedelta(days=MAX_RECURRENCE_WINDOW_DAYS)
+    except (ValueError, OverflowError) as e:
+        return None, f"Invalid date format: {str(e)}"
+    end = end or start + timedelta(days=RECURRENCE_WINDOW_DAYS)
+    # naive times are UTC, like everywhere else
+    if end.tzinfo is None and latest.tzinfo is not None:
+        latest = latest.astimezone(timezone.utc).replace(tzinfo=None)
+    elif end.tzinfo is not None and latest.tzinfo is None:
+        latest = latest.replace(tzinfo=timezone.utc)
+    return (start, min(end, latest)), None
+
+def parse_page_params(args):
+    """Parses pagination and streaming options from query args, returns (params, error)"""
+    limit = args.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            return None, "Invalid limit"
+        if not 0 < limit <= MAX_PAGE_SIZE:
+            return None, f"Limit must be between 1 and {MAX_PAGE_SIZE}"
+    bounds = args.get("bounds")
+    if bounds is not None:
+        try:
+            bounds = tuple(float(value) for value in bounds.split(","))
+        except ValueError:
+            return None, "Invalid bounds"
+        if len(bounds) != 4:
+            return None, "Bounds must be min_lat,min_lng,max_lat,max_lng"
+    window, error = parse_window(args)
+    if error:
+        return None, error
+    return {
+        "limit": limit,
+        "cursor": args.get("cursor") or None,
+        "stream": args.get("stream", "").lower() in ("1", "true"),
+        "window": window,
+        "bounds": bounds,
+    }, None
+
+def get_page_params():
+    """Gets pagination and streaming options from request query string"""
+    params, error = parse_page_params(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    return params
+
+def has_ended(event_obj):
+    """Checks if an event's end time has passed. A recurring series ends with its
+    last occurrence, or never if it has no COUNT or UNTIL."""
+    end_time_obj = event_obj.get("endTime")
+    if event_obj.get("recurrence") is not None:
+        end_time_obj = event_obj["recurrence"].get("lastEnd")
+    if not end_time_obj:
+        return False
+    return int(end_time_obj.timestamp()) < int(datetime.now().timestamp())
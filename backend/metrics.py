@@ -0,0 +1,108 @@
+"""
+Prometheus metrics for the flask api
+
+Exposes per-route request latency, in-flight requests, storage operations per
+route, outbound Google API latency and read cache results on /metrics. When
+running several gunicorn workers set PROMETHEUS_MULTIPROC_DIR so the workers'
+metrics are aggregated.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+    multiprocess, REGISTRY,
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, up to the first byte for streamed responses",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled",
+    ["route"],
+    multiprocess_mode="livesum",
+)
+STORAGE_OPERATIONS = Counter(
+    "storage_operations_total",
+    "Storage reads, writes and deletes, counted the way Firestore bills them",
+    ["route", "operation"],
+)
+GOOGLE_API_LATENCY = Histogram(
+    "google_api_request_duration_seconds",
+    "Latency of outbound calls to Google OAuth and Calendar APIs",
+    ["call", "outcome"],
+)
+READ_CACHE_REQUESTS = Counter(
+    "read_cache_requests_total",
+    "Coalesced list reads by result: hit, coalesced or fetch",
+    ["result"],
+)
+
+
+def current_route():
+    """Returns the url rule of the current request, used as a low cardinality label"""
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return "unmatched" if has_request_context() else "none"
+
+
+def record_storage_operation(operation, count=1, route=None):
+    """Counts storage operations against a route, the current Flask route by default"""
+    STORAGE_OPERATIONS.labels(route or current_route(), operation).inc(count)
+
+
+def record_read_cache(result):
+    """Counts a read cache result"""
+    READ_CACHE_REQUESTS.labels(result).inc()
+
+
+@contextmanager
+def track_google_api(call):
+    """Times an outbound Google API call"""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        GOOGLE_API_LATENCY.labels(call, outcome).observe(time.perf_counter() - started)
+
+
+def metrics_response():
+    """Renders metrics in the Prometheus text format"""
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    """Registers request hooks and the /metrics endpoint on the app"""
+
+    @app.before_request
+    def start_timer():
+        g.metrics_route = current_route()
+        g.metrics_started = time.perf_counter()
+        REQUESTS_IN_FLIGHT.labels(g.metrics_route).inc()
+
+    @app.after_request
+    def observe_request(response):
+        if "metrics_started" in g:
+            REQUEST_LATENCY.labels(
+                request.method, g.metrics_route, response.status_code
+            ).observe(time.perf_counter() - g.metrics_started)
+        return response
+
+    @app.teardown_request
+    def finish_request(_error=None):
+        if "metrics_started" in g:
+            REQUESTS_IN_FLIGHT.labels(g.metrics_route).dec()
+
+    app.add_url_rule("/metrics", "metrics", metrics_response)
@@ -0,0 +1,66 @@
+"""
+rebuild_stats.py
+
+Rebuilds the event statistics counters (see stats.py) from one full scan of
+the events and a count of the RSVPs. The counters are only kept up to date
+by the changes made after they were introduced, so events and RSVPs created
+before that, or changes lost to a failed request, leave them off. The
+difference between the scan and the current counters is added like any
+other change, so concurrent requests keep counting while it runs. A change
+that lands between the scan and that update can still be counted twice or
+not at all; running it again corrects it. Two rebuilds running at the same
+time would both add the difference, so run it as a single one-off job when
+deploying the statistics, e.g. a Cloud Run job from the server image, and
+not from the server's startup.
+
+Run from the backend directory:
+    python rebuild_stats.py
+"""
+
+import argparse
+import logging
+import sys
+from collections import Counter
+
+from log_config import configure_logging
+from stats import event_deltas
+from storage import CountingStore, get_store
+
+logger = logging.getLogger(__name__)
+
+
+def scan_counters(store):
+    """Computes the counters from the stored events and RSVPs"""
+    counters = Counter()
+    for _, data in store.list_events(status=None):
+        counters.update(event_deltas(data))
+    counters[("rsvps", "total")] = store.count_rsvps()
+    return counters
+
+
+def rebuild_stats(store):
+    """Corrects the counters to match a scan of the store and returns the changes made"""
+    deltas = scan_counters(store)
+    deltas.subtract({
+        (group, bucket): count
+        for group, buckets in store.get_stats().items() for bucket, count in buckets.items()
+    })
+    deltas = Counter({key: delta for key, delta in deltas.items() if delta})
+    store.update_stats(deltas)
+    return deltas
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.parse_args(argv)
+
+    configure_logging()
+    store = CountingStore(get_store())
+    deltas = rebuild_stats(store)
+    logger.info("Rebuilt event statistics", extra={"changed": len(deltas), **store.counts})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
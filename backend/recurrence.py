@@ -0,0 +1,324 @@
+"""
+Weekly recurring events
+
+A series is stored once, as an event document with a "recurrence" map:
+    {"rrule": "FREQ=WEEKLY;BYDAY=MO,WE;COUNT=10", "exdates": [...],
+     "overrides": {key: {field: value}}, "lastEnd": datetime or None}
+Its startTime and endTime are those of the first occurrence. Occurrences are
+never stored. They are expanded when read, only for the requested time
+window, and have the id "<series id>_<key>", where the key is the occurrence's
+original start as YYYYMMDDTHHMMSS. Exdates and overrides are keyed the same
+way. RSVPs to an occurrence are stored with the series, as "<key>_<email>",
+so they're removed along with it.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+
+WEEKDAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+KEY_FORMAT = "%Y%m%dT%H%M%S"
+KEY_PATTERN = re.compile(r"^\d{8}T\d{6}$")
+SEPARATOR = "_"
+RSVP_KEY_PATTERN = re.compile(rf"^\d{{8}}T\d{{6}}{SEPARATOR}")
+# limits on rules, so a series is cheap to validate and expand
+MAX_INTERVAL = 52
+MAX_COUNT = 1000
+MAX_SERIES_YEARS = 5
+MAX_SERIES_SPAN = timedelta(days=366 * MAX_SERIES_YEARS)
+
+# fields an occurrence can change without affecting the rest of its series
+OVERRIDE_FIELDS = (
+    "title", "description", "startTime", "endTime", "address", "location", "capacity",
+    "age_limit",
+)
+
+
+def _align(value, like):
+    """Makes a datetime comparable with another, treating naive datetimes as UTC"""
+    if like.tzinfo is None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    if like.tzinfo is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _parse_until(value):
+    for fmt in ("%Y%m%dT%H%M%SZ", "%Y%m%dT%H%M%S", "%Y%m%d"):
+        try:
+            until = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt == "%Y%m%d":
+            # a date-only UNTIL includes the whole day
+            until += timedelta(days=1, microseconds=-1)
+        return until.replace(tzinfo=timezone.utc)
+    raise ValueError(f"Invalid UNTIL {value!r}")
+
+
+def parse_rrule(rule):
+    """Parses the weekly subset of an RFC 5545 RRULE, raising ValueError for anything else"""
+    try:
+        parts = dict(part.split("=", 1) for part in rule.removeprefix("RRULE:").split(";") if part)
+    except ValueError as e:
+        raise ValueError(f"Invalid recurrence rule {rule!r}") from e
+    unknown = set(parts) - {"FREQ", "INTERVAL", "BYDAY", "COUNT", "UNTIL", "WKST"}
+    if unknown:
+        raise ValueError(f"Unsupported recurrence rule parts: {', '.join(sorted(unknown))}")
+    if parts.get("FREQ") != "WEEKLY":
+        raise ValueError("Only weekly recurrence (FREQ=WEEKLY) is supported")
+    if "COUNT" in parts and "UNTIL" in parts:
+        raise ValueError("A recurrence rule can't have both COUNT and UNTIL")
+    byday = parts["BYDAY"].split(",") if parts.get("BYDAY") else []
+    if any(day not in WEEKDAYS for day in byday):
+        raise ValueError(f"Invalid BYDAY {parts['BYDAY']!r}")
+    try:
+        interval = int(parts.get("INTERVAL", "1"))
+        count = int(parts["COUNT"]) if "COUNT" in parts else None
+    except ValueError as e:
+        raise ValueError("INTERVAL and COUNT must be whole numbers") from e
+    if interval < 1 or (count is not None and count < 1):
+        raise ValueError("INTERVAL and COUNT must be positive")
+    if interval > MAX_INTERVAL or (count is not None and count > MAX_COUNT):
+        raise ValueError(f"INTERVAL can be at most {MAX_INTERVAL} and COUNT at most {MAX_COUNT}")
+    return {
+        "interval": interval,
+        "byday": sorted(WEEKDAYS.index(day) for day in byday),
+        "count": count,
+        "until": _parse_until(parts["UNTIL"]) if "UNTIL" in parts else None,
+    }
+
+
+def iter_starts(dtstart, rule, after=None):
+    """Yields the start of each occurrence in order, indefinitely for rules without
+    COUNT or UNTIL. Whole weeks that end before `after` are skipped without being
+    generated, so finding the occurrences in a window doesn't depend on the age
+    of the series."""
+    days = rule["byday"] or [dtstart.weekday()]
+    period = timedelta(weeks=rule["interval"])
+    until = _align(rule["until"], dtstart) if rule["until"] else None
+    after = _align(after, dtstart) if after is not None else None
+    week_start = dtstart - timedelta(days=dtstart.weekday())
+    count = 0
+    first_week = True
+    try:
+        while True:
+            if not first_week and after is not None and after >= week_start + timedelta(days=7):
+                skipped = (after - week_start - timedelta(days=7)) // period + 1
+                week_start += skipped * period
+                count += skipped * len(days)
+            first_week = False
+            for day in days:
+                start = week_start + timedelta(days=day)
+                if start < dtstart:
+                    continue
+                if until is not None and start > until:
+                    return
+                if rule["count"] is not None and count >= rule["count"]:
+                    return
+                count += 1
+                yield start
+            week_start += period
+    except OverflowError:
+        return  # the next occurrence would be after datetime.max
+
+
+def last_start(dtstart, rule):
+    """Start of the last occurrence of a rule with COUNT or UNTIL, or None if it has
+    none. It's computed from the rule rather than by generating every occurrence."""
+    days = rule["byday"] or [dtstart.weekday()]
+    period = timedelta(weeks=rule["interval"])
+    week_start = dtstart - timedelta(days=dtstart.weekday())
+    if rule["count"] is not None:
+        # the first week only has the days from dtstart on, later ones have all of them
+        first_week = [day for day in days if day >= dtstart.weekday()]
+        if rule["count"] <= len(first_week):
+            return week_start + timedelta(days=first_week[rule["count"] - 1])
+        weeks, index = divmod(rule["count"] - len(first_week) - 1, len(days))
+        return week_start + (weeks + 1) * period + timedelta(days=days[index])
+    # only the weeks around UNTIL are generated, the ones before are skipped
+    after = rule["until"] - period - timedelta(days=7)
+    last = None
+    for last in iter_starts(dtstart, rule, after):
+        pass
+    return last
+
+
+def occurrence_key(start):
+    """Key of an occurrence, its original start time"""
+    return start.strftime(KEY_FORMAT)
+
+
+def occurrence_id(series_id, start):
+    """Id of the occurrence of a series starting at start"""
+    return f"{series_id}{SEPARATOR}{occurrence_key(start)}"
+
+
+def split_occurrence_id(event_id):
+    """Returns (series_id, key) for an occurrence id, or None for any other event id"""
+    series_id, _, key = event_id.rpartition(SEPARATOR)
+    if series_id and KEY_PATTERN.match(key):
+        return series_id, key
+    return None
+
+
+def is_recurring(data):
+    """Checks if stored event data is a recurring series"""
+    return bool(data) and data.get("recurrence") is not None
+
+
+def build_recurrence(rrule, start_time, end_time, exdates=()):
+    """Validates a rule for a series whose first occurrence is start_time to end_time
+    and returns the recurrence map to store, raising ValueError if it's invalid"""
+    rule = parse_rrule(rrule)
+    last_end = None
+    if rule["count"] is not None or rule["until"] is not None:
+        # checked before computing the last start, so it stays within a few years
+        if rule["until"] is not None and _align(rule["until"], start_time) > start_time + MAX_SERIES_SPAN:
+            raise ValueError(f"A series can't last more than {MAX_SERIES_YEARS} years")
+        last = last_start(start_time, rule)
+        if last is None:
+            raise ValueError("The recurrence rule has no occurrences")
+        if last > start_time + MAX_SERIES_SPAN:
+            raise ValueError(f"A series can't last more than {MAX_SERIES_YEARS} years")
+        last_end = last + (end_time - start_time)
+    return {
+        "rrule": rrule.removeprefix("RRULE:"),
+        "exdates": sorted({occurrence_key(_align(exdate, start_time)) for exdate in exdates}),
+        "overrides": {},
+        "lastEnd": last_end,
+    }
+
+
+def _occurrence(series_id, data, start, duration):
+    recurrence = data["recurrence"]
+    occurrence = {field: value for field, value in data.items() if field != "recurrence"}
+    occurrence.update(startTime=start, endTime=start + duration, seriesId=series_id)
+    occurrence.update(recurrence.get("overrides", {}).get(occurrence_key(start), {}))
+    return occurrence
+
+
+def expand(series_id, data, window_start=None, window_end=None, after_key=None):
+    """Yields (occurrence_id, data) for occurrences of a series that overlap the
+    window, in order, skipping exdates and applying overrides. after_key resumes
+    the expansion after an occurrence, for pagination."""
+    recurrence = data["recurrence"]
+    dtstart = data["startTime"]
+    duration = data["endTime"] - dtstart
+    exdates = set(recurrence.get("exdates", []))
+    after = _align(window_start, dtstart) - duration if window_start is not None else None
+    end = _align(window_end, dtstart) if window_end is not None else None
+    for start in iter_starts(dtstart, parse_rrule(recurrence["rrule"]), after):
+        if end is not None and start > end:
+            return
+        key = occurrence_key(start)
+        if key in exdates or (after_key is not None and key <= after_key):
+            continue
+        occurrence = _occurrence(series_id, data, start, duration)
+        if after is not None and _align(occurrence["endTime"], dtstart) <= after + duration:
+            continue
+        yield occurrence_id(series_id, start), occurrence
+
+
+def _find_start(dtstart, rule, key):
+    """Returns the start of the occurrence of a rule with a key, or None if it has none"""
+    target = _align(datetime.strptime(key, KEY_FORMAT), dtstart)
+    for start in iter_starts(dtstart, rule, target):
+        # keys are compared rather than times since they drop fractions of a second
+        if occurrence_key(start) > key:
+            return None
+        if occurrence_key(start) == key:
+            return start
+    return None
+
+
+def find_occurrence(series_id, data, key):
+    """Returns the data of one occurrence of a series, or None if the series has
+    no occurrence with that key or it was excluded"""
+    if not is_recurring(data) or key in data["recurrence"].get("exdates", []):
+        return None
+    dtstart = data["startTime"]
+    start = _find_start(dtstart, parse_rrule(data["recurrence"]["rrule"]), key)
+    if start is None:
+        return None
+    return _occurrence(series_id, data, start, data["endTime"] - dtstart)
+
+
+def occurrences(event_id, data, window, resume=None):
+    """Yields (event_id, data) for a listed event: itself, or the occurrences in the
+    window if it's a recurring series. resume is the (series_id, key) of the
+    occurrence the previous page ended on."""
+    if not is_recurring(data):
+        yield event_id, data
+        return
+    after_key = resume[1] if resume and resume[0] == event_id else None
+    yield from expand(event_id, data, window[0], window[1], after_key)
+
+
+def with_override(recurrence, key, occurrence, fields):
+    """Returns a copy of a recurrence map storing the fields that differ from an
+    occurrence's current data, on top of its earlier overrides"""
+    overrides = recurrence.get("overrides", {})
+    changes = {**overrides.get(key, {}), **{
+        field: fields[field] for field in OVERRIDE_FIELDS
+        if field in fields and fields[field] != occurrence.get(field)
+    }}
+    overrides = {**overrides, key: changes}
+    if not changes:
+        del overrides[key]
+    return {**recurrence, "overrides": overrides}
+
+
+def rebase(previous, recurrence, start_time, end_time):
+    """Returns the recurrence map of a series updated to start at start_time: its new
+    one, or its previous rule if the update didn't change it. Exdates and overrides
+    of the previous map are kept while they're still occurrences of the rule.
+    Raises ValueError if the rule is invalid from start_time."""
+    if recurrence is None:
+        recurrence = build_recurrence(previous["rrule"], start_time, end_time)
+    rule = parse_rrule(recurrence["rrule"])
+    exdates = set(previous.get("exdates", [])) | set(recurrence.get("exdates", []))
+    return {
+        **recurrence,
+        "exdates": sorted(key for key in exdates if _find_start(start_time, rule, key)),
+        "overrides": {
+            key: fields for key, fields in previous.get("overrides", {}).items()
+            if _find_start(start_time, rule, key)
+        },
+    }
+
+
+def with_exdate(recurrence, key):
+    """Returns a copy of a recurrence map with an occurrence excluded"""
+    overrides = {k: v for k, v in recurrence.get("overrides", {}).items() if k != key}
+    exdates = sorted(set(recurrence.get("exdates", [])) | {key})
+    return {**recurrence, "exdates": exdates, "overrides": overrides}
+
+
+def calendar_link_target(event_id, user_email):
+    """Where a user's calendar link to an event is stored: occurrences keep theirs
+    on the series, with the occurrence key appended to the user's email"""
+    occurrence = split_occurrence_id(event_id)
+    if occurrence is None:
+        return event_id, user_email
+    series_id, key = occurrence
+    return series_id, f"{user_email}{SEPARATOR}{key}"
+
+
+def rsvp_target(event_id, user_email=""):
+    """Where a user's RSVP to an event is stored: occurrences keep theirs on the
+    series, with the occurrence key prefixed to the user's email. Without an
+    email, returns where and with which prefix an event's RSVPs are listed."""
+    occurrence = split_occurrence_id(event_id)
+    if occurrence is None:
+        return event_id, user_email
+    series_id, key = occurrence
+    return series_id, f"{key}{SEPARATOR}{user_email}"
+
+
+def rsvp_emails(event_id, rsvp_ids):
+    """Emails of the RSVPs listed for an event, see rsvp_target. A series' own RSVPs
+    leave out those to its occurrences."""
+    prefix = rsvp_target(event_id)[1]
+    if prefix:
+        return [rsvp_id[len(prefix):] for rsvp_id in rsvp_ids]
+    return [rsvp_id for rsvp_id in rsvp_ids if not RSVP_KEY_PATTERN.match(rsvp_id)]
@@ -0,0 +1,173 @@
+"""
+Single-flight request coalescing for identical concurrent reads
+"""
+
+import asyncio
+import threading
+import time
+
+
+class SingleFlight:
+    """Shares one fetch between concurrent callers with the same key and keeps
+    the result in a short lived micro-cache. on_result is called with "hit",
+    "coalesced" or "fetch" for every request, e.g. to feed metrics.
+
+    Every clear() starts a new generation: fetches already in flight may have
+    read data from before the write, so later callers don't join them and their
+    results aren't cached."""
+
+    def __init__(self, ttl: float = 1.0, max_entries: int = 1024, on_result=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.on_result = on_result
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._cache = {}
+        self._generation = 0
+        self._stats = {"requests": 0, "fetches": 0, "coalesced": 0, "cache_hits": 0}
+
+    def do(self, key, fetch):
+        """Returns fetch() for key, reusing an in-flight or cached result if there is one"""
+        with self._lock:
+            self._stats["requests"] += 1
+            cached = self._cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                self._stats["cache_hits"] += 1
+                outcome = "hit"
+            else:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = {
+                        "done": threading.Event(), "result": None, "error": None,
+                        "generation": self._generation,
+                    }
+                    self._stats["fetches"] += 1
+                else:
+                    self._stats["coalesced"] += 1
+                outcome = "fetch" if leader else "coalesced"
+        if self.on_result:
+            self.on_result(outcome)
+
+        if outcome == "hit":
+            return cached[1]
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fetch()
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                if (call["error"] is None and self.ttl > 0
+                        and call["generation"] == self._generation):
+                    self._store(key, call["result"])
+            call["done"].set()
+        return call["result"]
+
+    def _store(self, key, result):
+        """Caches a result, dropping expired entries once the cache gets large"""
+        now = time.monotonic()
+        if len(self._cache) >= self.max_entries:
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+            if len(self._cache) >= self.max_entries:
+                self._cache.clear()
+        self._cache[key] = (now + self.ttl, result)
+
+    def clear(self):
+        """Drops all cached results and in-flight fetches, e.g. after a write"""
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+            self._calls.clear()
+
+    @property
+    def generation(self):
+        """Number of clear() calls so far"""
+        return self._generation
+
+    @property
+    def stats(self):
+        """Returns a copy of the request, fetch, coalesced and cache hit counters"""
+        with self._lock:
+            return dict(self._stats)
+
+
+class AsyncSingleFlight:
+    """asyncio version of SingleFlight for coroutines running on one event loop,
+    with the same generations. follow returns the generation of another cache,
+    e.g. of a SingleFlight cleared by writes in other threads, and this one is
+    cleared whenever it changes."""
+
+    def __init__(self, ttl: float = 1.0, max_entries: int = 1024, on_result=None,
+                 follow=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.on_result = on_result
+        self.follow = follow
+        self._calls = {}
+        self._cache = {}
+        self._generation = 0
+        self._followed = follow() if follow else None
+
+    def _sync(self):
+        """Clears this cache if the followed one was cleared since the last check"""
+        if self.follow:
+            followed = self.follow()
+            if followed != self._followed:
+                self._followed = followed
+                self.clear()
+
+    def _report(self, outcome):
+        if self.on_result:
+            self.on_result(outcome)
+
+    async def do(self, key, fetch):
+        """Returns await fetch() for key, reusing an in-flight or cached result"""
+        self._sync()
+        cached = self._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            self._report("hit")
+            return cached[1]
+        future = self._calls.get(key)
+        if future is not None:
+            self._report("coalesced")
+            # shielded so one cancelled waiter doesn't cancel the shared fetch
+            return await asyncio.shield(future)
+
+        self._report("fetch")
+        generation = self._generation
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fetch()
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+            if not future.done():
+                future.cancel()  # the fetch itself was cancelled
+        self._sync()
+        if self.ttl > 0 and generation == self._generation:
+            now = time.monotonic()
+            if len(self._cache) >= self.max_entries:
+                self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+            self._cache[key] = (now + self.ttl, result)
+        return result
+
+    def clear(self):
+        """Drops all cached results and in-flight fetches, e.g. after a write"""
+        self._generation += 1
+        self._cache.clear()
+        self._calls.clear()
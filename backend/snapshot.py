@@ -0,0 +1,387 @@
+"""
+snapshot.py
+
+Shares the active events between worker processes. One producer process keeps
+the active events of the store (through a single Firestore listener, or by
+polling other backends) and writes them to a snapshot file. Workers map that
+file into memory and serve the event list routes from it without reading the
+store, so adding workers doesn't add listeners, reads or copies of the events.
+
+A snapshot is written to a temporary file and moved into place with
+os.replace, so a worker sees either the old or the new version, never a mix.
+Workers notice a new version with one os.stat per request. The producer
+touches the file when nothing changed, but only while it still hears from the
+store, so a worker falls back to the store once the file is older than
+SNAPSHOT_MAX_AGE seconds (e.g. the producer died or its listener stopped).
+
+Layout, after a fixed header (magic, format, count, version, categories size):
+    latitude, longitude, start, end    float64 columns (NaN when missing)
+    category                           uint32 column, index into the categories
+    flags                              uint8 column, FLAG_RECURRING
+    id offsets, event offsets          uint64 offsets into the blobs below
+    categories                         JSON list
+    ids, events                        blobs
+One-off events are stored as the JSON the list routes send, so they are served
+straight from the mapped file. A recurring series is stored as JSON with its
+datetimes tagged, like in the SQLite store, and expanded per request like in
+the store listing.
+
+Run from the backend directory, next to the gunicorn workers:
+    SNAPSHOT_PATH=/tmp/events.snapshot python snapshot.py
+"""
+
+import argparse
+import bisect
+import json
+import logging
+import math
+import mmap
+import os
+import signal
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+
+from flask import Flask
+
+from helpers import has_ended
+from log_config import configure_logging
+from recurrence import is_recurring, occurrences, split_occurrence_id
+from stats import event_deltas
+from storage import get_store
+from storage.sqlite_store import _dumps, _loads
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "events.snapshot")
+# how often the producer writes a changed snapshot or polls a store it can't watch
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "2"))
+
+MAGIC = b"SLUGSNAP"
+FORMAT = 2
+HEADER = struct.Struct("<8sIIQQ")
+FLAG_RECURRING = 1
+NO_CATEGORY = 0xFFFFFFFF
+
+
+def _padded(size):
+    """Sections start on 8 byte boundaries so the columns can be cast in place"""
+    return size + -size % 8
+
+
+def _column(value):
+    return value.timestamp() if value is not None else math.nan
+
+
+def _coordinates(location):
+    try:
+        return float(location["latitude"]), float(location["longitude"])
+    except (KeyError, TypeError, ValueError):
+        return math.nan, math.nan
+
+
+def write_snapshot(path, version, events, dumps):
+    """Atomically replaces the snapshot at path with the given {event_id: data} of
+    active events. dumps serializes an event the way the list routes do."""
+    ids = sorted(events)
+    columns = {name: array("d") for name in ("latitude", "longitude", "start", "end")}
+    codes, flags = array("I"), array("B")
+    id_offsets, event_offsets = array("Q", [0]), array("Q", [0])
+    categories, id_blob, event_blob = {}, bytearray(), bytearray()
+    for event_id in ids:
+        data = events[event_id]
+        latitude, longitude = _coordinates(data.get("location"))
+        columns["latitude"].append(latitude)
+        columns["longitude"].append(longitude)
+        columns["start"].append(_column(data.get("startTime")))
+        category = data.get("category")
+        codes.append(categories.setdefault(category, len(categories))
+                     if isinstance(category, str) else NO_CATEGORY)
+        if is_recurring(data):
+            columns["end"].append(_column(data["recurrence"].get("lastEnd")))
+            flags.append(FLAG_RECURRING)
+            event_blob += _dumps(data).encode()
+        else:
+            columns["end"].append(_column(data.get("endTime")))
+            flags.append(0)
+            event_blob += dumps({**data, "eventId": event_id}).encode()
+        id_blob += event_id.encode()
+        id_offsets.append(len(id_blob))
+        event_offsets.append(len(event_blob))
+
+    category_json = json.dumps(list(categories)).encode()
+    sections = [*(column.tobytes() for column in columns.values()), codes.tobytes(),
+                flags.tobytes(), id_offsets.tobytes(), event_offsets.tobytes()]
+    # a new file only this process can have opened, on the file system of path
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp",
+                                    dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT, len(ids), version, len(category_json)))
+            for section in sections:
+                f.write(section + bytes(_padded(len(section)) - len(section)))
+            f.write(category_json)
+            f.write(id_blob)
+            f.write(event_blob)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class _Ids:
+    """Sequence view of the id blob, so cursors can be found with bisect"""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]]).decode()
+
+
+class Snapshot:
+    """A snapshot file mapped into memory. Columns and event JSON are views of the
+    mapping, nothing is copied or parsed until it's needed."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, fmt, count, self.version, category_size = HEADER.unpack_from(view)
+        if magic != MAGIC or fmt != FORMAT:
+            raise ValueError(f"{path} isn't a version {FORMAT} event snapshot")
+
+        offset = HEADER.size
+
+        def section(typecode, length):
+            nonlocal offset
+            size = length * array(typecode).itemsize
+            data = view[offset:offset + size].cast(typecode)
+            offset += _padded(size)
+            return data
+
+        self.latitude, self.longitude, self.start, self.end = (
+            section("d", count) for _ in range(4)
+        )
+        self.category = section("I", count)
+        self.flags = section("B", count)
+        id_offsets = section("Q", count + 1)
+        self._event_offsets = section("Q", count + 1)
+        self.categories = json.loads(bytes(view[offset:offset + category_size]))
+        offset += category_size
+        self.ids = _Ids(id_offsets, view[offset:offset + id_offsets[count]])
+        offset += id_offsets[count]
+        self._events = view[offset:offset + self._event_offsets[count]]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def event_bytes(self, index):
+        """The stored bytes of an event: its JSON, or a recurring series with tagged
+        datetimes"""
+        return self._events[self._event_offsets[index]:self._event_offsets[index + 1]]
+
+    def _start_index(self, cursor):
+        """Index to list from after a cursor, and the (series_id, key) to resume a
+        recurring series after, like app.list_page"""
+        resume = split_occurrence_id(cursor) if cursor else None
+        if resume is None:
+            return (bisect.bisect_right(self.ids, cursor) if cursor else 0), None
+        index = bisect.bisect_left(self.ids, resume[0])
+        if (index < len(self) and self.ids[index] == resume[0]
+                and not self.flags[index] & FLAG_RECURRING):
+            index += 1
+        return index, resume
+
+    def select(self, dumps, cursor=None, category=None, at=None, limit=None,
+               window=(None, None), bounds=None):
+        """Yields (event_id, event JSON) in the order and with the filters of the event
+        list routes, serializing expanded occurrences with dumps: active events after
+        cursor, in category and inside bounds, happening at time at, with recurring
+        series expanded within window. Events that ended since the snapshot was
+        written are skipped, the producer expires them."""
+        code = None
+        if category is not None:
+            if category not in self.categories:
+                return
+            code = self.categories.index(category)
+        now = int(time.time())
+        at = int(at.timestamp()) if at is not None else None
+        index, resume = self._start_index(cursor)
+        count = 0
+        for i in range(index, len(self)):
+            if limit is not None and count >= limit:
+                return
+            # comparisons with NaN are false, so missing times never end or match
+            if (code is not None and self.category[i] != code) or self.end[i] < now:
+                continue
+            if bounds is not None and not (bounds[0] <= self.latitude[i] <= bounds[2]
+                                           and bounds[1] <= self.longitude[i] <= bounds[3]):
+                continue
+            if not self.flags[i] & FLAG_RECURRING:
+                if at is None or (self.start[i] < at and self.end[i] >= at + 1):
+                    count += 1
+                    yield self.ids[i], self.event_bytes(i)
+                continue
+            series_id = self.ids[i]
+            for item_id, item in occurrences(series_id, _loads(bytes(self.event_bytes(i))),
+                                             window, resume):
+                if limit is not None and count >= limit:
+                    return
+                if at is not None and not (int(item["startTime"].timestamp()) < at
+                                           < int(item["endTime"].timestamp())):
+                    continue
+                item["eventId"] = item_id
+                count += 1
+                yield item_id, dumps(item).encode()
+
+
+class SnapshotReader:  # pylint: disable=too-few-public-methods
+    """Keeps the latest snapshot at path mapped, remapping when a new version is
+    moved into place"""
+
+    def __init__(self, path, max_age):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._file = None
+        self._snapshot = None
+
+    def current(self):
+        """Returns the latest snapshot, or None if there's none or it's stale"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        if time.time() - stat.st_mtime > self.max_age:
+            return None
+        file = (stat.st_dev, stat.st_ino)
+        with self._lock:
+            if file != self._file:
+                # requests still using the old version keep its mapping alive
+                try:
+                    self._snapshot = Snapshot(self.path)
+                except (OSError, ValueError):
+                    logger.exception("Could not map event snapshot")
+                    return None
+                self._file = file
+            return self._snapshot
+
+
+class SnapshotProducer:
+    """Keeps the active events of a store and writes them to the snapshot file.
+    Ended events are expired here, once, instead of by every worker."""
+
+    def __init__(self, store, path, dumps, interval=SNAPSHOT_INTERVAL):
+        self.store = store
+        self.path = path
+        self.dumps = dumps
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._events = None
+        self._changed = False
+        # monotonic time the events were last known to be current
+        self.refreshed_at = None
+        try:
+            self.version = Snapshot(path).version
+        except (OSError, ValueError):
+            self.version = 0
+
+    def set_events(self, events):
+        """Replaces the active events, called by the store watch or the poll"""
+        with self._lock:
+            self.refreshed_at = time.monotonic()
+            if events != self._events:
+                self._events = events
+                self._changed = True
+
+    def expire_ended(self):
+        """Expires the active events that have ended, returns how many there were"""
+        with self._lock:
+            ended = {event_id: data for event_id, data in (self._events or {}).items()
+                     if has_ended(data)}
+        for event_id, data in ended.items():
+            if self.store.expire_event(event_id):
+                self.store.update_stats(event_deltas(data, -1))
+                logger.info("Event marked as expired", extra={"event_id": event_id})
+        if ended:
+            with self._lock:
+                self._events = {event_id: data for event_id, data in self._events.items()
+                                if event_id not in ended}
+                self._changed = True
+        return len(ended)
+
+    def confirm(self):
+        """Records that the events are still current, called while the watch is alive"""
+        with self._lock:
+            self.refreshed_at = time.monotonic()
+
+    def tick(self):
+        """Writes a new snapshot version if the events changed, otherwise marks the
+        current one as fresh if the events were refreshed within two intervals"""
+        self.expire_ended()
+        with self._lock:
+            events, changed, refreshed_at = self._events, self._changed, self.refreshed_at
+            self._changed = False
+        if events is None:
+            return
+        if changed or not os.path.exists(self.path):
+            self.version += 1
+            write_snapshot(self.path, self.version, events, self.dumps)
+            logger.info("Wrote event snapshot",
+                        extra={"version": self.version, "count": len(events)})
+        elif time.monotonic() - refreshed_at <= 2 * self.interval:
+            os.utime(self.path)
+
+    def run(self, stop):
+        """Produces snapshots until stop is set. A watch that stopped is replaced by
+        a poll and subscribed again on the next interval."""
+        watch = self.store.watch_active_events(self.set_events)
+        try:
+            while not stop.is_set():
+                if watch is not None and not watch.is_active:
+                    logger.warning("Event watch stopped, polling until it's restarted")
+                    watch.unsubscribe()
+                    watch = None
+                if watch is None:
+                    self.set_events(dict(self.store.list_events()))
+                    watch = self.store.watch_active_events(self.set_events)
+                else:
+                    self.confirm()
+                self.tick()
+                stop.wait(self.interval)
+        finally:
+            if watch is not None:
+                watch.unsubscribe()
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--path", default=SNAPSHOT_PATH)
+    parser.add_argument("--interval", type=float, default=SNAPSHOT_INTERVAL,
+                        help="seconds between snapshot writes or store polls")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    # Flask's default JSON provider, so events are serialized exactly like the list routes
+    dumps = Flask(__name__).json.dumps
+    producer = SnapshotProducer(get_store(), args.path, dumps, args.interval)
+    try:
+        producer.run(stop)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
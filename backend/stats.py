@@ -0,0 +1,84 @@
+"""
+Event statistics kept up to date as events change
+
+The store holds counters grouped as {group: {bucket: count}}. Every change to
+an active event adds the difference it makes, so /stats only reads the
+counters and its cost doesn't depend on how many events exist. Active events
+are counted by category, and one-off events also by the UTC hour and day they
+start in. A recurring series counts once and has no time buckets, since its
+occurrences are never stored. RSVPs are counted for as long as they're
+stored.
+"""
+
+from collections import Counter
+from datetime import timezone
+
+UNCATEGORIZED = "Uncategorized"
+HOUR_FORMAT = "%Y-%m-%dT%H"
+DAY_FORMAT = "%Y-%m-%d"
+
+
+def _utc(value):
+    """Naive datetimes are treated as UTC like everywhere else"""
+    return value.astimezone(timezone.utc) if value.tzinfo is not None else value
+
+
+def event_deltas(data, sign=1):
+    """Counter changes for adding (sign 1) or removing (sign -1) an event. Events that
+    aren't active aren't counted."""
+    if not data or data.get("status") != "active":
+        return Counter()
+    deltas = Counter({
+        ("events", "active"): sign,
+        ("category", data.get("category") or UNCATEGORIZED): sign,
+    })
+    if data.get("recurrence") is not None:
+        deltas[("events", "recurring")] += sign
+        return deltas
+    start = data.get("startTime")
+    if start is not None:
+        deltas[("hour", _utc(start).strftime(HOUR_FORMAT))] += sign
+        deltas[("day", _utc(start).strftime(DAY_FORMAT))] += sign
+    return deltas
+
+
+def change_deltas(old, new):
+    """Counter changes for an event changing from old to new data"""
+    deltas = event_deltas(new)
+    deltas.subtract(event_deltas(old))
+    return Counter({key: count for key, count in deltas.items() if count})
+
+
+def rsvp_deltas(count=1):
+    """Counter change for added (positive count) or removed (negative count) RSVPs"""
+    return Counter({("rsvps", "total"): count})
+
+
+def window_days(window):
+    """The first and last UTC day of a (start, end) window as ISO dates, or None for
+    an open end"""
+    return tuple(_utc(bound).strftime(DAY_FORMAT) if bound else None for bound in window)
+
+
+def format_stats(counters, window=(None, None)):
+    """Builds the /stats response from stored counters, with the hour and day buckets
+    limited to a (start, end) window where either end can be None"""
+    def buckets(group, fmt):
+        low, high = (_utc(bound).strftime(fmt) if bound else None for bound in window)
+        return {
+            bucket: count for bucket, count in sorted(counters.get(group, {}).items())
+            if count > 0 and (low is None or bucket >= low) and (high is None or bucket <= high)
+        }
+
+    events = counters.get("events", {})
+    return {
+        "activeEvents": events.get("active", 0),
+        "recurringSeries": events.get("recurring", 0),
+        "byCategory": {
+            category: count for category, count in sorted(counters.get("category", {}).items())
+            if count > 0
+        },
+        "byHour": buckets("hour", HOUR_FORMAT),
+        "byDay": buckets("day", DAY_FORMAT),
+        "rsvps": counters.get("rsvps", {}).get("total", 0),
+    }
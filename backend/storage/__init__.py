@@ -0,0 +1,33 @@
+"""
+Pluggable storage backends for events, RSVPs and calendar links.
+
+The backend is chosen with the STORAGE_BACKEND env variable:
+"firestore" (default), "memory" or "sqlite" (file set by SQLITE_PATH).
+"""
+
+import os
+
+from storage.base import AsyncEventStore, EventStore
+from storage.counting_store import CountingStore
+from storage.memory_store import MemoryStore
+from storage.sqlite_store import SQLiteStore
+
+BACKENDS = ("firestore", "memory", "sqlite")
+
+
+def get_store(backend=None):
+    """Creates the storage backend selected by argument or env variables"""
+    backend = backend or os.getenv("STORAGE_BACKEND", "firestore")
+    if backend == "firestore":
+        # imported here so the other backends work without firebase credentials
+        from firebase_db import get_db  # pylint: disable=import-outside-toplevel
+        from storage.firestore_store import FirestoreStore  # pylint: disable=import-outside-toplevel
+        return FirestoreStore(get_db())
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "sqlite":
+        return SQLiteStore(os.getenv("SQLITE_PATH", "slug-events.db"))
+    raise ValueError(f"Unknown storage backend {backend!r}, expected one of {BACKENDS}")
+
+
+__all__ = ["EventStore", "AsyncEventStore", "CountingStore", "MemoryStore", "SQLiteStore", "get_store", "BACKENDS"]
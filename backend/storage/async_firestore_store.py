@@ -0,0 +1,99 @@
+"""
+Event storage backed by the asyncio Cloud Firestore client
+"""
+
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud.firestore import DELETE_FIELD, async_transactional
+
+from storage.base import AsyncEventStore
+from storage.firestore_store import (
+    PAGE_SIZE, calendar_key, events_query, listed, rsvps_query, stats_batch
+)
+
+
+class AsyncFirestoreStore(AsyncEventStore):
+    """Async version of FirestoreStore for the calls made by the ASGI routes,
+    using the same collections and document layout"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def _event_ref(self, event_id):
+        return self.client.collection("events").document(event_id)
+
+    def _rsvp_ref(self, event_id, user_email):
+        return self._event_ref(event_id).collection("rsvps").document(user_email)
+
+    async def get_event(self, event_id):
+        doc = await self._event_ref(event_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    async def event_exists(self, event_id):
+        doc = await self._event_ref(event_id).get(field_paths=["status"])
+        return doc.exists
+
+    async def expire_event(self, event_id):
+        event_ref = self._event_ref(event_id)
+
+        @async_transactional
+        async def expire(transaction):
+            snapshot = await event_ref.get(field_paths=["status"], transaction=transaction)
+            if not snapshot.exists or snapshot.get("status") != "active":
+                return False
+            transaction.update(event_ref, {"status": "expired"})
+            return True
+
+        return await expire(self.client.transaction())
+
+    async def list_events(self, status="active", category=None, cursor=None, bounds=None,
+                          at=None):
+        collection = self.client.collection("events")
+        while True:
+            query = events_query(collection, status, category, cursor, PAGE_SIZE)
+            docs = [doc async for doc in query.stream()]
+            for item in listed(docs, bounds, at):
+                yield item
+            if len(docs) < PAGE_SIZE:
+                return
+            cursor = docs[-1].id
+
+    async def create_rsvp(self, event_id, user_email, data):
+        try:
+            await self._rsvp_ref(event_id, user_email).create(data)
+        except AlreadyExists:
+            return False
+        return True
+
+    async def remove_rsvp(self, event_id, user_email):
+        try:
+            await self._rsvp_ref(event_id, user_email).delete(
+                option=self.client.write_option(exists=True)
+            )
+        except NotFound:
+            return False
+        return True
+
+    async def list_rsvps(self, event_id, prefix=""):
+        rsvps = self._event_ref(event_id).collection("rsvps")
+        return [doc.id async for doc in rsvps_query(rsvps, prefix).stream()]
+
+    async def set_calendar_link(self, event_id, user_email, calendar_event_id):
+        await self._event_ref(event_id).update({
+            f"calendar_events.{calendar_key(user_email)}": calendar_event_id
+        })
+
+    async def get_calendar_link(self, event_id, user_email):
+        doc = await self._event_ref(event_id).get(field_paths=["calendar_events"])
+        if not doc.exists:
+            return None
+        return (doc.to_dict() or {}).get("calendar_events", {}).get(calendar_key(user_email))
+
+    async def remove_calendar_link(self, event_id, user_email):
+        await self._event_ref(event_id).update({
+            f"calendar_events.{calendar_key(user_email)}": DELETE_FIELD
+        })
+
+    async def update_stats(self, deltas):
+        if not deltas:
+            return
+        await stats_batch(self.client, deltas).commit()
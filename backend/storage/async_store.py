@@ -0,0 +1,74 @@
+"""
+Async storage access for the ASGI entry point
+"""
+
+import asyncio
+import itertools
+import os
+
+from storage.base import AsyncEventStore
+
+# documents moved off a synchronous store per thread hop while listing
+CHUNK_SIZE = 100
+
+
+class AsyncStoreAdapter(AsyncEventStore):
+    """Runs a synchronous EventStore's calls in worker threads so they don't block
+    the event loop. Used for the memory and SQLite backends."""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def get_event(self, event_id):
+        return await asyncio.to_thread(self.store.get_event, event_id)
+
+    async def event_exists(self, event_id):
+        return await asyncio.to_thread(self.store.event_exists, event_id)
+
+    async def expire_event(self, event_id):
+        return await asyncio.to_thread(self.store.expire_event, event_id)
+
+    async def list_events(self, status="active", category=None, cursor=None, bounds=None,
+                          at=None):
+        listing = self.store.list_events(status, category, cursor, bounds, at)
+        while True:
+            chunk = await asyncio.to_thread(lambda: list(itertools.islice(listing, CHUNK_SIZE)))
+            for item in chunk:
+                yield item
+            if len(chunk) < CHUNK_SIZE:
+                return
+
+    async def create_rsvp(self, event_id, user_email, data):
+        return await asyncio.to_thread(self.store.create_rsvp, event_id, user_email, data)
+
+    async def remove_rsvp(self, event_id, user_email):
+        return await asyncio.to_thread(self.store.remove_rsvp, event_id, user_email)
+
+    async def list_rsvps(self, event_id, prefix=""):
+        return await asyncio.to_thread(self.store.list_rsvps, event_id, prefix)
+
+    async def set_calendar_link(self, event_id, user_email, calendar_event_id):
+        await asyncio.to_thread(
+            self.store.set_calendar_link, event_id, user_email, calendar_event_id
+        )
+
+    async def get_calendar_link(self, event_id, user_email):
+        return await asyncio.to_thread(self.store.get_calendar_link, event_id, user_email)
+
+    async def remove_calendar_link(self, event_id, user_email):
+        await asyncio.to_thread(self.store.remove_calendar_link, event_id, user_email)
+
+    async def update_stats(self, deltas):
+        await asyncio.to_thread(self.store.update_stats, deltas)
+
+
+def get_async_store(sync_store, backend=None):
+    """Creates the async counterpart of the configured storage backend. Firestore
+    gets a native AsyncClient, other backends share the synchronous store."""
+    backend = backend or os.getenv("STORAGE_BACKEND", "firestore")
+    if backend == "firestore":
+        # pylint: disable=import-outside-toplevel
+        from firebase_db import get_async_db
+        from storage.async_firestore_store import AsyncFirestoreStore
+        return AsyncFirestoreStore(get_async_db())
+    return AsyncStoreAdapter(sync_store)
@@ -0,0 +1,258 @@
+"""
+Storage interface shared by every event storage backend
+"""
+
+import math
+import secrets
+import string
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional, Protocol, Tuple
+
+ID_ALPHABET = string.ascii_letters + string.digits
+# statistics counters are spread over this many documents so concurrent updates
+# don't contend on one (Firestore sustains about one write per second per document)
+STATS_SHARDS = 10
+# statistics groups counted by UTC hour or day, their buckets start with the ISO date
+TIME_GROUPS = ("hour", "day")
+
+
+class Watch(Protocol):
+    """A running watch of the store, like a Firestore listener"""
+
+    @property
+    def is_active(self) -> bool:
+        """False once the watch stopped, e.g. because its stream failed"""
+
+    def unsubscribe(self) -> None:
+        """Stops watching"""
+
+
+def new_id() -> str:
+    """Generates a random document id in the same format as Firestore"""
+    return "".join(secrets.choice(ID_ALPHABET) for _ in range(20))
+
+
+def coordinates(location) -> Optional[Tuple[float, float]]:
+    """Returns the (latitude, longitude) of an event location, or None if it has none"""
+    try:
+        return float(location["latitude"]), float(location["longitude"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def in_bounds(location, bounds) -> bool:
+    """Checks if an event location lies inside (min_lat, min_lng, max_lat, max_lng)"""
+    point = coordinates(location)
+    if point is None:
+        return False
+    min_lat, min_lng, max_lat, max_lng = bounds
+    return min_lat <= point[0] <= max_lat and min_lng <= point[1] <= max_lng
+
+
+def _timestamp(value) -> Optional[float]:
+    return value.timestamp() if isinstance(value, datetime) else None
+
+
+def time_span(data) -> Tuple[Optional[float], Optional[float]]:
+    """Returns the start and end timestamps an event covers. A recurring series
+    covers its first start to its last end, or forever if it has no last end."""
+    end = _timestamp(data.get("endTime"))
+    if data.get("recurrence") is not None:
+        last_end = data["recurrence"].get("lastEnd")
+        end = _timestamp(last_end) if last_end else math.inf
+    return _timestamp(data.get("startTime")), end
+
+
+def overlaps(data, at) -> bool:
+    """Checks if an event, or any occurrence of a recurring series, may be
+    happening at time at"""
+    start, end = time_span(data)
+    return start is not None and end is not None and start <= at.timestamp() <= end
+
+
+def matches_listing(data, status="active", category=None, bounds=None, at=None) -> bool:
+    """Checks if stored event data passes the filters of EventStore.list_events"""
+    return ((status is None or data.get("status") == status)
+            and (category is None or data.get("category") == category)
+            and (bounds is None or in_bounds(data.get("location"), bounds))
+            and (at is None or overlaps(data, at)))
+
+
+class EventStore(ABC):
+    """Storage for events, their RSVPs and users' Google Calendar links.
+
+    Event data is passed around as the same dictionary that is stored in
+    Firestore (see Event.to_dict). Listings are ordered by event id so an
+    event id can be used as a pagination cursor."""
+
+    @abstractmethod
+    def create_event(self, data: dict) -> str:
+        """Stores a new event and returns its generated id"""
+
+    @abstractmethod
+    def get_event(self, event_id: str) -> Optional[dict]:
+        """Returns the stored event data or None if it doesn't exist"""
+
+    @abstractmethod
+    def event_exists(self, event_id: str) -> bool:
+        """Checks if an event exists without loading its data"""
+
+    @abstractmethod
+    def set_event(self, event_id: str, data: dict, merge: bool = False) -> None:
+        """Writes event data, merging it into the existing event if merge is set"""
+
+    @abstractmethod
+    def update_event(self, event_id: str, fields: dict) -> Optional[dict]:
+        """Updates fields of an existing event in one transaction with reading it.
+        Returns its data from before the update, or None if it doesn't exist."""
+
+    @abstractmethod
+    def delete_event(self, event_id: str) -> Optional[int]:
+        """Deletes an event along with its RSVPs and returns how many RSVPs it had,
+        or None if it didn't exist, so concurrent requests only delete it once"""
+
+    @abstractmethod
+    def expire_event(self, event_id: str) -> bool:
+        """Marks an active event as expired, returns False if it already was expired
+        or doesn't exist so concurrent requests only expire it once"""
+
+    @abstractmethod
+    def list_events(
+        self,
+        status: Optional[str] = "active",
+        category: Optional[str] = None,
+        cursor: Optional[str] = None,
+        bounds: Optional[Tuple[float, float, float, float]] = None,
+        at: Optional[datetime] = None,
+    ) -> Iterator[Tuple[str, dict]]:
+        """Lazily yields (event_id, data) pairs in event id order, starting
+        after cursor and optionally limited to a (min_lat, min_lng, max_lat,
+        max_lng) bounding box and to events that overlap time at"""
+
+    @abstractmethod
+    def add_rsvp(self, event_id: str, user_email: str, data: dict) -> None:
+        """Adds or replaces a user's RSVP to an event"""
+
+    @abstractmethod
+    def create_rsvp(self, event_id: str, user_email: str, data: dict) -> bool:
+        """Adds a user's RSVP unless they already RSVPed, returns whether it was added"""
+
+    @abstractmethod
+    def remove_rsvp(self, event_id: str, user_email: str) -> bool:
+        """Removes a user's RSVP to an event, returns whether there was one"""
+
+    @abstractmethod
+    def list_rsvps(self, event_id: str, prefix: str = "") -> list:
+        """Returns the emails of users who RSVPed to an event, in order. With a
+        prefix, only those starting with it."""
+
+    @abstractmethod
+    def count_rsvps(self) -> int:
+        """Counts the RSVPs to all events"""
+
+    @abstractmethod
+    def set_calendar_link(self, event_id: str, user_email: str, calendar_event_id: str) -> None:
+        """Remembers the Google Calendar event created for a user"""
+
+    @abstractmethod
+    def get_calendar_link(self, event_id: str, user_email: str) -> Optional[str]:
+        """Returns the Google Calendar event id created for a user, if any"""
+
+    @abstractmethod
+    def remove_calendar_link(self, event_id: str, user_email: str) -> None:
+        """Forgets the Google Calendar event created for a user"""
+
+    @abstractmethod
+    def archive_events(self, summaries: Dict[str, dict]) -> Dict[str, dict]:
+        """Moves events out of the events collection: stores each {event_id:
+        summary} in the archive with the event's RSVP count as "rsvpCount",
+        then deletes the event with its RSVPs and calendar links. Returns the
+        summaries as stored"""
+
+    @abstractmethod
+    def get_archived_event(self, event_id: str) -> Optional[dict]:
+        """Returns the archived summary of an event or None if it wasn't archived"""
+
+    @abstractmethod
+    def update_stats(self, deltas: Dict[Tuple[str, str], int]) -> None:
+        """Adds {(group, bucket): delta} to the event statistics counters"""
+
+    @abstractmethod
+    def get_stats(self, first_day: Optional[str] = None,
+                  last_day: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """Returns the event statistics counters as {group: {bucket: count}}, with the
+        hour and day buckets only of the days from first_day to last_day (ISO dates,
+        either can be None)"""
+
+    @abstractmethod
+    def drop_stats_before(self, day: str) -> int:
+        """Deletes the hour and day buckets of the days before day (an ISO date) and
+        returns how many days had buckets"""
+
+    def watch_active_events(  # pylint: disable=unused-argument
+            self, callback: Callable[[Dict[str, dict]], None]) -> Optional[Watch]:
+        """Calls callback with all active events as {event_id: data} now and whenever
+        they change. Returns the running watch, or None if the backend can't be
+        watched and has to be polled with list_events."""
+        return None
+
+
+class AsyncEventStore(ABC):
+    """Async access to the same storage for the calls made by the ASGI routes.
+    Methods behave like their EventStore counterparts."""
+
+    @abstractmethod
+    async def get_event(self, event_id: str) -> Optional[dict]:
+        """Returns the stored event data or None if it doesn't exist"""
+
+    @abstractmethod
+    async def event_exists(self, event_id: str) -> bool:
+        """Checks if an event exists without loading its data"""
+
+    @abstractmethod
+    async def expire_event(self, event_id: str) -> bool:
+        """Marks an active event as expired, returns False if it already was expired
+        or doesn't exist"""
+
+    @abstractmethod
+    async def list_events(
+        self,
+        status: Optional[str] = "active",
+        category: Optional[str] = None,
+        cursor: Optional[str] = None,
+        bounds: Optional[Tuple[float, float, float, float]] = None,
+        at: Optional[datetime] = None,
+    ) -> AsyncIterator[Tuple[str, dict]]:
+        """Lazily yields (event_id, data) pairs, see EventStore.list_events"""
+        # the yield makes this an async generator, like its implementations
+        yield
+
+    @abstractmethod
+    async def create_rsvp(self, event_id: str, user_email: str, data: dict) -> bool:
+        """Adds a user's RSVP unless they already RSVPed, returns whether it was added"""
+
+    @abstractmethod
+    async def remove_rsvp(self, event_id: str, user_email: str) -> bool:
+        """Removes a user's RSVP to an event, returns whether there was one"""
+
+    @abstractmethod
+    async def list_rsvps(self, event_id: str, prefix: str = "") -> list:
+        """Returns the emails of users who RSVPed to an event, see EventStore.list_rsvps"""
+
+    @abstractmethod
+    async def set_calendar_link(self, event_id: str, user_email: str,
+                                calendar_event_id: str) -> None:
+        """Remembers the Google Calendar event created for a user"""
+
+    @abstractmethod
+    async def get_calendar_link(self, event_id: str, user_email: str) -> Optional[str]:
+        """Returns the Google Calendar event id created for a user, if any"""
+
+    @abstractmethod
+    async def remove_calendar_link(self, event_id: str, user_email: str) -> None:
+        """Forgets the Google Calendar event created for a user"""
+
+    @abstractmethod
+    async def update_stats(self, deltas: Dict[Tuple[str, str], int]) -> None:
+        """Adds {(group, bucket): delta} to the event statistics counters"""
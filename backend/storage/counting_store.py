@@ -0,0 +1,228 @@
+"""
+Storage wrapper that counts reads, writes and deletes the way Firestore bills them
+"""
+
+import threading
+from collections import Counter
+
+from storage.base import STATS_SHARDS, TIME_GROUPS, AsyncEventStore, EventStore
+
+
+def stats_documents(deltas):
+    """Counts the counter documents a statistics update writes: a single shard for
+    the totals and one per day with time buckets"""
+    days = {bucket[:10] for group, bucket in deltas if group in TIME_GROUPS}
+    return len(days) + any(group not in TIME_GROUPS for group, _ in deltas)
+
+
+class CountingStore(EventStore):
+    """Delegates to another store and counts its operations. Listings count one
+    read per returned document, and at least one read per query. on_op is called
+    with the operation kind and count, e.g. to feed metrics."""
+
+    def __init__(self, store, on_op=None):
+        self.store = store
+        self.on_op = on_op
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+    def _count(self, kind, count=1):
+        with self._lock:
+            self.counts[kind] += count
+        if self.on_op:
+            self.on_op(kind, count)
+
+    def reset(self):
+        """Clears the operation counts"""
+        with self._lock:
+            self.counts.clear()
+
+    def create_event(self, data):
+        self._count("writes")
+        return self.store.create_event(data)
+
+    def get_event(self, event_id):
+        self._count("reads")
+        return self.store.get_event(event_id)
+
+    def event_exists(self, event_id):
+        self._count("reads")
+        return self.store.event_exists(event_id)
+
+    def set_event(self, event_id, data, merge=False):
+        self._count("writes")
+        self.store.set_event(event_id, data, merge=merge)
+
+    def update_event(self, event_id, fields):
+        # read and written in one transaction
+        self._count("reads")
+        previous = self.store.update_event(event_id, fields)
+        if previous is not None:
+            self._count("writes")
+        return previous
+
+    def delete_event(self, event_id):
+        rsvps = self.store.delete_event(event_id)
+        # listing the RSVP ids, then one delete per RSVP and one for the event
+        self._count("reads", max(rsvps or 0, 1))
+        if rsvps is not None:
+            self._count("deletes", rsvps + 1)
+        return rsvps
+
+    def expire_event(self, event_id):
+        # read and written in one transaction
+        self._count("reads")
+        expired = self.store.expire_event(event_id)
+        if expired:
+            self._count("writes")
+        return expired
+
+    def list_events(self, status="active", category=None, cursor=None, bounds=None,
+                    at=None):
+        returned = 0
+        try:
+            for item in self.store.list_events(status, category, cursor, bounds, at):
+                returned += 1
+                yield item
+        finally:
+            self._count("reads", max(returned, 1))
+
+    def add_rsvp(self, event_id, user_email, data):
+        self._count("writes")
+        self.store.add_rsvp(event_id, user_email, data)
+
+    def create_rsvp(self, event_id, user_email, data):
+        self._count("writes")
+        return self.store.create_rsvp(event_id, user_email, data)
+
+    def remove_rsvp(self, event_id, user_email):
+        self._count("deletes")
+        return self.store.remove_rsvp(event_id, user_email)
+
+    def list_rsvps(self, event_id, prefix=""):
+        rsvps = self.store.list_rsvps(event_id, prefix)
+        self._count("reads", max(len(rsvps), 1))
+        return rsvps
+
+    def count_rsvps(self):
+        count = self.store.count_rsvps()
+        # aggregations are billed one read per 1000 index entries
+        self._count("reads", max(-(-count // 1000), 1))
+        return count
+
+    def set_calendar_link(self, event_id, user_email, calendar_event_id):
+        self._count("writes")
+        self.store.set_calendar_link(event_id, user_email, calendar_event_id)
+
+    def get_calendar_link(self, event_id, user_email):
+        self._count("reads")
+        return self.store.get_calendar_link(event_id, user_email)
+
+    def remove_calendar_link(self, event_id, user_email):
+        self._count("writes")
+        self.store.remove_calendar_link(event_id, user_email)
+
+    def archive_events(self, summaries):
+        archived = self.store.archive_events(summaries)
+        rsvps = [summary["rsvpCount"] for summary in archived.values()]
+        # listing each event's RSVPs, then one write per summary and one delete per document
+        self._count("reads", sum(max(count, 1) for count in rsvps))
+        self._count("writes", len(archived))
+        self._count("deletes", sum(count + 1 for count in rsvps))
+        return archived
+
+    def get_archived_event(self, event_id):
+        self._count("reads")
+        return self.store.get_archived_event(event_id)
+
+    def update_stats(self, deltas):
+        if deltas:
+            self._count("writes", stats_documents(deltas))
+        self.store.update_stats(deltas)
+
+    def get_stats(self, first_day=None, last_day=None):
+        stats = self.store.get_stats(first_day, last_day)
+        # one read per counter shard and per day with time buckets
+        self._count("reads", STATS_SHARDS + len(
+            {bucket[:10] for group in TIME_GROUPS for bucket in stats.get(group, {})}
+        ))
+        return stats
+
+    def drop_stats_before(self, day):
+        dropped = self.store.drop_stats_before(day)
+        self._count("reads", dropped)
+        self._count("deletes", dropped)
+        return dropped
+
+
+class AsyncCountingStore(AsyncEventStore):
+    """Counts the operations of an async store (see storage.async_store) like
+    CountingStore does for a synchronous one"""
+
+    def __init__(self, store, on_op=None):
+        self.store = store
+        self.on_op = on_op
+        self.counts = Counter()
+
+    def _count(self, kind, count=1):
+        # only called from the event loop, so no lock is needed
+        self.counts[kind] += count
+        if self.on_op:
+            self.on_op(kind, count)
+
+    async def get_event(self, event_id):
+        self._count("reads")
+        return await self.store.get_event(event_id)
+
+    async def event_exists(self, event_id):
+        self._count("reads")
+        return await self.store.event_exists(event_id)
+
+    async def expire_event(self, event_id):
+        self._count("reads")
+        expired = await self.store.expire_event(event_id)
+        if expired:
+            self._count("writes")
+        return expired
+
+    async def list_events(self, status="active", category=None, cursor=None, bounds=None,
+                          at=None):
+        returned = 0
+        listing = self.store.list_events(status, category, cursor, bounds, at)
+        try:
+            async for item in listing:
+                returned += 1
+                yield item
+        finally:
+            await listing.aclose()
+            self._count("reads", max(returned, 1))
+
+    async def create_rsvp(self, event_id, user_email, data):
+        self._count("writes")
+        return await self.store.create_rsvp(event_id, user_email, data)
+
+    async def remove_rsvp(self, event_id, user_email):
+        self._count("deletes")
+        return await self.store.remove_rsvp(event_id, user_email)
+
+    async def list_rsvps(self, event_id, prefix=""):
+        rsvps = await self.store.list_rsvps(event_id, prefix)
+        self._count("reads", max(len(rsvps), 1))
+        return rsvps
+
+    async def set_calendar_link(self, event_id, user_email, calendar_event_id):
+        self._count("writes")
+        await self.store.set_calendar_link(event_id, user_email, calendar_event_id)
+
+    async def get_calendar_link(self, event_id, user_email):
+        self._count("reads")
+        return await self.store.get_calendar_link(event_id, user_email)
+
+    async def remove_calendar_link(self, event_id, user_email):
+        self._count("writes")
+        await self.store.remove_calendar_link(event_id, user_email)
+
+    async def update_stats(self, deltas):
+        if deltas:
+            self._count("writes", stats_documents(deltas))
+        await self.store.update_stats(deltas)
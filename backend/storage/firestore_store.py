@@ -0,0 +1,283 @@
+"""
+Event storage backed by Cloud Firestore
+"""
+
+import random
+
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud.firestore import DELETE_FIELD, Increment, transactional
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from storage.base import STATS_SHARDS, TIME_GROUPS, EventStore, matches_listing
+
+ARCHIVE_COLLECTION = "archived_events"
+STATS_COLLECTION = "stats"
+# one document per UTC day with the hour and day buckets of the events starting on it
+STATS_DAYS_COLLECTION = "stats_days"
+# Firestore rejects batches with more writes than this
+MAX_BATCH_WRITES = 500
+# documents fetched per query while listing, so a short page isn't billed for the
+# rest of the collection
+PAGE_SIZE = 100
+
+
+def rsvps_query(collection, prefix):
+    """Lists RSVP documents in id order, only those whose id starts with prefix"""
+    if not prefix:
+        return collection
+    document_id = FieldPath.document_id()
+    return (collection.order_by(document_id)
+            .start_at({document_id: prefix}).end_at({document_id: prefix + "\uf8ff"}))
+
+
+def calendar_key(user_email):
+    """Escapes an email so it can be used as a Firestore map key"""
+    return user_email.replace('@', '_at_').replace('.', '_dot_')
+
+
+def events_query(collection, status, category, cursor, limit=None):
+    """Builds a listing query in a stable document id order, resuming after cursor"""
+    query = collection
+    if status is not None:
+        query = query.where(filter=FieldFilter("status", "==", status))
+    if category is not None:
+        query = query.where(filter=FieldFilter("category", "==", category))
+    query = query.order_by("__name__")
+    if cursor:
+        query = query.start_after({"__name__": cursor})
+    return query.limit(limit) if limit is not None else query
+
+
+def listed(docs, bounds, at):
+    """Yields (event_id, data) of the fetched documents that pass the filters a query
+    can't apply: it can only range filter on one field, and listings are ordered by id"""
+    for doc in docs:
+        data = doc.to_dict()
+        if matches_listing(data, None, None, bounds, at):
+            yield doc.id, data
+
+
+def stats_batch(client, deltas):
+    """Returns a batch merging the increments into the counters. Totals go to a random
+    shard, which spreads concurrent updates out, and time buckets to the document of
+    their day, so no document keeps growing."""
+    shard = str(random.randrange(STATS_SHARDS))
+    writes = {}
+    for (group, bucket), delta in deltas.items():
+        if group in TIME_GROUPS:
+            ref = client.collection(STATS_DAYS_COLLECTION).document(bucket[:10])
+        else:
+            ref = client.collection(STATS_COLLECTION).document(shard)
+        writes.setdefault(ref.path, (ref, {}))[1].setdefault(group, {})[bucket] = Increment(delta)
+    batch = client.batch()
+    for ref, fields in writes.values():
+        batch.set(ref, fields, merge=True)
+    return batch
+
+
+def stats_days_query(collection, first_day, last_day):
+    """Lists the day documents from first_day to last_day, either can be None"""
+    document_id = FieldPath.document_id()
+    query = collection.order_by(document_id)
+    if first_day:
+        query = query.start_at({document_id: first_day})
+    if last_day:
+        query = query.end_at({document_id: last_day})
+    return query
+
+
+class FirestoreStore(EventStore):
+    """Stores events in the "events" collection with RSVPs in an "rsvps"
+    subcollection and calendar links in the event's "calendar_events" map.
+    Archived event summaries live in the "archived_events" collection and the
+    statistics counters are sharded over the "stats" collection, with their
+    hour and day buckets in a "stats_days" document per day."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def _event_ref(self, event_id):
+        return self.client.collection("events").document(event_id)
+
+    def _rsvp_ref(self, event_id, user_email):
+        return self._event_ref(event_id).collection("rsvps").document(user_email)
+
+    def create_event(self, data):
+        event_ref = self.client.collection("events").document()
+        event_ref.set(data)
+        return event_ref.id
+
+    def get_event(self, event_id):
+        doc = self._event_ref(event_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def event_exists(self, event_id):
+        # a projection keeps large fields like inline images out of the response
+        return self._event_ref(event_id).get(field_paths=["status"]).exists
+
+    def set_event(self, event_id, data, merge=False):
+        self._event_ref(event_id).set(data, merge=merge)
+
+    def update_event(self, event_id, fields):
+        event_ref = self._event_ref(event_id)
+
+        @transactional
+        def update(transaction):
+            snapshot = event_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return None
+            transaction.update(event_ref, fields)
+            return snapshot.to_dict()
+
+        return update(self.client.transaction())
+
+    def delete_event(self, event_id):
+        event_ref = self._event_ref(event_id)
+        rsvp_refs = list(event_ref.collection("rsvps").list_documents())
+        try:
+            # only the request that still finds the event deletes it
+            event_ref.delete(option=self.client.write_option(exists=True))
+        except NotFound:
+            return None
+        # deleting a document leaves its subcollections behind, see archive_events
+        for start in range(0, len(rsvp_refs), MAX_BATCH_WRITES):
+            batch = self.client.batch()
+            for ref in rsvp_refs[start:start + MAX_BATCH_WRITES]:
+                batch.delete(ref)
+            batch.commit()
+        return len(rsvp_refs)
+
+    def expire_event(self, event_id):
+        event_ref = self._event_ref(event_id)
+
+        @transactional
+        def expire(transaction):
+            snapshot = event_ref.get(field_paths=["status"], transaction=transaction)
+            if not snapshot.exists or snapshot.get("status") != "active":
+                return False
+            transaction.update(event_ref, {"status": "expired"})
+            return True
+
+        return expire(self.client.transaction())
+
+    def list_events(self, status="active", category=None, cursor=None, bounds=None,
+                    at=None):
+        collection = self.client.collection("events")
+        while True:
+            docs = list(events_query(collection, status, category, cursor, PAGE_SIZE).stream())
+            yield from listed(docs, bounds, at)
+            if len(docs) < PAGE_SIZE:
+                return
+            cursor = docs[-1].id
+
+    def watch_active_events(self, callback):
+        def on_snapshot(docs, _changes, _read_time):
+            callback({doc.id: doc.to_dict() for doc in docs})
+
+        query = events_query(self.client.collection("events"), "active", None, None)
+        return query.on_snapshot(on_snapshot)
+
+    def add_rsvp(self, event_id, user_email, data):
+        self._rsvp_ref(event_id, user_email).set(data)
+
+    def create_rsvp(self, event_id, user_email, data):
+        try:
+            self._rsvp_ref(event_id, user_email).create(data)
+        except AlreadyExists:
+            return False
+        return True
+
+    def remove_rsvp(self, event_id, user_email):
+        try:
+            self._rsvp_ref(event_id, user_email).delete(
+                option=self.client.write_option(exists=True)
+            )
+        except NotFound:
+            return False
+        return True
+
+    def list_rsvps(self, event_id, prefix=""):
+        query = rsvps_query(self._event_ref(event_id).collection("rsvps"), prefix)
+        return [doc.id for doc in query.stream()]
+
+    def count_rsvps(self):
+        # an aggregation query over every rsvps subcollection, without reading them
+        (result,), = self.client.collection_group("rsvps").count().get()
+        return int(result.value)
+
+    def set_calendar_link(self, event_id, user_email, calendar_event_id):
+        self._event_ref(event_id).update({
+            f"calendar_events.{calendar_key(user_email)}": calendar_event_id
+        })
+
+    def get_calendar_link(self, event_id, user_email):
+        # a projection keeps large fields like inline images out of the response
+        doc = self._event_ref(event_id).get(field_paths=["calendar_events"])
+        if not doc.exists:
+            return None
+        return (doc.to_dict() or {}).get("calendar_events", {}).get(calendar_key(user_email))
+
+    def remove_calendar_link(self, event_id, user_email):
+        self._event_ref(event_id).update({
+            f"calendar_events.{calendar_key(user_email)}": DELETE_FIELD
+        })
+
+    def archive_events(self, summaries):
+        archived = {}
+        writes = []
+        for event_id, summary in summaries.items():
+            event_ref = self._event_ref(event_id)
+            # deleting a document leaves its subcollections behind, so RSVPs go one by one;
+            # list_documents only fetches their ids
+            rsvp_refs = list(event_ref.collection("rsvps").list_documents())
+            archived[event_id] = {**summary, "rsvpCount": len(rsvp_refs)}
+            # the summary is written first and the event deleted last, so a failed run
+            # leaves the event in place to be picked up again
+            writes.append((self.client.collection(ARCHIVE_COLLECTION).document(event_id),
+                           archived[event_id]))
+            writes += [(ref, None) for ref in rsvp_refs]
+            writes.append((event_ref, None))
+
+        for start in range(0, len(writes), MAX_BATCH_WRITES):
+            batch = self.client.batch()
+            for ref, data in writes[start:start + MAX_BATCH_WRITES]:
+                if data is None:
+                    batch.delete(ref)
+                else:
+                    batch.set(ref, data)
+            batch.commit()
+        return archived
+
+    def get_archived_event(self, event_id):
+        doc = self.client.collection(ARCHIVE_COLLECTION).document(event_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def update_stats(self, deltas):
+        if not deltas:
+            return
+        stats_batch(self.client, deltas).commit()
+
+    def get_stats(self, first_day=None, last_day=None):
+        days = self.client.collection(STATS_DAYS_COLLECTION)
+        stats = {}
+        for doc in [*self.client.collection(STATS_COLLECTION).stream(),
+                    *stats_days_query(days, first_day, last_day).stream()]:
+            for group, buckets in doc.to_dict().items():
+                totals = stats.setdefault(group, {})
+                for bucket, count in buckets.items():
+                    totals[bucket] = totals.get(bucket, 0) + count
+        return stats
+
+    def drop_stats_before(self, day):
+        document_id = FieldPath.document_id()
+        # only the ids are needed, the field mask skips the buckets
+        refs = [doc.reference for doc in self.client.collection(STATS_DAYS_COLLECTION)
+                .order_by(document_id).end_before({document_id: day})
+                .select([]).stream()]
+        for start in range(0, len(refs), MAX_BATCH_WRITES):
+            batch = self.client.batch()
+            for ref in refs[start:start + MAX_BATCH_WRITES]:
+                batch.delete(ref)
+            batch.commit()
+        return len(refs)
@@ -0,0 +1,161 @@
+"""
+In-memory event storage for local development, tests and benchmarks
+"""
+
+import bisect
+import copy
+import threading
+from collections import Counter
+
+from storage.base import TIME_GROUPS, EventStore, matches_listing, new_id
+
+
+class MemoryStore(EventStore):
+    """Keeps events in a dictionary with a sorted id list for ordered listings.
+    Data is copied on the way in and out so callers can't mutate stored events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = {}
+        self._ids = []
+        self._rsvps = {}
+        self._calendar_links = {}
+        self._archive = {}
+        self._stats = Counter()
+
+    def create_event(self, data):
+        event_id = new_id()
+        self.set_event(event_id, data)
+        return event_id
+
+    def get_event(self, event_id):
+        with self._lock:
+            data = self._events.get(event_id)
+            return copy.deepcopy(data) if data is not None else None
+
+    def event_exists(self, event_id):
+        with self._lock:
+            return event_id in self._events
+
+    def set_event(self, event_id, data, merge=False):
+        with self._lock:
+            if event_id not in self._events:
+                bisect.insort(self._ids, event_id)
+                self._events[event_id] = {}
+            if not merge:
+                self._events[event_id] = {}
+            self._events[event_id].update(copy.deepcopy(data))
+
+    def update_event(self, event_id, fields):
+        with self._lock:
+            if event_id not in self._events:
+                return None
+            previous = copy.deepcopy(self._events[event_id])
+            self._events[event_id].update(copy.deepcopy(fields))
+            return previous
+
+    def delete_event(self, event_id):
+        with self._lock:
+            if self._events.pop(event_id, None) is None:
+                return None
+            del self._ids[bisect.bisect_left(self._ids, event_id)]
+            self._calendar_links.pop(event_id, None)
+            return len(self._rsvps.pop(event_id, {}))
+
+    def expire_event(self, event_id):
+        with self._lock:
+            data = self._events.get(event_id)
+            if data is None or data.get("status") != "active":
+                return False
+            data["status"] = "expired"
+            return True
+
+    def list_events(self, status="active", category=None, cursor=None, bounds=None,
+                    at=None):
+        with self._lock:
+            start = bisect.bisect_right(self._ids, cursor) if cursor else 0
+            ids = self._ids[start:]
+        for event_id in ids:
+            with self._lock:
+                data = self._events.get(event_id)
+                if data is None or not matches_listing(data, status, category, bounds, at):
+                    continue
+                data = copy.deepcopy(data)
+            yield event_id, data
+
+    def add_rsvp(self, event_id, user_email, data):
+        with self._lock:
+            self._rsvps.setdefault(event_id, {})[user_email] = copy.deepcopy(data)
+
+    def create_rsvp(self, event_id, user_email, data):
+        with self._lock:
+            rsvps = self._rsvps.setdefault(event_id, {})
+            if user_email in rsvps:
+                return False
+            rsvps[user_email] = copy.deepcopy(data)
+            return True
+
+    def remove_rsvp(self, event_id, user_email):
+        with self._lock:
+            return self._rsvps.get(event_id, {}).pop(user_email, None) is not None
+
+    def list_rsvps(self, event_id, prefix=""):
+        with self._lock:
+            return sorted(email for email in self._rsvps.get(event_id, {})
+                          if email.startswith(prefix))
+
+    def count_rsvps(self):
+        with self._lock:
+            return sum(len(rsvps) for rsvps in self._rsvps.values())
+
+    def set_calendar_link(self, event_id, user_email, calendar_event_id):
+        with self._lock:
+            self._calendar_links.setdefault(event_id, {})[user_email] = calendar_event_id
+
+    def get_calendar_link(self, event_id, user_email):
+        with self._lock:
+            return self._calendar_links.get(event_id, {}).get(user_email)
+
+    def remove_calendar_link(self, event_id, user_email):
+        with self._lock:
+            self._calendar_links.get(event_id, {}).pop(user_email, None)
+
+    def archive_events(self, summaries):
+        archived = {}
+        for event_id, summary in summaries.items():
+            with self._lock:
+                rsvps = self._rsvps.pop(event_id, {})
+                archived[event_id] = {**copy.deepcopy(summary), "rsvpCount": len(rsvps)}
+                self._archive[event_id] = copy.deepcopy(archived[event_id])
+            self.delete_event(event_id)
+        return archived
+
+    def get_archived_event(self, event_id):
+        with self._lock:
+            data = self._archive.get(event_id)
+            return copy.deepcopy(data) if data is not None else None
+
+    def update_stats(self, deltas):
+        with self._lock:
+            self._stats.update(deltas)
+            for key in deltas:
+                if not self._stats[key]:
+                    del self._stats[key]
+
+    def get_stats(self, first_day=None, last_day=None):
+        stats = {}
+        with self._lock:
+            for (group, bucket), count in self._stats.items():
+                if group in TIME_GROUPS and not (
+                        (first_day is None or bucket[:10] >= first_day)
+                        and (last_day is None or bucket[:10] <= last_day)):
+                    continue
+                stats.setdefault(group, {})[bucket] = count
+        return stats
+
+    def drop_stats_before(self, day):
+        with self._lock:
+            dropped = [key for key in self._stats if key[0] in TIME_GROUPS and key[1] < day]
+            for key in dropped:
+                del self._stats[key]
+        return len({bucket[:10] for _, bucket in dropped})
@@ -0,0 +1,308 @@
+"""
+Event storage backed by SQLite, used as a fast local replica and for benchmarks
+"""
+
+import json
+import math
+import sqlite3
+import threading
+from datetime import datetime
+
+from storage.base import TIME_GROUPS, EventStore, coordinates, new_id, time_span
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT PRIMARY KEY,
+    status TEXT,
+    category TEXT,
+    start_time REAL,
+    end_time REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_status ON events (status, id);
+CREATE INDEX IF NOT EXISTS events_status_category ON events (status, category, id);
+CREATE INDEX IF NOT EXISTS events_status_time ON events (status, start_time, end_time);
+CREATE VIRTUAL TABLE IF NOT EXISTS events_location USING rtree (
+    event_rowid, min_lat, max_lat, min_lng, max_lng
+);
+CREATE TABLE IF NOT EXISTS rsvps (
+    event_id TEXT NOT NULL,
+    email TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (event_id, email)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS calendar_links (
+    event_id TEXT NOT NULL,
+    email TEXT NOT NULL,
+    calendar_event_id TEXT NOT NULL,
+    PRIMARY KEY (event_id, email)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS archived_events (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    grp TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (grp, bucket)
+) WITHOUT ROWID;
+"""
+
+# rows fetched per query while listing, keeps memory flat for large tables
+PAGE_SIZE = 200
+
+
+def _encode(value):
+    """JSON encoder hook that keeps datetimes round-trippable"""
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode(obj):
+    """JSON decoder hook for values written by _encode"""
+    if "__datetime__" in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+def _dumps(data):
+    return json.dumps(data, default=_encode)
+
+
+def _loads(text):
+    return json.loads(text, object_hook=_decode)
+
+
+class SQLiteStore(EventStore):
+    """Stores each event as a JSON document alongside indexed columns: B-tree
+    indexes on status, category and time and an R-tree on location"""
+
+    def __init__(self, path=":memory:"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def _write_event(self, event_id, data):
+        start_time, end_time = time_span(data)
+        row = self._conn.execute(
+            "INSERT INTO events (id, status, category, start_time, end_time, data) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+            "status = excluded.status, category = excluded.category, "
+            "start_time = excluded.start_time, end_time = excluded.end_time, "
+            "data = excluded.data RETURNING rowid",
+            (event_id, data.get("status"), data.get("category"),
+             start_time, end_time, _dumps(data)),
+        ).fetchone()
+        self._conn.execute("DELETE FROM events_location WHERE event_rowid = ?", row)
+        point = coordinates(data.get("location"))
+        if point is not None and all(map(math.isfinite, point)):
+            latitude, longitude = point
+            self._conn.execute(
+                "INSERT INTO events_location VALUES (?, ?, ?, ?, ?)",
+                (row[0], latitude, latitude, longitude, longitude),
+            )
+
+    def _read_event(self, event_id):
+        row = self._conn.execute(
+            "SELECT data FROM events WHERE id = ?", (event_id,)
+        ).fetchone()
+        return _loads(row[0]) if row else None
+
+    def create_event(self, data):
+        event_id = new_id()
+        self.set_event(event_id, data)
+        return event_id
+
+    def get_event(self, event_id):
+        with self._lock:
+            return self._read_event(event_id)
+
+    def event_exists(self, event_id):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM events WHERE id = ?", (event_id,)).fetchone()
+        return row is not None
+
+    def set_event(self, event_id, data, merge=False):
+        with self._lock, self._conn:
+            if merge:
+                data = {**(self._read_event(event_id) or {}), **data}
+            self._write_event(event_id, data)
+
+    def update_event(self, event_id, fields):
+        with self._lock, self._conn:
+            data = self._read_event(event_id)
+            if data is not None:
+                self._write_event(event_id, {**data, **fields})
+            return data
+
+    def _delete_event(self, event_id):
+        self._conn.execute(
+            "DELETE FROM events_location WHERE event_rowid = "
+            "(SELECT rowid FROM events WHERE id = ?)", (event_id,)
+        )
+        if not self._conn.execute("DELETE FROM events WHERE id = ?", (event_id,)).rowcount:
+            return None
+        self._conn.execute("DELETE FROM calendar_links WHERE event_id = ?", (event_id,))
+        return self._conn.execute("DELETE FROM rsvps WHERE event_id = ?", (event_id,)).rowcount
+
+    def delete_event(self, event_id):
+        with self._lock, self._conn:
+            return self._delete_event(event_id)
+
+    def expire_event(self, event_id):
+        with self._lock, self._conn:
+            data = self._read_event(event_id)
+            if data is None or data.get("status") != "active":
+                return False
+            self._write_event(event_id, {**data, "status": "expired"})
+            return True
+
+    def list_events(self, status="active", category=None, cursor=None, bounds=None,
+                    at=None):
+        conditions, params = ["e.id > ?"], []
+        if bounds is not None:
+            # the R-tree finds the events in the box, a page of them is sorted by id after
+            sql = ("SELECT e.id, e.data FROM events_location l "
+                   "CROSS JOIN events e ON e.rowid = l.event_rowid")
+            min_lat, min_lng, max_lat, max_lng = bounds
+            conditions += ["l.min_lat >= ?", "l.max_lat <= ?", "l.min_lng >= ?", "l.max_lng <= ?"]
+            params += [min_lat, max_lat, min_lng, max_lng]
+        elif at is not None and status is not None:
+            # the planner would rather walk events_status in id order and check every row
+            sql = "SELECT e.id, e.data FROM events e INDEXED BY events_status_time"
+        else:
+            sql = "SELECT e.id, e.data FROM events e"
+        if at is not None:
+            conditions += ["e.start_time <= ?", "e.end_time >= ?"]
+            params += [at.timestamp(), at.timestamp()]
+        if status is not None:
+            conditions.append("e.status = ?")
+            params.append(status)
+        if category is not None:
+            conditions.append("e.category = ?")
+            params.append(category)
+        sql += f" WHERE {' AND '.join(conditions)} ORDER BY e.id LIMIT {PAGE_SIZE}"
+
+        last_id = cursor or ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(sql, [last_id, *params]).fetchall()
+            for event_id, data in rows:
+                yield event_id, _loads(data)
+            if len(rows) < PAGE_SIZE:
+                return
+            last_id = rows[-1][0]
+
+    def add_rsvp(self, event_id, user_email, data):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rsvps VALUES (?, ?, ?)",
+                (event_id, user_email, _dumps(data)),
+            )
+
+    def create_rsvp(self, event_id, user_email, data):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO rsvps VALUES (?, ?, ?)",
+                (event_id, user_email, _dumps(data)),
+            )
+        return cursor.rowcount == 1
+
+    def remove_rsvp(self, event_id, user_email):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM rsvps WHERE event_id = ? AND email = ?", (event_id, user_email)
+            )
+        return cursor.rowcount == 1
+
+    def list_rsvps(self, event_id, prefix=""):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT email FROM rsvps WHERE event_id = ? AND substr(email, 1, ?) = ? "
+                "ORDER BY email", (event_id, len(prefix), prefix),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def count_rsvps(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rsvps").fetchone()[0]
+
+    def set_calendar_link(self, event_id, user_email, calendar_event_id):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO calendar_links VALUES (?, ?, ?)",
+                (event_id, user_email, calendar_event_id),
+            )
+
+    def get_calendar_link(self, event_id, user_email):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT calendar_event_id FROM calendar_links WHERE event_id = ? AND email = ?",
+                (event_id, user_email),
+            ).fetchone()
+        return row[0] if row else None
+
+    def remove_calendar_link(self, event_id, user_email):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM calendar_links WHERE event_id = ? AND email = ?",
+                (event_id, user_email),
+            )
+
+    def archive_events(self, summaries):
+        archived = {}
+        with self._lock, self._conn:
+            for event_id, summary in summaries.items():
+                (rsvp_count,) = self._conn.execute(
+                    "SELECT COUNT(*) FROM rsvps WHERE event_id = ?", (event_id,)
+                ).fetchone()
+                archived[event_id] = {**summary, "rsvpCount": rsvp_count}
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO archived_events VALUES (?, ?)",
+                    (event_id, _dumps(archived[event_id])),
+                )
+                self._delete_event(event_id)
+        return archived
+
+    def get_archived_event(self, event_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM archived_events WHERE id = ?", (event_id,)
+            ).fetchone()
+        return _loads(row[0]) if row else None
+
+    def update_stats(self, deltas):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO stats VALUES (?, ?, ?) ON CONFLICT (grp, bucket) "
+                "DO UPDATE SET count = count + excluded.count",
+                [(group, bucket, delta) for (group, bucket), delta in deltas.items()],
+            )
+            self._conn.executemany(
+                "DELETE FROM stats WHERE grp = ? AND bucket = ? AND count = 0", list(deltas)
+            )
+
+    def get_stats(self, first_day=None, last_day=None):
+        stats = {}
+        with self._lock:
+            # time buckets start with their day, so the primary key range covers the days
+            rows = self._conn.execute(
+                "SELECT grp, bucket, count FROM stats WHERE grp NOT IN (?, ?) "
+                "OR (bucket >= ? AND substr(bucket, 1, 10) <= ?)",
+                (*TIME_GROUPS, first_day or "", last_day or "9999-12-31"),
+            ).fetchall()
+        for group, bucket, count in rows:
+            stats.setdefault(group, {})[bucket] = count
+        return stats
+
+    def drop_stats_before(self, day):
+        with self._lock, self._conn:
+            days = self._conn.execute(
+                "DELETE FROM stats WHERE grp IN (?, ?) AND bucket < ? "
+                "RETURNING substr(bucket, 1, 10)", (*TIME_GROUPS, day)
+            ).fetchall()
+        return len(set(days))
@@ -0,0 +1,88 @@
+"""Pytest tests for archiving expired events"""
+
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from app import app
+from archive import archive_expired
+from storage import CountingStore, MemoryStore
+from storage.firestore_store import FirestoreStore
+
+
+def expired_event(title, ended):
+    """Builds stored data of an expired event with an inline image."""
+    return {
+        "title": title,
+        "description": "desc",
+        "startTime": ended - timedelta(hours=2),
+        "endTime": ended,
+        "category": "Social",
+        "image": "data:image/png;base64,AAAA",
+        "ownerEmail": "owner@example.com",
+        "status": "expired",
+    }
+
+
+def test_archive_expired_moves_old_events(store, tmp_path):
+    """Ensure that only events past the retention period are archived, without their RSVPs."""
+    now = datetime.now(timezone.utc)
+    store.set_event("old", expired_event("Old", now - timedelta(days=40)))
+    store.set_event("recent", expired_event("Recent", now - timedelta(days=1)))
+    store.add_rsvp("old", "a@example.com", {"email": "a@example.com"})
+    store.add_rsvp("old", "b@example.com", {"email": "b@example.com"})
+    store.set_calendar_link("old", "a@example.com", "cal1")
+    store.update_stats({("hour", f"{now - timedelta(days=40):%Y-%m-%dT%H}"): 1,
+                        ("day", f"{now - timedelta(days=1):%Y-%m-%d}"): 1})
+
+    assert archive_expired(store, retention_days=30, dry_run=True)["archived"] == 1
+    assert store.event_exists("old")
+
+    export = tmp_path / "archive.ndjson.gz"
+    result = archive_expired(store, retention_days=30, batch_size=1, export_path=export)
+    assert result == {"scanned": 2, "archived": 1, "droppedDays": 1}
+    assert not store.event_exists("old")
+    assert store.event_exists("recent")
+    assert not store.list_rsvps("old")
+    assert store.get_calendar_link("old", "a@example.com") is None
+    assert store.get_stats()["day"] == {f"{now - timedelta(days=1):%Y-%m-%d}": 1}
+    assert "hour" not in store.get_stats()
+
+    archived = store.get_archived_event("old")
+    assert archived["title"] == "Old"
+    assert archived["rsvpCount"] == 2
+    assert "image" not in archived
+    with gzip.open(export, "rt", encoding="utf-8") as f:
+        assert [json.loads(line)["eventId"] for line in f] == ["old"]
+
+
+def test_event_endpoint_reads_through_archive(client, monkeypatch):
+    """Ensure that event details are served from the archive once an event was archived."""
+    memory = MemoryStore()
+    monkeypatch.setitem(app.extensions, "event_store", CountingStore(memory))
+    memory.set_event("live", {"title": "Live", "status": "active"})
+    memory.set_event("gone", {"title": "Gone", "status": "expired"})
+    memory.archive_events({"gone": {"title": "Gone"}})
+
+    live = client.get("/event/live").get_json()
+    assert live["archived"] is False
+    assert live["event"]["title"] == "Live"
+    gone = client.get("/event/gone").get_json()
+    assert gone["archived"] is True
+    assert gone["event"] == {"title": "Gone", "rsvpCount": 0, "eventId": "gone"}
+    assert client.get("/event/missing").status_code == 404
+
+
+def test_firestore_archive_splits_batches():
+    """Ensure that Firestore archive writes are committed in batches of at most 500."""
+    firestore_client = MagicMock()
+    rsvps = firestore_client.collection.return_value.document.return_value.collection
+    rsvps.return_value.list_documents.return_value = [MagicMock() for _ in range(600)]
+
+    archived = FirestoreStore(firestore_client).archive_events({"old": {"title": "Old"}})
+    assert archived["old"]["rsvpCount"] == 600
+    batch = firestore_client.batch.return_value
+    assert batch.commit.call_count == 2
+    assert batch.set.call_count == 1
+    assert batch.delete.call_count == 601
@@ -0,0 +1,164 @@
+"""Pytest tests for the async ASGI routes"""
+
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+import asgi
+import tracing
+from conftest import auth_header
+from storage import CountingStore, MemoryStore
+from singleflight import AsyncSingleFlight
+from snapshot import SnapshotReader, write_snapshot
+
+
+def request(method, path, **kwargs):
+    """Sends one request to the ASGI application."""
+    async def send():
+        transport = httpx.ASGITransport(app=asgi.application)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, path, **kwargs)
+    return asyncio.run(send())
+
+
+@pytest.mark.usefixtures("memory_store")
+def test_async_state_and_stream():
+    """Ensure that the async list routes match the Flask response format."""
+    body = request("GET", "/state").json()
+    assert [e["eventId"] for e in body["state"]["events"]] == ["event1"]
+    assert request("GET", "/state?stream=1").json() == body
+    assert request("GET", "/filter_events/Sports").json()["state"]["events"] == []
+    assert request("GET", "/state?limit=0").status_code == 400
+
+
+def test_async_rsvps(memory_store):
+    """Ensure that RSVP routes check the event and read RSVPs."""
+    memory_store.add_rsvp("event1", "a@example.com", {"status": "confirmed"})
+    assert request("GET", "/rsvps/event1").json() == ["a@example.com"]
+    assert request("GET", "/rsvps/missing").status_code == 404
+    assert request("POST", "/rsvp/event1").status_code == 401
+
+
+def test_async_state_expands_series(memory_store):
+    """Ensure that the async list routes expand recurring series like the Flask app."""
+    now = datetime.now(timezone.utc)
+    memory_store.set_event("series", {
+        "title": "Club", "category": "Clubs", "status": "active",
+        "startTime": now - timedelta(hours=1), "endTime": now + timedelta(hours=1),
+        "recurrence": {"rrule": "FREQ=WEEKLY;COUNT=2", "exdates": [], "overrides": {},
+                       "lastEnd": now + timedelta(days=7, hours=1)},
+    })
+    events = request("GET", "/filter_events/Clubs").json()["state"]["events"]
+    assert [e["eventId"].split("_")[0] for e in events] == ["series", "series"]
+    assert request("GET", f"/rsvps/{events[1]['eventId']}").json() == []
+
+
+@pytest.mark.usefixtures("memory_store")
+def test_async_state_from_snapshot(monkeypatch, tmp_path):
+    """Ensure that the async list routes are served from a fresh snapshot."""
+    now = datetime.now(timezone.utc)
+    path = tmp_path / "events.snapshot"
+    write_snapshot(path, 1, {"shared": {
+        "title": "Shared", "category": "Social", "status": "active",
+        "startTime": now - timedelta(hours=1), "endTime": now + timedelta(hours=1),
+    }}, asgi.flask_app.json.dumps)
+    monkeypatch.setitem(asgi.flask_app.extensions, "snapshot", SnapshotReader(path, 30))
+    events = request("GET", "/state").json()["state"]["events"]
+    assert [e["eventId"] for e in events] == ["shared"]
+    assert request("GET", "/state?stream=1").json()["state"]["events"] == events
+    assert request("GET", f"/filter_times/{now:%Y-%m-%dT%H:%M}").json()["state"]["events"] == events
+
+
+def test_flask_writes_clear_async_reads(monkeypatch, memory_store):
+    """Ensure that an event written through the Flask fallback is listed by the next
+    async read, even with the read cache on."""
+    monkeypatch.setitem(asgi.flask_app.extensions, "event_store", memory_store)
+    monkeypatch.setattr(asgi.shared_reads, "ttl", 60)
+    assert len(request("GET", "/state").json()["state"]["events"]) == 1
+    start = datetime.now(timezone.utc) + timedelta(days=1)
+    response = request("POST", "/create_event", headers=auth_header(), json={
+        "title": "Party", "description": "desc", "startTime": start.isoformat(),
+        "endTime": (start + timedelta(hours=2)).isoformat(),
+        "location": {"latitude": 36.99, "longitude": -122.06}, "category": "Social",
+    })
+    assert response.status_code == 201
+    events = request("GET", "/state").json()["state"]["events"]
+    assert response.json()["eventId"] in [e["eventId"] for e in events]
+
+
+def test_async_storage_calls_counted_and_traced_per_route(monkeypatch):
+    """Ensure that storage calls of the async routes count and trace under their route."""
+    memory = MemoryStore()
+    memory.set_event("event1", {"title": "Party", "status": "active"})
+    memory.add_rsvp("event1", "a@example.com", {"status": "confirmed"})
+    flask_store = CountingStore(memory)
+    monkeypatch.setitem(asgi.flask_app.extensions, "event_store", flask_store)
+    monkeypatch.setattr(asgi, "_clients", {})
+    monkeypatch.setenv("STORAGE_TRACE", "1")
+    traces = []
+    monkeypatch.setattr(tracing, "check_trace", lambda *args: traces.append(args))
+    labels = {"route": "/rsvps/<event_id>", "operation": "reads"}
+    before = REGISTRY.get_sample_value("storage_operations_total", labels) or 0
+
+    assert request("GET", "/rsvps/event1").json() == ["a@example.com"]
+    assert REGISTRY.get_sample_value("storage_operations_total", labels) - before == 2
+    assert not flask_store.counts
+    assert len(traces) == 1
+    method, route, path, calls, _ = traces[0]
+    assert (method, route, path) == ("GET", "/rsvps/<event_id>", "/rsvps/event1")
+    assert sorted(call["operation"] for call in calls) == ["event_exists", "list_rsvps"]
+
+
+@pytest.mark.usefixtures("memory_store")
+def test_other_routes_fall_back_to_flask():
+    """Ensure that routes without an async handler are served by the Flask app."""
+    response = request("GET", "/metrics")
+    assert response.status_code == 200
+    assert "http_request_duration_seconds" in response.text
+
+
+def test_flask_fallback_serves_requests_concurrently(monkeypatch):
+    """Ensure that requests passed through to the Flask app don't wait on each other."""
+    memory = MemoryStore()
+    monkeypatch.setitem(asgi.flask_app.extensions, "event_store", memory)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def get_stats(*_):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.2)
+        with lock:
+            running[0] -= 1
+        return {}
+
+    monkeypatch.setattr(memory, "get_stats", get_stats)
+
+    async def send_all():
+        transport = httpx.ASGITransport(app=asgi.application)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.get("/stats") for _ in range(4)))
+
+    assert [response.status_code for response in asyncio.run(send_all())] == [200] * 4
+    assert peak[0] == 4
+
+
+def test_async_single_flight_coalesces():
+    """Ensure that concurrent coroutines with the same key share one fetch."""
+    flight = AsyncSingleFlight(ttl=0)
+    fetches = []
+
+    async def fetch():
+        fetches.append(1)
+        await asyncio.sleep(0.01)
+        return "events"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("state", fetch) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["events"] * 5
+    assert len(fetches) == 1
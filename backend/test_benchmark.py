@@ -0,0 +1,44 @@
+"""Pytest tests for the benchmark result comparison"""
+
+import pytest
+
+from benchmarks.api import compare, percentile
+
+META = {"backend": "memory", "read_cache_ttl": 0, "rsvps": 3, "seed": 42,
+        "concurrency": 8, "requests": 200}
+
+
+def result(p95_ms=10.0, throughput_rps=100.0, reads=1.0, rss=50.0):
+    """Builds a single benchmark result."""
+    return {
+        "events": 1000, "endpoint": "state", "p95_ms": p95_ms,
+        "throughput_rps": throughput_rps, "reads_per_request": reads,
+        "writes_per_request": 0.0, "deletes_per_request": 0.0, "serving_rss_mb": rss,
+    }
+
+
+def test_percentile_nearest_rank():
+    """Ensure that percentiles use the nearest rank of the sorted values."""
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) is None
+
+
+def test_compare_flags_regressions():
+    """Ensure that slower, lower throughput or chattier runs are reported."""
+    baseline = {"meta": META, "results": [result()]}
+    assert not compare([result(p95_ms=11.0)], META, baseline, threshold=0.2)
+    regressions = compare([result(p95_ms=20.0, throughput_rps=50.0, reads=2.0, rss=70.0)],
+                          META, baseline, 0.2)
+    assert len(regressions) == 4
+
+
+def test_compare_refuses_other_settings():
+    """Ensure that a baseline run with another backend, read cache or load isn't compared."""
+    for meta in ({**META, "read_cache_ttl": 1.0}, {**META, "backend": "sqlite"},
+                 {**META, "concurrency": 16}, {**META, "requests": 50}):
+        with pytest.raises(ValueError, match="isn't comparable"):
+            compare([result()], meta, {"meta": META, "results": [result()]}, 0.2)
+    with pytest.raises(ValueError, match="read_cache_ttl"):
+        compare([result()], META, {"results": [result()]}, 0.2)
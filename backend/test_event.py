@@ -1,6 +1,6 @@
 """Pytest tests for basic Event class functionality"""
 
-from unittest.mock import MagicMock, ANY
+from unittest.mock import MagicMock
 import pytest
 from event import Event
 
@@ -41,85 +41,6 @@ def test_event_creation(sample_event, mock_db):
     event_ref.set.assert_called_with(expected_data)
 
 
-def test_event_update(sample_event, mock_db):
-    """Ensure that updating an event modifies the database entry correctly with accurate data."""
-    event_ref = mock_db.collection("events").document("event123")
-    sample_event.event_id = "event123"
-
-    # modify event fields
-    sample_event.title = "Updated Title"
-    sample_event.capacity = "200"
-    sample_event.status = "updated"
-
-    sample_event.update("event123")
-
-    expected_data = sample_event.to_dict()
-    event_ref.set.assert_called_once_with(expected_data, merge=True)
-
-
-@pytest.mark.usefixtures("app_context")
-def test_event_deletion(sample_event, mock_db):
-    """Ensure that deleting an event removes it from the database and verifies removal."""
-    event_ref = mock_db.collection("events").document("event123")
-    sample_event.event_id = "event123"
-
-    response, status_code = sample_event.delete()
-
-    event_ref.delete.assert_called_once()
-    assert status_code == 200
-    assert response.json == {"message": "Event deleted successfully"}
-
-
-def test_rsvp_addition(sample_event, mock_db):
-    """Ensure that adding an RSVP correctly updates the database and verifies stored values."""
-    sample_event.event_id = "event123"
-    rsvp_collection = (
-        mock_db.collection("events").document("event123").collection("rsvps")
-    )
-    rsvp_ref = rsvp_collection.document("user@example.com")
-
-    sample_event.rsvp_add("user@example.com")
-
-    expected_data = {
-        "email": "user@example.com",
-        "status": "confirmed",
-        "timestamp": ANY,  # ignore timestamp since it's dynamically generated
-    }
-    rsvp_ref.set.assert_called_once_with(expected_data)
-
-
-def test_rsvp_removal(sample_event, mock_db):
-    """Ensure that removing an RSVP correctly updates the database and verifies removal."""
-    sample_event.event_id = "event123"
-    rsvp_collection = (
-        mock_db.collection("events").document("event123").collection("rsvps")
-    )
-    rsvp_ref = rsvp_collection.document("user@example.com")
-
-    sample_event.rsvp_remove("user@example.com")
-
-    rsvp_ref.delete.assert_called_once()
-
-
-def test_get_rsvps_list(sample_event, mock_db):
-    """Ensure that retrieving RSVPs returns the correct list of user emails."""
-    sample_event.event_id = "event123"
-    rsvp_collection = (
-        mock_db.collection("events").document("event123").collection("rsvps")
-    )
-
-    # mock Firestore's stream() to return fake RSVP documents
-    mock_snapshot = [
-        MagicMock(id="user1@example.com"),
-        MagicMock(id="user2@example.com"),
-    ]
-    rsvp_collection.stream.return_value = mock_snapshot
-
-    rsvps = sample_event.get_rsvps()
-
-    assert rsvps == ["user1@example.com", "user2@example.com"]
-
-
 def test_event_fetch_from_db(sample_event, mock_db):
     """Ensure fetching an event from the database retrieves all correct values."""
     event_ref = mock_db.collection("events").document("event123")
@@ -0,0 +1,49 @@
+"""Pytest tests for the /metrics endpoint and structured logs"""
+
+import importlib.util
+import json
+import logging
+import os
+from unittest.mock import MagicMock
+import pytest
+from log_config import JsonFormatter
+
+
+@pytest.mark.usefixtures("events_db")
+def test_metrics_records_route_latency_and_storage_reads(client):
+    """Ensure that requests show up in the latency histogram and storage counters."""
+    client.get("/state")
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{method="GET",route="/state",status="200"}' in body
+    assert 'storage_operations_total{operation="reads",route="/state"}' in body
+    assert 'read_cache_requests_total{result="fetch"}' in body
+    assert "http_requests_in_flight" in body
+
+
+def test_gunicorn_drops_metrics_of_dead_workers(monkeypatch, tmp_path):
+    """Ensure that the master clears old metrics files on start and the live gauges
+    of workers that exit."""
+    spec = importlib.util.spec_from_file_location(
+        "gunicorn_conf", os.path.join(os.path.dirname(__file__), "gunicorn.conf.py"))
+    conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(conf)
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    (tmp_path / "counter_7.db").touch()
+    conf.on_starting(MagicMock())
+    assert not list(tmp_path.iterdir())
+
+    (tmp_path / "gauge_livesum_8.db").touch()
+    (tmp_path / "gauge_livesum_9.db").touch()
+    conf.child_exit(MagicMock(), MagicMock(pid=8))
+    assert [path.name for path in tmp_path.iterdir()] == ["gauge_livesum_9.db"]
+
+
+def test_json_formatter_includes_extra_fields():
+    """Ensure that log records are rendered as JSON with their extra fields."""
+    record = logging.makeLogRecord({
+        "name": "app", "levelname": "INFO", "msg": "Event marked as expired", "event_id": "abc",
+    })
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "Event marked as expired"
+    assert entry["severity"] == "INFO"
+    assert entry["event_id"] == "abc"
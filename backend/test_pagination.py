@@ -0,0 +1,73 @@
+"""Pytest tests for paginated and streamed event listings"""
+
+import json
+from datetime import datetime, timedelta, timezone
+import pytest
+from conftest import make_event_doc
+from helpers import MAX_RECURRENCE_WINDOW_DAYS, parse_window
+from storage.firestore_store import PAGE_SIZE, FirestoreStore
+
+
+@pytest.mark.usefixtures("events_db")
+def test_state_without_limit_returns_all(client):
+    """Ensure that listing without a limit still returns every event."""
+    body = client.get("/state").get_json()
+    assert [e["eventId"] for e in body["state"]["events"]] == ["a", "b", "c"]
+    assert body["nextCursor"] is None
+
+
+def test_state_limit_and_cursor(client, events_db):
+    """Ensure that a limited page returns a cursor and the cursor is passed to Firestore."""
+    body = client.get("/state?limit=2").get_json()
+    assert [e["eventId"] for e in body["state"]["events"]] == ["a", "b"]
+    assert body["nextCursor"] == "b"
+
+    client.get("/state?limit=2&cursor=b")
+    events_db.order_by.assert_called_with("__name__")
+    events_db.start_after.assert_called_with({"__name__": "b"})
+    events_db.limit.assert_called_with(PAGE_SIZE)
+
+
+def test_firestore_listing_fetches_chunks(mock_db):
+    """Ensure that Firestore listings fetch bounded chunks, resuming after the last
+    document, and stop reading when the caller stops."""
+    query = mock_db.collection.return_value
+    query.order_by.return_value = query
+    query.start_after.return_value = query
+    query.limit.return_value = query
+    chunks = [[make_event_doc(f"e{i:03}") for i in range(PAGE_SIZE)],
+              [make_event_doc("f")]]
+    query.stream.side_effect = lambda: iter(chunks.pop(0))
+    ids = [event_id for event_id, _ in FirestoreStore(mock_db).list_events(status=None)]
+    assert len(ids) == PAGE_SIZE + 1 and ids[-1] == "f"
+    query.limit.assert_called_with(PAGE_SIZE)
+    query.start_after.assert_called_once_with({"__name__": f"e{PAGE_SIZE - 1:03}"})
+
+    chunks.append([make_event_doc("a")] * PAGE_SIZE)
+    next(FirestoreStore(mock_db).list_events(status=None))
+    assert not chunks
+    assert query.stream.call_count == 3
+
+
+@pytest.mark.usefixtures("events_db")
+def test_state_streamed_matches_buffered(client):
+    """Ensure that the streamed response is the same JSON document as the buffered one."""
+    buffered = client.get("/state?limit=2").get_json()
+    streamed = json.loads(client.get("/state?limit=2&stream=1").get_data(as_text=True))
+    assert streamed == buffered
+
+
+@pytest.mark.usefixtures("events_db")
+def test_invalid_limit(client):
+    """Ensure that out of range limits are rejected."""
+    assert client.get("/state?limit=0").status_code == 400
+    assert client.get("/state?limit=abc").status_code == 400
+
+
+def test_recurrence_window_is_clamped():
+    """Ensure that a wide from/to window is cut to the longest allowed span."""
+    (start, end), _ = parse_window({"from": "2025-03-01T00:00", "to": "9999-12-31T00:00"})
+    assert end - start == timedelta(days=MAX_RECURRENCE_WINDOW_DAYS)
+    (start, end), _ = parse_window({"from": "2025-03-01T00:00+00:00", "to": "2025-03-08T00:00"})
+    assert (start, end) == (datetime(2025, 3, 1, tzinfo=timezone.utc), datetime(2025, 3, 8))
+    assert parse_window({"from": "9999-12-31T00:00"})[1].startswith("Invalid date format")
@@ -0,0 +1,164 @@
+"""Pytest tests for recurring events and their lazy expansion"""
+
+from datetime import datetime, timedelta, timezone
+import pytest
+from app import app
+from conftest import USER_EMAIL, auth_header
+from event import Event
+from recurrence import (
+    build_recurrence, expand, iter_starts, last_start, parse_rrule, rebase
+)
+from storage import CountingStore, MemoryStore
+
+
+def test_weekly_rule_with_count_and_until():
+    """Ensure that weekly rules honour BYDAY, INTERVAL, COUNT and UNTIL."""
+    monday = datetime(2025, 3, 3, 18, 0)
+    starts = list(iter_starts(monday, parse_rrule("FREQ=WEEKLY;BYDAY=MO,WE;COUNT=3")))
+    assert starts == [monday, monday + timedelta(days=2), monday + timedelta(days=7)]
+
+    starts = list(iter_starts(monday, parse_rrule("RRULE:FREQ=WEEKLY;INTERVAL=2;UNTIL=20250331")))
+    assert starts == [monday + timedelta(weeks=i) for i in (0, 2, 4)]
+
+    for rule in ("FREQ=DAILY", "FREQ=WEEKLY;COUNT=2;UNTIL=20250331", "FREQ=WEEKLY;BYDAY=XX"):
+        with pytest.raises(ValueError):
+            parse_rrule(rule)
+
+
+def test_series_length_is_bounded():
+    """Ensure that the last occurrence is computed from the rule and huge rules are refused."""
+    monday = datetime(2025, 3, 3, 18, 0, tzinfo=timezone.utc)
+    for rule in ("FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=100", "FREQ=WEEKLY;INTERVAL=3;UNTIL=20271231",
+                 "FREQ=WEEKLY;BYDAY=SU,MO;UNTIL=20250303T170000Z"):
+        starts = list(iter_starts(monday, parse_rrule(rule)))
+        assert last_start(monday, parse_rrule(rule)) == (starts[-1] if starts else None)
+
+    for rule in ("FREQ=WEEKLY;COUNT=1000000", "FREQ=WEEKLY;INTERVAL=1000000000",
+                 "FREQ=WEEKLY;UNTIL=20400101", "FREQ=WEEKLY;INTERVAL=52;COUNT=1000"):
+        with pytest.raises(ValueError):
+            build_recurrence(rule, monday, monday + timedelta(hours=2))
+    error = Event.recurrence_from_request({
+        "recurrence": "FREQ=WEEKLY;UNTIL=99991231",
+        "startTime": monday.isoformat(), "endTime": (monday + timedelta(hours=2)).isoformat(),
+    })[1]
+    assert error.startswith("Invalid recurrence")
+
+
+def test_expand_only_covers_the_window():
+    """Ensure that an old series is expanded just for the window, with exdates and overrides."""
+    start = datetime(2020, 1, 6, 18, 0, tzinfo=timezone.utc)
+    recurrence = build_recurrence("FREQ=WEEKLY", start, start + timedelta(hours=2))
+    assert recurrence["lastEnd"] is None
+    recurrence["exdates"] = ["20250310T180000"]
+    recurrence["overrides"] = {"20250317T180000": {"title": "Special"}}
+    data = {"title": "Club", "startTime": start, "endTime": start + timedelta(hours=2),
+            "recurrence": recurrence}
+
+    window = (datetime(2025, 3, 3, 19, 0), datetime(2025, 3, 20))
+    found = list(expand("series", data, *window))
+    assert [event_id for event_id, _ in found] == ["series_20250303T180000",
+                                                   "series_20250317T180000"]
+    assert found[1][1]["title"] == "Special"
+    assert "recurrence" not in found[0][1]
+
+
+def test_calendar_body_exports_rule():
+    """Ensure that a series is exported to Google Calendar with its rule and exdates."""
+    start = datetime(2025, 3, 3, 18, 0)
+    recurrence = build_recurrence("FREQ=WEEKLY;COUNT=4", start, start + timedelta(hours=1),
+                                  exdates=[start + timedelta(weeks=1)])
+    assert recurrence["lastEnd"] == start + timedelta(weeks=3, hours=1)
+    event = Event("Club", "Weekly", start, start + timedelta(hours=1),
+                  {"latitude": 0, "longitude": 0}, "Clubs", "a@example.com", None,
+                  recurrence=recurrence)
+    assert event.calendar_body()["recurrence"] == [
+        "RRULE:FREQ=WEEKLY;COUNT=4", "EXDATE;TZID=UTC:20250310T180000"
+    ]
+
+
+def test_recurring_series_routes(client, monkeypatch):
+    """Ensure that a series is stored once and its occurrences can be listed, paged,
+    RSVPed to, changed and cancelled individually."""
+    memory = MemoryStore()
+    monkeypatch.setitem(app.extensions, "event_store", CountingStore(memory))
+    app.extensions["shared_reads"].clear()
+    monkeypatch.setattr(app.extensions["shared_reads"], "ttl", 0)
+    headers = auth_header()
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    body = {
+        "title": "Club", "description": "Weekly meeting",
+        "startTime": (now - timedelta(hours=1)).isoformat(),
+        "endTime": (now + timedelta(hours=1)).isoformat(),
+        "location": {"latitude": 36.99, "longitude": -122.06}, "category": "Clubs",
+        "recurrence": "FREQ=WEEKLY",
+    }
+    response = client.post("/create_event", json=body, headers=headers)
+    assert response.status_code == 201
+    series_id = response.get_json()["eventId"]
+    assert len(list(memory.list_events())) == 1
+
+    ids = [e["eventId"] for e in client.get("/state").get_json()["state"]["events"]]
+    assert len(ids) == 3
+    assert all(event_id.startswith(f"{series_id}_") for event_id in ids)
+    first_page = client.get("/state?limit=1").get_json()
+    second_page = client.get(f"/state?limit=2&cursor={first_page['nextCursor']}").get_json()
+    assert [e["eventId"] for e in second_page["state"]["events"]] == ids[1:]
+    happening = client.get(f"/filter_times/{now:%Y-%m-%dT%H:%M}").get_json()
+    assert [e["eventId"] for e in happening["state"]["events"]] == ids[:1]
+
+    assert client.post(f"/rsvp/{ids[1]}", headers=headers).status_code == 200
+    assert client.get(f"/rsvps/{ids[1]}").get_json() == [USER_EMAIL]
+    assert not client.get(f"/rsvps/{ids[0]}").get_json()
+    # occurrence RSVPs are stored on the series, apart from its own
+    assert memory.list_rsvps(series_id) == [f"{ids[1].split('_')[1]}_{USER_EMAIL}"]
+    assert not client.get(f"/rsvps/{series_id}").get_json()
+    assert client.get(f"/rsvps/{series_id}_20000101T000000").status_code == 404
+
+    update = {**body, "eventId": ids[1], "title": "Special",
+              "startTime": (now + timedelta(days=7, hours=-1)).isoformat(),
+              "endTime": (now + timedelta(days=7, hours=1)).isoformat()}
+    del update["recurrence"]
+    assert client.post("/update_event", json=update, headers=headers).status_code == 200
+    assert client.delete(f"/delete_event/{ids[2]}", headers=headers).status_code == 200
+    events = client.get("/state").get_json()["state"]["events"]
+    assert [(e["eventId"], e["title"]) for e in events] == [(ids[0], "Club"), (ids[1], "Special")]
+    assert memory.get_event(series_id)["recurrence"]["overrides"] == {
+        ids[1].split("_")[1]: {"title": "Special"}
+    }
+    assert client.get(f"/event/{ids[1]}").get_json()["event"]["title"] == "Special"
+
+    # updating the whole series keeps the cancelled occurrence cancelled
+    update = {**body, "eventId": series_id, "title": "Renamed"}
+    del update["recurrence"]
+    assert client.post("/update_event", json=update, headers=headers).status_code == 200
+    events = client.get("/state").get_json()["state"]["events"]
+    assert [(e["eventId"], e["title"]) for e in events] == [(ids[0], "Renamed"), (ids[1], "Special")]
+
+    assert client.delete(f"/delete_event/{series_id}", headers=headers).status_code == 200
+    assert not memory.list_rsvps(series_id)
+    stats = client.get("/stats").get_json()["stats"]
+    assert (stats["activeEvents"], stats["rsvps"]) == (0, 0)
+
+    body["recurrence"] = "FREQ=MONTHLY"
+    assert client.post("/create_event", json=body, headers=headers).status_code == 400
+
+
+def test_rebase_keeps_exdates_on_the_new_rule():
+    """Ensure that a series update keeps the exdates and overrides still on its rule and
+    recomputes lastEnd from the new start."""
+    start = datetime(2025, 3, 3, 18, 0, tzinfo=timezone.utc)
+    previous = {**build_recurrence("FREQ=WEEKLY;COUNT=4", start, start + timedelta(hours=2)),
+                "exdates": ["20250310T180000", "20250317T180000"],
+                "overrides": {"20250310T180000": {"title": "Gone"},
+                              "20250324T180000": {"title": "Kept"}}}
+    recurrence = rebase(previous, build_recurrence("FREQ=WEEKLY;INTERVAL=2;COUNT=2", start,
+                                                   start + timedelta(hours=2)),
+                        start, start + timedelta(hours=2))
+    assert recurrence["exdates"] == ["20250317T180000"]
+    assert recurrence["overrides"] == {}
+
+    later = start + timedelta(weeks=1)
+    recurrence = rebase(previous, None, later, later + timedelta(hours=1))
+    assert recurrence["exdates"] == ["20250310T180000", "20250317T180000"]
+    assert recurrence["overrides"] == previous["overrides"]
+    assert recurrence["lastEnd"] == later + timedelta(weeks=3, hours=1)
@@ -0,0 +1,78 @@
+"""Pytest tests for single-flight request coalescing"""
+
+import threading
+import time
+import pytest
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_fetch():
+    """Ensure that concurrent callers with the same key trigger a single fetch."""
+    flight = SingleFlight(ttl=0)
+    fetches = []
+    release = threading.Event()
+
+    def fetch():
+        fetches.append(1)
+        release.wait(1)
+        return ["event"]
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("state", fetch)))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    while flight.stats["requests"] < 10:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(fetches) == 1
+    assert results == [["event"]] * 10
+    assert flight.stats["coalesced"] == 9
+
+
+def test_micro_cache_expires():
+    """Ensure that results are reused within the TTL and fetched again afterwards."""
+    flight = SingleFlight(ttl=0.05)
+    calls = []
+    assert flight.do("key", lambda: calls.append(1) or len(calls)) == 1
+    assert flight.do("key", lambda: calls.append(1) or len(calls)) == 1
+    assert flight.stats["cache_hits"] == 1
+    time.sleep(0.06)
+    assert flight.do("key", lambda: calls.append(1) or len(calls)) == 2
+
+
+def test_errors_are_not_cached():
+    """Ensure that a failed fetch is raised and not kept in the cache."""
+    flight = SingleFlight(ttl=10)
+
+    def failing():
+        raise RuntimeError("firestore down")
+
+    with pytest.raises(RuntimeError, match="firestore down"):
+        flight.do("key", failing)
+    assert flight.do("key", lambda: "ok") == "ok"
+
+
+def test_clear_discards_in_flight_results():
+    """Ensure that a fetch started before clear() is neither cached nor joined."""
+    flight = SingleFlight(ttl=10)
+    started, release = threading.Event(), threading.Event()
+
+    def stale_fetch():
+        started.set()
+        release.wait(1)
+        return "before write"
+
+    thread = threading.Thread(target=flight.do, args=("key", stale_fetch))
+    thread.start()
+    started.wait(1)
+    flight.clear()
+    assert flight.do("key", lambda: "after write") == "after write"
+    release.set()
+    thread.join()
+    assert flight.do("key", lambda: "refetched") == "after write"
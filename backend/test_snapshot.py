@@ -0,0 +1,166 @@
+"""Pytest tests for the active-event snapshot shared by worker processes"""
+
+import math
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from app import app
+from recurrence import build_recurrence
+from snapshot import Snapshot, SnapshotProducer, SnapshotReader, write_snapshot
+from storage import CountingStore, MemoryStore
+
+
+def event(title, start, hours=2, category="Social", **fields):
+    """Builds stored data of an active event."""
+    return {"title": title, "startTime": start, "endTime": start + timedelta(hours=hours),
+            "location": {"latitude": 36.99, "longitude": -122.06}, "category": category,
+            "status": "active", **fields}
+
+
+def test_snapshot_columns_and_select(tmp_path):
+    """Ensure that a snapshot keeps events in id order with their columns and filters
+    them like the list routes."""
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    events = {
+        "b": event("Later", now + timedelta(days=1)),
+        "a": event("Now", now - timedelta(hours=1), category="Sports"),
+        "c": event("Nowhere", now - timedelta(hours=1), location=None),
+        "s": event("Club", now - timedelta(hours=1),
+                   recurrence=build_recurrence("FREQ=WEEKLY", now - timedelta(hours=1),
+                                               now + timedelta(hours=1))),
+    }
+    path = tmp_path / "events.snapshot"
+    write_snapshot(path, 7, events, app.json.dumps)
+    snapshot = Snapshot(path)
+    assert (snapshot.version, len(snapshot), list(snapshot.ids)) == (7, 4, ["a", "b", "c", "s"])
+    assert snapshot.latitude[0] == 36.99 and math.isnan(snapshot.latitude[2])
+    assert snapshot.start[1] == (now + timedelta(days=1)).timestamp()
+
+    def ids(**kwargs):
+        window = (now, now + timedelta(days=8))
+        return [event_id for event_id, _ in snapshot.select(app.json.dumps, window=window, **kwargs)]
+
+    series = [f"s_{now - timedelta(hours=1) + timedelta(weeks=week):%Y%m%dT%H%M%S}"
+              for week in range(2)]
+    assert ids() == ["a", "b", "c", *series]
+    assert ids(category="Sports") == ["a"]
+    assert not ids(category="Missing")
+    assert ids(at=now) == ["a", "c", series[0]]
+    assert ids(limit=4) == ["a", "b", "c", series[0]]
+    assert ids(cursor=series[0]) == series[1:]
+    assert ids(cursor="b", limit=1) == ["c"]
+
+
+def test_reader_picks_up_new_versions(tmp_path):
+    """Ensure that readers map a replaced snapshot, keep old versions readable and
+    ignore a stale file."""
+    path = tmp_path / "events.snapshot"
+    reader = SnapshotReader(path, max_age=30)
+    assert reader.current() is None
+
+    now = datetime.now(timezone.utc)
+    write_snapshot(path, 1, {"a": event("One", now)}, app.json.dumps)
+    first = reader.current()
+    assert first.version == 1 and reader.current() is first
+    write_snapshot(path, 2, {"a": event("One", now), "b": event("Two", now)},
+                   app.json.dumps)
+    assert reader.current().version == 2
+    assert list(first.ids) == ["a"]
+    assert not list(tmp_path.glob("*.tmp"))
+
+    old = (now - timedelta(minutes=1)).timestamp()
+    os.utime(path, (old, old))
+    assert reader.current() is None
+
+
+def test_list_routes_from_snapshot_match_store(client, monkeypatch, tmp_path):
+    """Ensure that the list routes answer the same from the snapshot as from the store,
+    and that the producer expires ended events once."""
+    memory = MemoryStore()
+    store = CountingStore(memory)
+    monkeypatch.setitem(app.extensions, "event_store", store)
+    monkeypatch.setattr(app.extensions["shared_reads"], "ttl", 0)
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    start = now - timedelta(hours=1)
+    memory.set_event("a", event("Now", start, image="data:image/png;base64,AAAA"))
+    memory.set_event("b", event("Later", now + timedelta(days=1), category="Sports",
+                                location={"latitude": 37.77, "longitude": -122.42}))
+    memory.set_event("c", event("Ended", now - timedelta(days=1)))
+    memory.set_event("s", event("Club", start, recurrence=build_recurrence(
+        "FREQ=WEEKLY", start, start + timedelta(hours=2))))
+
+    path = tmp_path / "events.snapshot"
+    producer = SnapshotProducer(memory, path, app.json.dumps)
+    producer.set_events(dict(memory.list_events()))
+    producer.tick()
+    assert memory.get_event("c")["status"] == "expired"
+    assert Snapshot(path).version == 1 and list(Snapshot(path).ids) == ["a", "b", "s"]
+    producer.tick()
+    assert Snapshot(path).version == 1
+
+    urls = ["/state", "/state?limit=2", "/state?limit=2&stream=1", "/filter_events/Social",
+            "/filter_events/Missing", f"/filter_times/{now:%Y-%m-%dT%H:%M}",
+            "/state?bounds=36.9,-122.1,37.0,-122.0"]
+    expected = [client.get(url).get_json() for url in urls]
+    assert {e["eventId"][:1] for e in expected[-1]["state"]["events"]} == {"a", "s"}
+    assert client.get("/state?bounds=36.9,-122.1").status_code == 400
+    cursor = expected[1]["nextCursor"]
+    expected.append(client.get(f"/state?limit=2&cursor={cursor}").get_json())
+
+    store.reset()
+    monkeypatch.setitem(app.extensions, "snapshot", SnapshotReader(path, max_age=30))
+    found = [client.get(url).get_json() for url in urls]
+    found.append(client.get(f"/state?limit=2&cursor={cursor}").get_json())
+    assert found == expected
+    assert client.get("/state?stream=1").is_streamed
+    assert not store.counts
+
+
+class FakeWatch:  # pylint: disable=too-few-public-methods
+    """Stands in for a Firestore listener that sends the events once."""
+
+    def __init__(self, callback, events):
+        self.is_active = True
+        self.unsubscribed = False
+        callback(events)
+
+    def unsubscribe(self):
+        """Stops the fake listener."""
+        self.unsubscribed = True
+
+
+def test_producer_replaces_a_stopped_watch(monkeypatch, tmp_path):
+    """Ensure that the producer only keeps the snapshot fresh while it hears from the
+    store, and polls and subscribes again once its watch stopped."""
+    memory = MemoryStore()
+    memory.set_event("a", event("Later", datetime.now(timezone.utc) + timedelta(days=1)))
+    watches = []
+
+    def watch_active_events(callback):
+        watches.append(FakeWatch(callback, dict(memory.list_events())))
+        return watches[-1]
+
+    monkeypatch.setattr(memory, "watch_active_events", watch_active_events)
+    path = tmp_path / "events.snapshot"
+    producer = SnapshotProducer(memory, path, app.json.dumps, interval=0)
+    producer.set_events(dict(memory.list_events()))
+    producer.tick()
+    # nothing refreshed the events since, so the file is left to go stale
+    os.utime(path, (0, 0))
+    producer.tick()
+    assert os.stat(path).st_mtime == 0
+
+    stop = threading.Event()
+    ticks = []
+
+    def tick():
+        ticks.append(len(watches))
+        if len(ticks) == 1:
+            watches[0].is_active = False
+        else:
+            stop.set()
+
+    monkeypatch.setattr(producer, "tick", tick)
+    producer.run(stop)
+    assert ticks == [1, 2]
+    assert [w.unsubscribed for w in watches] == [True, True]
@@ -0,0 +1,41 @@
+"""Pytest tests for the app factory and lazy client creation"""
+
+import os
+import subprocess
+import sys
+
+from app import create_app, warm_up
+from storage import CountingStore
+
+
+def test_import_does_not_create_clients():
+    """Ensure that importing the app doesn't load the Google client libraries or Firestore."""
+    env = {key: value for key, value in os.environ.items() if key != "FIREBASE_KEY"}
+    env["STORAGE_BACKEND"] = "firestore"
+    code = (
+        "import sys, app; "
+        "print([m for m in ('googleapiclient.discovery', 'google_auth_oauthlib', "
+        "'firebase_admin') if m in sys.modules])"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    assert completed.stdout.splitlines()[-1] == "[]"
+
+
+def test_store_is_created_on_first_request():
+    """Ensure that the storage backend is only set up once a request needs it."""
+    flask_app = create_app({"STORAGE_BACKEND": "memory"})
+    assert "event_store" not in flask_app.extensions
+
+    response = flask_app.test_client().get("/state")
+    assert response.status_code == 200
+    assert isinstance(flask_app.extensions["event_store"], CountingStore)
+
+
+def test_warm_up_creates_store():
+    """Ensure that the warm-up hook sets up the store ahead of the first request."""
+    flask_app = create_app({"STORAGE_BACKEND": "memory"})
+    warm_up(flask_app)
+    assert flask_app.extensions["event_store"].counts["reads"] == 1
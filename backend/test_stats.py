@@ -0,0 +1,160 @@
+"""Pytest tests for the incrementally maintained event statistics"""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+from google.cloud.firestore import Increment
+from app import app
+from conftest import auth_header
+from rebuild_stats import rebuild_stats
+from stats import change_deltas, event_deltas, format_stats
+from storage import CountingStore, MemoryStore
+from storage.firestore_store import FirestoreStore
+
+
+def test_event_deltas_buckets():
+    """Ensure that active events count by category and UTC start hour and day, and
+    series only by category."""
+    start = datetime(2025, 3, 9, 23, 30, tzinfo=timezone(timedelta(hours=-8)))
+    data = {"category": "Social", "startTime": start, "status": "active"}
+    assert event_deltas(data) == {
+        ("events", "active"): 1, ("category", "Social"): 1,
+        ("hour", "2025-03-10T07"): 1, ("day", "2025-03-10"): 1,
+    }
+    assert not event_deltas({**data, "status": "expired"})
+    assert event_deltas({**data, "recurrence": {"rrule": "FREQ=WEEKLY"}}, -1) == {
+        ("events", "active"): -1, ("category", "Social"): -1, ("events", "recurring"): -1,
+    }
+    assert change_deltas(data, {**data, "category": "Sports"}) == {
+        ("category", "Social"): -1, ("category", "Sports"): 1,
+    }
+
+    counters = {"hour": {"2025-03-10T07": 1, "2025-03-11T07": 1}, "category": {"Social": 0}}
+    stats = format_stats(counters, (datetime(2025, 3, 11, tzinfo=timezone.utc), None))
+    assert stats["byHour"] == {"2025-03-11T07": 1}
+    assert not stats["byCategory"]
+
+
+def test_firestore_stats_are_sharded(mock_db):
+    """Ensure that Firestore totals are merged into one random shard and time buckets
+    into the document of their day, and that only the days asked for are read."""
+    store = FirestoreStore(mock_db)
+    collections = {"stats": MagicMock(), "stats_days": MagicMock()}
+    mock_db.collection.side_effect = collections.get
+    for collection in collections.values():
+        collection.document.side_effect = lambda name: MagicMock(path=name)
+    store.update_stats({("category", "Social"): 1, ("rsvps", "total"): -1,
+                        ("hour", "2025-03-10T07"): 1, ("day", "2025-03-10"): 1})
+    batch = mock_db.batch.return_value
+    assert [call.args[1:] for call in batch.set.call_args_list] == [
+        ({"category": {"Social": Increment(1)}, "rsvps": {"total": Increment(-1)}},),
+        ({"hour": {"2025-03-10T07": Increment(1)}, "day": {"2025-03-10": Increment(1)}},),
+    ]
+    assert batch.set.call_args_list[1].args[0].path == "2025-03-10"
+    batch.commit.assert_called_once()
+
+    docs = [MagicMock(), MagicMock(), MagicMock()]
+    docs[0].to_dict.return_value = {"category": {"Social": 2}}
+    docs[1].to_dict.return_value = {"category": {"Social": 1, "Sports": 1}}
+    docs[2].to_dict.return_value = {"day": {"2025-03-10": 1}}
+    collections["stats"].stream.return_value = docs[:2]
+    days = collections["stats_days"].order_by.return_value
+    days.start_at.return_value.stream.return_value = docs[2:]
+    assert store.get_stats("2025-03-10") == {
+        "category": {"Social": 3, "Sports": 1}, "day": {"2025-03-10": 1},
+    }
+    days.start_at.return_value.end_at.assert_not_called()
+
+
+def test_stats_route_follows_changes(client, monkeypatch):
+    """Ensure that /stats follows creates, updates, RSVPs, expiry and deletes
+    without listing events."""
+    memory = MemoryStore()
+    counting = CountingStore(memory)
+    monkeypatch.setitem(app.extensions, "event_store", counting)
+    app.extensions["shared_reads"].clear()
+    headers = auth_header()
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    body = {
+        "title": "Party", "description": "desc",
+        "startTime": (now + timedelta(days=1)).isoformat(),
+        "endTime": (now + timedelta(days=1, hours=2)).isoformat(),
+        "location": {"latitude": 36.99, "longitude": -122.06}, "category": "Social",
+    }
+    event_id = client.post("/create_event", json=body, headers=headers).get_json()["eventId"]
+    client.post("/create_event", json={**body, "category": "Sports"}, headers=headers)
+    for _ in range(2):
+        assert client.post(f"/rsvp/{event_id}", headers=headers).status_code == 200
+    update = {**body, "eventId": event_id, "category": "Music"}
+    assert client.post("/update_event", json=update, headers=headers).status_code == 200
+
+    counting.reset()
+    stats = client.get("/stats").get_json()["stats"]
+    # the counter shards and the one day with buckets
+    assert counting.counts == {"reads": 11}
+    hour = f"{now + timedelta(days=1):%Y-%m-%dT%H}"
+    assert stats == {
+        "activeEvents": 2, "recurringSeries": 0, "byCategory": {"Music": 1, "Sports": 1},
+        "byHour": {hour: 2}, "byDay": {hour[:10]: 2}, "rsvps": 1,
+    }
+    window = f"from={(now + timedelta(days=2)).isoformat()}".replace("+", "%2B")
+    assert client.get(f"/stats?{window}").get_json()["stats"]["byHour"] == {}
+    assert client.get("/stats?to=tomorrow").status_code == 400
+
+    # the event ends, the listing that notices expires it once
+    memory.update_event(event_id, {"endTime": now - timedelta(hours=1)})
+    client.get("/state")
+    client.get("/state")
+    assert client.delete(f"/unrsvp/{event_id}", headers=headers).status_code == 200
+    stats = client.get("/stats").get_json()["stats"]
+    assert (stats["activeEvents"], stats["byCategory"], stats["rsvps"]) == (1, {"Sports": 1}, 0)
+
+
+def test_racing_deletes_subtract_once(client, monkeypatch):
+    """Ensure that a request deleting an event another request already deleted
+    doesn't subtract it from the counters again."""
+    memory = MemoryStore()
+    monkeypatch.setitem(app.extensions, "event_store", memory)
+    app.extensions["shared_reads"].clear()
+    headers = auth_header()
+    now = datetime.now(timezone.utc)
+    body = {
+        "title": "Party", "description": "desc",
+        "startTime": (now + timedelta(days=1)).isoformat(),
+        "endTime": (now + timedelta(days=1, hours=2)).isoformat(),
+        "location": {"latitude": 36.99, "longitude": -122.06}, "category": "Games",
+    }
+    event_id = client.post("/create_event", json=body, headers=headers).get_json()["eventId"]
+    assert client.post(f"/rsvp/{event_id}", headers=headers).status_code == 200
+    before = client.get("/stats").get_json()["stats"]
+
+    # both requests read the event before either deletes it
+    stale = memory.get_event(event_id)
+    with monkeypatch.context() as patch:
+        patch.setattr(memory, "get_event", lambda _: stale)
+        assert client.delete(f"/delete_event/{event_id}", headers=headers).status_code == 200
+        assert client.delete(f"/delete_event/{event_id}", headers=headers).status_code == 404
+    stats = client.get("/stats").get_json()["stats"]
+    assert stats["activeEvents"] == before["activeEvents"] - 1
+    assert stats["rsvps"] == before["rsvps"] - 1
+    assert "Games" not in stats["byCategory"]
+
+
+def test_rebuild_stats_seeds_and_corrects_counters():
+    """Ensure that a rebuild replaces counters that missed older events or went
+    negative with the counts of a full scan, and changes nothing once they match."""
+    memory = MemoryStore()
+    start = datetime(2025, 3, 10, 18, tzinfo=timezone.utc)
+    event_id = memory.create_event({"category": "Social", "status": "active",
+                                    "startTime": start})
+    memory.create_event({"category": "Sports", "status": "expired", "startTime": start})
+    memory.add_rsvp(event_id, "a@example.com", {"status": "confirmed"})
+    # an expiry and a cancelled RSVP of events created before the counters existed
+    memory.update_stats({("events", "active"): -1, ("category", "Sports"): -1,
+                         ("rsvps", "total"): -1})
+
+    assert rebuild_stats(memory)
+    assert format_stats(memory.get_stats()) == {
+        "activeEvents": 1, "recurringSeries": 0, "byCategory": {"Social": 1},
+        "byHour": {"2025-03-10T18": 1}, "byDay": {"2025-03-10": 1}, "rsvps": 1,
+    }
+    assert not rebuild_stats(memory)
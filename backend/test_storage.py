@@ -0,0 +1,172 @@
+"""Pytest tests for the in-memory and SQLite storage backends"""
+
+from datetime import datetime, timezone
+import pytest
+from event import Event
+from storage import get_store, CountingStore, MemoryStore, SQLiteStore
+from storage.firestore_store import FirestoreStore
+
+
+def event_data(title, category="Social", status="active", latitude=36.99, longitude=-122.06):
+    """Builds stored event data like Event.to_dict does."""
+    return {
+        "title": title,
+        "description": "desc",
+        "startTime": datetime(2025, 3, 9, 12, 0, tzinfo=timezone.utc),
+        "endTime": datetime(2025, 3, 9, 14, 0, tzinfo=timezone.utc),
+        "location": {"latitude": latitude, "longitude": longitude},
+        "category": category,
+        "ownerEmail": "owner@example.com",
+        "status": status,
+    }
+
+
+def test_event_round_trip(store):
+    """Ensure that stored events come back unchanged, including datetimes."""
+    event_id = store.create_event(event_data("Party"))
+    assert store.get_event(event_id) == event_data("Party")
+    assert store.get_event("missing") is None
+
+    store.set_event(event_id, {"title": "Renamed"}, merge=True)
+    assert store.update_event(event_id, {"status": "expired"})["title"] == "Renamed"
+    assert store.update_event("missing", {"status": "expired"}) is None
+    stored = store.get_event(event_id)
+    assert stored["title"] == "Renamed"
+    assert stored["status"] == "expired"
+    assert stored["startTime"] == event_data("Party")["startTime"]
+
+    store.add_rsvp(event_id, "a@example.com", {"status": "confirmed"})
+    store.add_rsvp(event_id, "20250303T180000_b@example.com", {"status": "confirmed"})
+    assert store.list_rsvps(event_id, "2025") == ["20250303T180000_b@example.com"]
+    assert store.delete_event(event_id) == 2
+    assert store.delete_event(event_id) is None
+    assert store.get_event(event_id) is None
+    assert not store.list_rsvps(event_id)
+
+
+def test_list_events_filters_and_cursor(store):
+    """Ensure that listings filter by status and category and resume after a cursor."""
+    ids = sorted(store.create_event(event_data(str(i))) for i in range(5))
+    store.update_event(ids[0], {"status": "expired"})
+    store.set_event(ids[1], {"category": "Sports"}, merge=True)
+
+    assert [event_id for event_id, _ in store.list_events()] == ids[1:]
+    assert [event_id for event_id, _ in store.list_events(category="Sports")] == [ids[1]]
+    assert [event_id for event_id, _ in store.list_events(cursor=ids[2])] == ids[3:]
+    assert len(list(store.list_events(status=None))) == 5
+
+
+def test_list_events_bounds_and_time(store):
+    """Ensure that a bounding box only returns events located inside it and a time
+    only events, or recurring series, overlapping it."""
+    inside = store.create_event(event_data("Inside", latitude=36.99, longitude=-122.06))
+    outside = store.create_event(event_data("Outside", latitude=37.77, longitude=-122.42))
+    bounds = (36.9, -122.1, 37.0, -122.0)
+    assert [event_id for event_id, _ in store.list_events(bounds=bounds)] == [inside]
+    store.set_event(inside, {"location": None}, merge=True)
+    assert not list(store.list_events(bounds=bounds))
+
+    series = store.create_event({**event_data("Series"), "recurrence": {
+        "rrule": "FREQ=WEEKLY", "exdates": [], "overrides": {}, "lastEnd": None,
+    }})
+    during = datetime(2025, 3, 9, 13, 0, tzinfo=timezone.utc)
+    later = datetime(2025, 3, 16, 13, 0, tzinfo=timezone.utc)
+    assert {event_id for event_id, _ in store.list_events(at=during)} == {inside, outside, series}
+    assert [event_id for event_id, _ in store.list_events(at=later)] == [series]
+
+
+def test_sqlite_listings_use_indexes():
+    """Ensure that SQLite finds bounding boxes through the R-tree and times through
+    the time index."""
+    store = SQLiteStore(":memory:")
+    store.create_event(event_data("Party"))
+    plans = []
+    # pylint: disable=protected-access
+    store._conn.set_trace_callback(plans.append)
+    during = datetime(2025, 3, 9, 13, 0, tzinfo=timezone.utc)
+    for kwargs in ({"bounds": (36.9, -122.1, 37.0, -122.0)}, {"at": during}):
+        plans.clear()
+        assert len(list(store.list_events(**kwargs))) == 1
+        (sql,) = [sql for sql in plans if sql.startswith("SELECT")]
+        plan = " ".join(row[3] for row in store._conn.execute(f"EXPLAIN QUERY PLAN {sql}"))
+        assert ("VIRTUAL TABLE" if "bounds" in kwargs else "events_status_time") in plan
+
+
+def test_firestore_calendar_link_reads_only_the_links(mock_db):
+    """Ensure that looking up a calendar link doesn't read the rest of the event."""
+    event_ref = mock_db.collection.return_value.document.return_value
+    event_ref.get.return_value.to_dict.return_value = {
+        "calendar_events": {"a_at_example_dot_com": "cal123"}
+    }
+    assert FirestoreStore(mock_db).get_calendar_link("e", "a@example.com") == "cal123"
+    event_ref.get.assert_called_once_with(field_paths=["calendar_events"])
+
+
+def test_rsvps_and_calendar_links(store):
+    """Ensure that RSVPs and calendar links are stored per event and user."""
+    event_id = store.create_event(event_data("Party"))
+    store.add_rsvp(event_id, "b@example.com", {"status": "confirmed"})
+    store.add_rsvp(event_id, "a@example.com", {"status": "confirmed"})
+    store.remove_rsvp(event_id, "b@example.com")
+    assert store.list_rsvps(event_id) == ["a@example.com"]
+
+    store.set_calendar_link(event_id, "a@example.com", "cal123")
+    assert store.get_calendar_link(event_id, "a@example.com") == "cal123"
+    store.remove_calendar_link(event_id, "a@example.com")
+    assert store.get_calendar_link(event_id, "a@example.com") is None
+
+
+def test_conditional_writes_and_stats(store):
+    """Ensure that RSVPs and expiry report whether they changed anything and
+    statistics counters add up."""
+    event_id = store.create_event(event_data("Party"))
+    assert store.create_rsvp(event_id, "a@example.com", {"status": "confirmed"})
+    assert not store.create_rsvp(event_id, "a@example.com", {"status": "confirmed"})
+    assert store.remove_rsvp(event_id, "a@example.com")
+    assert not store.remove_rsvp(event_id, "a@example.com")
+
+    assert store.expire_event(event_id)
+    assert not store.expire_event(event_id)
+    assert not store.expire_event("missing")
+    assert store.get_event(event_id)["status"] == "expired"
+
+    assert store.get_stats() == {}
+    store.update_stats({("category", "Social"): 2, ("rsvps", "total"): 1})
+    store.update_stats({("category", "Social"): -1, ("category", "Sports"): 1})
+    assert store.get_stats() == {"category": {"Social": 1, "Sports": 1}, "rsvps": {"total": 1}}
+
+    # time buckets are read by day and zero counts aren't kept
+    store.update_stats({("hour", "2025-03-09T23"): 1, ("day", "2025-03-10"): 1,
+                        ("hour", "2025-03-11T07"): 1, ("category", "Sports"): -1})
+    assert store.get_stats("2025-03-10", "2025-03-10") == {
+        "category": {"Social": 1}, "rsvps": {"total": 1}, "day": {"2025-03-10": 1},
+    }
+    assert store.get_stats(None, "2025-03-09")["hour"] == {"2025-03-09T23": 1}
+    assert store.drop_stats_before("2025-03-11") == 2
+    assert "day" not in store.get_stats() and store.get_stats()["hour"] == {"2025-03-11T07": 1}
+
+
+def test_event_class_with_store(store, sample_event):
+    """Ensure that the Event class works on top of a local backend."""
+    sample_event.db = store
+    event_id = sample_event.create()
+    fetched = Event.from_dict(event_id, store.get_event(event_id), store)
+    assert fetched.title == sample_event.title
+    assert fetched.to_dict() == {**sample_event.to_dict(), "createdAt": fetched.created_at}
+
+
+def test_get_store_selects_backend():
+    """Ensure that the backend is selected by name and unknown names are rejected."""
+    assert isinstance(get_store("memory"), MemoryStore)
+    with pytest.raises(ValueError):
+        get_store("mongo")
+
+
+def test_counting_store_counts_like_firestore(store):
+    """Ensure that listings count one read per document and writes are counted."""
+    counting = CountingStore(store)
+    for i in range(3):
+        counting.create_event(event_data(str(i)))
+    assert not list(counting.list_events(category="Missing"))
+    assert len(list(counting.list_events())) == 3
+    assert counting.counts == {"writes": 3, "reads": 4}
@@ -0,0 +1,32 @@
+"""Pytest tests for storage call tracing and the redundant read detector"""
+
+from flask import g
+from app import app
+from storage import MemoryStore
+from tracing import TracingStore, find_problems
+
+
+def test_tracing_store_records_calls_per_request():
+    """Ensure that each storage call is recorded with its document path."""
+    store = TracingStore(MemoryStore())
+    with app.test_request_context("/state"):
+        event_id = store.create_event({"title": "Party", "status": "active"})
+        store.get_event(event_id)
+        assert len(list(store.list_events())) == 1
+        calls = g.storage_trace
+    assert [call["operation"] for call in calls] == ["create_event", "get_event", "list_events"]
+    assert calls[1]["path"] == f"events/{event_id}"
+    assert calls[2]["documents"] == 1
+
+
+def test_find_problems_flags_repeated_reads_and_loops():
+    """Ensure that double reads of a document and per-document loops are reported."""
+    repeated = [
+        {"operation": "get_event", "path": "events/a"},
+        {"operation": "get_calendar_link", "path": "events/a"},
+    ]
+    assert find_problems(repeated) == ["events/a read 2 times"]
+
+    loop = [{"operation": "update_event", "path": f"events/{i}"} for i in range(5)]
+    assert find_problems(loop) == ["update_event called on 5 documents in a loop"]
+    assert not find_problems(loop[:2])
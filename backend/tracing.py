@@ -0,0 +1,319 @@
+"""
+Opt-in per-request tracing of storage calls
+
+Set STORAGE_TRACE=1 to record every storage call made while handling a
+request with its document path and timing. Flask requests keep their trace on
+flask.g, requests served by the ASGI routes in a context variable. At the end of each request the
+trace is checked for repeated reads of the same document and for loops of
+per-document calls (N+1), and requests slower than TRACE_SLOW_MS are written
+as a JSON line to TRACE_PROFILE_PATH.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+from storage.base import AsyncEventStore, EventStore
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.getenv("TRACE_SLOW_MS", "500"))
+PROFILE_PATH = os.getenv("TRACE_PROFILE_PATH", "slow-requests.ndjson")
+# this many calls of one operation on different documents looks like a loop
+N_PLUS_ONE_THRESHOLD = int(os.getenv("TRACE_N_PLUS_ONE", "5"))
+
+READ_OPERATIONS = {
+    "get_event", "event_exists", "get_calendar_link", "list_rsvps", "get_archived_event"
+}
+
+_profile_lock = threading.Lock()
+# the trace of the async request being handled, see trace_request
+_async_trace = ContextVar("storage_trace", default=None)
+
+
+def tracing_enabled():
+    """Checks if storage tracing was switched on"""
+    return os.getenv("STORAGE_TRACE", "").lower() in ("1", "true")
+
+
+def _record(operation, path, seconds, **details):
+    calls = _async_trace.get()
+    if calls is None:
+        if not has_request_context():
+            return
+        if "storage_trace" not in g:
+            g.storage_trace = []
+        calls = g.storage_trace
+    calls.append({
+        "operation": operation,
+        "path": path,
+        "ms": round(seconds * 1000, 3),
+        **details,
+    })
+
+
+def find_problems(calls):
+    """Returns descriptions of repeated reads and per-document call loops in a trace"""
+    problems = []
+    reads = Counter(call["path"] for call in calls if call["operation"] in READ_OPERATIONS)
+    for path, count in reads.items():
+        if count > 1:
+            problems.append(f"{path} read {count} times")
+    paths_per_operation = {}
+    for call in calls:
+        paths_per_operation.setdefault(call["operation"], set()).add(call["path"])
+    for operation, paths in paths_per_operation.items():
+        if len(paths) >= N_PLUS_ONE_THRESHOLD:
+            problems.append(f"{operation} called on {len(paths)} documents in a loop")
+    return problems
+
+
+class TracingStore(EventStore):
+    """Delegates to another store and records each call in the request trace"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def _call(self, operation, path, method, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _record(operation, path, time.perf_counter() - started)
+
+    def create_event(self, data):
+        return self._call("create_event", "events", self.store.create_event, data)
+
+    def get_event(self, event_id):
+        return self._call("get_event", f"events/{event_id}", self.store.get_event, event_id)
+
+    def event_exists(self, event_id):
+        return self._call(
+            "event_exists", f"events/{event_id}", self.store.event_exists, event_id
+        )
+
+    def set_event(self, event_id, data, merge=False):
+        self._call("set_event", f"events/{event_id}", self.store.set_event,
+                   event_id, data, merge=merge)
+
+    def update_event(self, event_id, fields):
+        return self._call("update_event", f"events/{event_id}", self.store.update_event,
+                          event_id, fields)
+
+    def delete_event(self, event_id):
+        return self._call("delete_event", f"events/{event_id}", self.store.delete_event,
+                          event_id)
+
+    def expire_event(self, event_id):
+        return self._call("expire_event", f"events/{event_id}", self.store.expire_event,
+                          event_id)
+
+    def list_events(self, status="active", category=None, cursor=None, bounds=None,
+                    at=None):
+        # only time spent inside the store counts, not time the caller spends per event
+        elapsed = 0.0
+        returned = 0
+        listing = self.store.list_events(status, category, cursor, bounds, at)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(listing)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                returned += 1
+                yield item
+        finally:
+            _record("list_events", f"events?status={status}&category={category}",
+                    elapsed, documents=returned)
+
+    def add_rsvp(self, event_id, user_email, data):
+        self._call("add_rsvp", f"events/{event_id}/rsvps/{user_email}",
+                   self.store.add_rsvp, event_id, user_email, data)
+
+    def create_rsvp(self, event_id, user_email, data):
+        return self._call("create_rsvp", f"events/{event_id}/rsvps/{user_email}",
+                          self.store.create_rsvp, event_id, user_email, data)
+
+    def remove_rsvp(self, event_id, user_email):
+        return self._call("remove_rsvp", f"events/{event_id}/rsvps/{user_email}",
+                          self.store.remove_rsvp, event_id, user_email)
+
+    def list_rsvps(self, event_id, prefix=""):
+        return self._call("list_rsvps", f"events/{event_id}/rsvps/{prefix}",
+                          self.store.list_rsvps, event_id, prefix)
+
+    def count_rsvps(self):
+        return self._call("count_rsvps", "rsvps", self.store.count_rsvps)
+
+    # calendar links live on the event document in Firestore, so they trace as it
+    def set_calendar_link(self, event_id, user_email, calendar_event_id):
+        self._call("set_calendar_link", f"events/{event_id}", self.store.set_calendar_link,
+                   event_id, user_email, calendar_event_id)
+
+    def get_calendar_link(self, event_id, user_email):
+        return self._call("get_calendar_link", f"events/{event_id}",
+                          self.store.get_calendar_link, event_id, user_email)
+
+    def remove_calendar_link(self, event_id, user_email):
+        self._call("remove_calendar_link", f"events/{event_id}",
+                   self.store.remove_calendar_link, event_id, user_email)
+
+    def archive_events(self, summaries):
+        return self._call("archive_events", "archived_events", self.store.archive_events,
+                          summaries)
+
+    def get_archived_event(self, event_id):
+        return self._call("get_archived_event", f"archived_events/{event_id}",
+                          self.store.get_archived_event, event_id)
+
+    def update_stats(self, deltas):
+        self._call("update_stats", "stats", self.store.update_stats, deltas)
+
+    def get_stats(self, first_day=None, last_day=None):
+        return self._call("get_stats", "stats", self.store.get_stats, first_day, last_day)
+
+    def drop_stats_before(self, day):
+        return self._call("drop_stats_before", "stats_days", self.store.drop_stats_before, day)
+
+
+class AsyncTracingStore(AsyncEventStore):
+    """Delegates to an async store (see storage.async_store) and records each call
+    in the trace of the async request"""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def _call(self, operation, path, method, *args):
+        started = time.perf_counter()
+        try:
+            return await method(*args)
+        finally:
+            _record(operation, path, time.perf_counter() - started)
+
+    async def get_event(self, event_id):
+        return await self._call("get_event", f"events/{event_id}", self.store.get_event,
+                                event_id)
+
+    async def event_exists(self, event_id):
+        return await self._call("event_exists", f"events/{event_id}",
+                                self.store.event_exists, event_id)
+
+    async def expire_event(self, event_id):
+        return await self._call("expire_event", f"events/{event_id}",
+                                self.store.expire_event, event_id)
+
+    async def list_events(self, status="active", category=None, cursor=None, bounds=None,
+                          at=None):
+        elapsed = 0.0
+        returned = 0
+        listing = self.store.list_events(status, category, cursor, bounds, at)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = await anext(listing)
+                except StopAsyncIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                returned += 1
+                yield item
+        finally:
+            await listing.aclose()
+            _record("list_events", f"events?status={status}&category={category}",
+                    elapsed, documents=returned)
+
+    async def create_rsvp(self, event_id, user_email, data):
+        return await self._call("create_rsvp", f"events/{event_id}/rsvps/{user_email}",
+                                self.store.create_rsvp, event_id, user_email, data)
+
+    async def remove_rsvp(self, event_id, user_email):
+        return await self._call("remove_rsvp", f"events/{event_id}/rsvps/{user_email}",
+                                self.store.remove_rsvp, event_id, user_email)
+
+    async def list_rsvps(self, event_id, prefix=""):
+        return await self._call("list_rsvps", f"events/{event_id}/rsvps/{prefix}",
+                                self.store.list_rsvps, event_id, prefix)
+
+    async def set_calendar_link(self, event_id, user_email, calendar_event_id):
+        await self._call("set_calendar_link", f"events/{event_id}",
+                         self.store.set_calendar_link, event_id, user_email,
+                         calendar_event_id)
+
+    async def get_calendar_link(self, event_id, user_email):
+        return await self._call("get_calendar_link", f"events/{event_id}",
+                                self.store.get_calendar_link, event_id, user_email)
+
+    async def remove_calendar_link(self, event_id, user_email):
+        await self._call("remove_calendar_link", f"events/{event_id}",
+                         self.store.remove_calendar_link, event_id, user_email)
+
+    async def update_stats(self, deltas):
+        await self._call("update_stats", "stats", self.store.update_stats, deltas)
+
+
+def write_profile(entry):
+    """Appends a slow request profile as one JSON line"""
+    with _profile_lock, open(PROFILE_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def check_trace(method, route, path, calls, duration_ms):
+    """Logs redundant storage calls of a finished request and profiles it if it was slow"""
+    problems = find_problems(calls)
+    if problems:
+        logger.warning("Redundant storage calls", extra={
+            "route": route, "problems": problems, "calls": len(calls),
+        })
+    if duration_ms >= SLOW_REQUEST_MS:
+        write_profile({
+            "time": datetime.now(timezone.utc).isoformat(),
+            "method": method,
+            "route": route,
+            "path": path,
+            "duration_ms": round(duration_ms, 3),
+            "storage_ms": round(sum(call["ms"] for call in calls), 3),
+            "calls": calls,
+            "problems": problems,
+        })
+
+
+@contextmanager
+def trace_request(method, route, path):
+    """Traces the storage calls of an async request, checked like a Flask request's"""
+    calls = []
+    token = _async_trace.set(calls)
+    started = time.perf_counter()
+    try:
+        yield calls
+    finally:
+        _async_trace.reset(token)
+        check_trace(method, route, path, calls, (time.perf_counter() - started) * 1000)
+
+
+def init_tracing(app):
+    """Registers request hooks that check and profile each request's storage trace"""
+
+    @app.before_request
+    def start_trace():
+        g.storage_trace = []
+        g.trace_started = time.perf_counter()
+
+    @app.teardown_request
+    def finish_trace(_error=None):
+        if "trace_started" not in g:
+            return
+        duration_ms = (time.perf_counter() - g.trace_started) * 1000
+        route = request.url_rule.rule if request.url_rule else request.path
+        check_trace(request.method, route, request.path, g.storage_trace, duration_ms)